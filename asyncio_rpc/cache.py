@@ -0,0 +1,268 @@
+import hashlib
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, List
+
+from asyncio_rpc.models import RPCCall
+from asyncio_rpc.serialization import msgpack as msgpack_serialization
+
+
+def stack_key(
+    namespace: str, stack: List[RPCCall], serialization=msgpack_serialization
+):
+    """
+    Canonical hash of a namespace and a RPCCall stack, identical
+    call stacks (regardless of kwargs order) give the same key.
+    """
+    canonical = (
+        namespace,
+        [
+            (
+                rpc_func_call.func_name,
+                rpc_func_call.func_args,
+                sorted(rpc_func_call.func_kwargs.items()),
+            )
+            for rpc_func_call in stack
+        ],
+    )
+    return hashlib.blake2b(
+        serialization.dumpb(canonical, do_compress=False), digest_size=16
+    ).hexdigest()
+
+
+def object_size(obj: Any) -> int:
+    """
+    Estimated size in bytes of obj, uses nbytes
+    for (numpy) arrays.
+    """
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(obj)
+
+
+def prefix_keys(stack: List[RPCCall], serialization=msgpack_serialization):
+    """
+    Incremental hashes of the prefixes of a RPCCall stack, key i
+    is the hash of stack[: i + 1]. The complete stack is not included.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    keys = []
+    for rpc_func_call in stack[:-1]:
+        digest.update(
+            serialization.dumpb(
+                (
+                    rpc_func_call.func_name,
+                    rpc_func_call.func_args,
+                    sorted(rpc_func_call.func_kwargs.items()),
+                ),
+                do_compress=False,
+            )
+        )
+        keys.append(digest.hexdigest())
+    return keys
+
+
+class LRUCache:
+    """
+    Least recently used cache, bounded by number of entries
+    and/or total size of the entries.
+
+    Entries can have a time to live (in seconds) and a tag,
+    for example a namespace, for invalidating entries by tag.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, max_size: int = None, default_ttl: float = None
+    ):
+        """
+        :param max_entries: maximum number of entries
+        :param max_size: (optional) maximum total size of the entries,
+            for example in bytes
+        :param default_ttl: (optional) default time to live in seconds
+        """
+        assert max_entries is None or max_entries > 0
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (value, expires_at, size, tag)
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key, count=False) is not None
+
+    def get(self, key: Hashable, count: bool = True):
+        """
+        Get the value for key or None if not present or expired
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            # Expired
+            self.pop(key)
+            entry = None
+
+        if entry is None:
+            if count:
+                self.misses += 1
+            return None
+
+        if count:
+            self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: float = None,
+        size: int = 0,
+        tag: Hashable = None,
+    ):
+        """
+        Add value for key, evicting the least recently used
+        entries if the cache is full.
+        """
+        if self.max_size is not None and size > self.max_size:
+            # Would evict everything else
+            return
+
+        self.pop(key)
+
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, expires_at, size, tag)
+        self.size += size
+        if tag is not None:
+            self._tags[tag].add(key)
+
+        while (self.max_entries is not None and len(self) > self.max_entries) or (
+            self.max_size is not None and self.size > self.max_size
+        ):
+            self.pop(next(iter(self._entries)))
+
+    def pop(self, key: Hashable):
+        """
+        Remove the entry for key, returns the value or
+        None if not present
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        value, _, size, tag = entry
+        self.size -= size
+        if tag is not None:
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+        return value
+
+    def expire(self):
+        """
+        Remove all expired entries
+        """
+        now = time.monotonic()
+        expired = [
+            key
+            for key, entry in self._entries.items()
+            if entry[1] is not None and entry[1] < now
+        ]
+        for key in expired:
+            self.pop(key)
+
+    def invalidate(self, tag: Hashable = None):
+        """
+        Remove all entries with the given tag, or
+        all entries if no tag is given.
+        """
+        if tag is None:
+            self.clear()
+            return
+
+        for key in list(self._tags.get(tag, ())):
+            self.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+        self.size = 0
+
+
+class ClientCache:
+    """
+    RPCClient cache of rpc_call results, keyed by stack_key. Only
+    the namespaces with a time to live are cached.
+
+    Cache hits return the same (cached) object, don't modify it.
+    """
+
+    def __init__(
+        self, ttls: Dict[str, float], max_entries: int = 1024, max_size: int = None
+    ):
+        """
+        :param ttls: namespace -> time to live in seconds of the cached
+            results, None caches the results until invalidated
+        :param max_entries: maximum number of cached results
+        :param max_size: (optional) maximum total (estimated) size
+            of the cached results in bytes, see object_size
+        """
+        self.ttls = dict(ttls)
+        self._results = LRUCache(max_entries=max_entries, max_size=max_size)
+        # Incremented on every invalidation, results of rpc_call's
+        # started before an invalidation are not cached
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def hits(self):
+        return self._results.hits
+
+    @property
+    def misses(self):
+        return self._results.misses
+
+    def caches(self, namespace: str) -> bool:
+        return namespace in self.ttls
+
+    def get(self, key: str):
+        """
+        Returns a (result,) tuple or None if not cached
+        """
+        return self._results.get(key)
+
+    def set(self, key: str, namespace: str, result: Any, generation: int):
+        """
+        Cache the result of a rpc_call, started when the
+        cache was at the given generation.
+        """
+        if generation != self.generation:
+            # Invalidated in the meantime, the result might be stale
+            return
+
+        size = object_size(result) if self._results.max_size is not None else 0
+        self._results.set(
+            key, (result,), ttl=self.ttls[namespace], size=size, tag=namespace
+        )
+
+    def invalidate(self, namespace: str = None, key: str = None):
+        """
+        Remove the result cached under key, all results
+        of namespace or all results.
+        """
+        self.generation += 1
+        if key is not None:
+            self._results.pop(key)
+        else:
+            self._results.invalidate(namespace)
@@ -1,43 +1,126 @@
 import asyncio
-import builtins
+import dataclasses
+import itertools
 import logging
+import math
+import time
+from contextlib import asynccontextmanager
 from typing import List, Union
+from uuid import uuid4
 
+from asyncio_rpc.cache import ClientCache, LRUCache, stack_key
 from asyncio_rpc.commlayers.base import AbstractRPCCommLayer
-from asyncio_rpc.exceptions import NotReceived, RPCTimeoutError, WrappedException
-from asyncio_rpc.pubsub import Subscription
+from asyncio_rpc.exceptions import (  # noqa: F401
+    NotReceived,
+    RPCTimeoutError,
+    ServerOverloaded,
+    WrappedException,
+    resolve_exception_class,
+)
+from asyncio_rpc.hedging import HedgePolicy
+from asyncio_rpc.proxy import RPCProxy
+from asyncio_rpc.pubsub import Stream, Subscription
 
 from .models import (
     RPCBase,
+    RPCBatch,
+    RPCBatchResult,
+    RPCCacheInvalidation,
     RPCException,
+    RPCHandle,
+    RPCHandleStack,
     RPCMessage,
     RPCPubResult,
+    RPCReleaseStack,
     RPCResult,
     RPCStack,
+    RPCStreamStack,
     RPCSubStack,
+    is_plain,
 )
 
 logger = logging.getLogger("asyncio-rpc-client")
 
 
+def with_deadline(rpc_func_stack: RPCStack, now: float = None) -> RPCStack:
+    """
+    Returns a copy of rpc_func_stack with the deadline set (when the
+    client stops waiting for the result), or rpc_func_stack itself if
+    it already has a deadline or has no timeout.
+    """
+    if rpc_func_stack.deadline is not None or rpc_func_stack.timeout is None:
+        return rpc_func_stack
+    now = time.time() if now is None else now
+    return dataclasses.replace(rpc_func_stack, deadline=now + rpc_func_stack.timeout)
+
+
+def max_limit(values):
+    """
+    The maximum of the timeouts or deadlines, None (no limit)
+    if any of them is None
+    """
+    values = list(values)
+    if any(value is None for value in values):
+        return None
+    return max(values)
+
+
 class RPCClient(object):
     """
     Remote procedure client class. Allows to send rpc_call
     to a RPCServer via a rpc_commlayer.
     """
 
-    def __init__(self, rpc_commlayer: AbstractRPCCommLayer):
+    def __init__(
+        self,
+        rpc_commlayer: AbstractRPCCommLayer,
+        auto_serve: bool = True,
+        cache: ClientCache = None,
+        hedge_policy: HedgePolicy = None,
+    ):
         """
         Initialize a new RPCClient by providing an implementation of
         AbstractRPCCommlayer
+
+        :param auto_serve: start background processing on first use if
+            client.serve() is not awaited, keeping a single subscription
+            for the lifetime of the client, stopped by client.close().
+            If False every rpc_call subscribes and unsubscribes on its own.
+        :param cache: (optional) ClientCache for the results of rpc_call's,
+            evicted by RPCCacheInvalidation messages from the RPCServer
+        :param hedge_policy: (optional) HedgePolicy for idempotent
+            rpc_call's, see rpc_call
         """
         assert isinstance(rpc_commlayer, AbstractRPCCommLayer)
         self.rpc_commlayer = rpc_commlayer
+        self.auto_serve = auto_serve
+        self.cache = cache
+        self.hedge_policy = hedge_policy
+        # uids of hedged attempts whose result is ignored
+        self._abandoned = LRUCache(max_entries=1024)
         self.futures = {}
         self.queue = asyncio.Queue()
         self.processing = False
         self.on_rpc_message = None
         self.subscriptions = {}
+        # Unique prefix for cheap uids, see next_uid
+        self._uid_prefix = uuid4().hex
+        self._uid_counter = itertools.count()
+        # Background processing started by auto_serve
+        self._receiver = None
+        self._subscribe_lock = asyncio.Lock()
+        # Subscription shared by calls without background processing
+        self._listener = None
+        self._waiting = 0
+
+        # Batching, see set_batching
+        self._batching = False
+        self._max_items = None
+        self._window = None
+        # channel -> RPCStacks to send as one RPCBatch
+        self._batch = {}
+        self._batch_timer = None
+        self._flush_tasks = set()
         logger.debug("Initialized RPC client")
 
     def register_models(self, models: List):
@@ -49,40 +132,208 @@ class RPCClient(object):
         for model in models:
             self.rpc_commlayer.serialization.register(model)
 
-    async def _wait_for_result(self, uid: bytes) -> Union[RPCResult, RPCException]:
+    def next_uid(self) -> str:
         """
-        Internal helper function for stopping the rpc_commlayer subscription
-        upon receiving a result from the RPC_server
+        A new unique uid for a RPCStack, cheaper than uuid4().hex
         """
-        logger.debug("Start waiting for result with uid: %s", uid)
-        result = None
-        while True:
-            event, channel = await self.queue.get()
+        return f"{self._uid_prefix}{next(self._uid_counter):x}"
 
-            assert isinstance(event, RPCResult) or isinstance(event, RPCException)
+    def proxy(self, namespace: str, timeout: float = 300, channel=None) -> RPCProxy:
+        """
+        Returns a RPCProxy for the object registered under namespace
+        on the RPCServer, for example:
 
-            # Discard everything that we don't need...
-            if event.uid == uid:
-                logger.debug("Received result for uid: %s, %s", uid, event)
-                result = event
-                break
+            nodes = client.proxy("TEST").nodes
+            count = await nodes.subset("2D").count
 
-        # Stop subscription, automatically stops
-        # queue processing as well
-        await self.rpc_commlayer.unsubscribe()
+        :param timeout: the timeout of the RPCStacks
+        :param channel: (optional) override the default publish channel
+        """
+        return RPCProxy(self, namespace, timeout=timeout, channel=channel)
 
-        return result
+    def set_batching(self, max_items: int = 100, window: float = 0.0):
+        """
+        Collect the RPCStacks of rpc_call's and send them as one RPCBatch
+        when max_items RPCStacks have been collected, or window seconds
+        after the first collected RPCStack. A window of 0 collects the
+        rpc_call's of the current event loop iteration.
+
+        The results of a RPCBatch are returned when all RPCStacks
+        in it have been executed.
+        """
+        assert max_items is None or max_items > 0
+        self._batching = True
+        self._max_items = max_items
+        self._window = window
+
+    def _collect(self, rpc_func_stack: RPCStack, channel=None) -> bool:
+        """
+        Add rpc_func_stack to the batch of channel, returns
+        True if the batch is full.
+        """
+        rpc_func_stacks = self._batch.setdefault(channel, [])
+        rpc_func_stacks.append(rpc_func_stack)
+
+        if self._max_items is not None and len(rpc_func_stacks) >= self._max_items:
+            return True
+
+        if self._batch_timer is None:
+            self._batch_timer = asyncio.get_running_loop().call_later(
+                self._window, self._on_batch_timer
+            )
+        return False
+
+    def _on_batch_timer(self):
+        self._batch_timer = None
+        task = asyncio.ensure_future(self.flush())
+        # Keep a reference until done
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """
+        Send the collected RPCStacks (see set_batching)
+        """
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+
+        for channel in list(self._batch):
+            await self._flush_channel(channel)
+
+    async def _flush_channel(self, channel=None):
+        rpc_func_stacks = self._batch.pop(channel, None)
+        if not rpc_func_stacks:
+            return
+
+        if len(rpc_func_stacks) == 1:
+            rpc_instance = rpc_func_stacks[0]
+        else:
+            rpc_instance = RPCBatch(
+                uuid4().hex,
+                None,
+                max_limit(rpc_func_stack.timeout for rpc_func_stack in rpc_func_stacks),
+                rpc_func_stacks,
+                priority=max(
+                    rpc_func_stack.priority for rpc_func_stack in rpc_func_stacks
+                ),
+                deadline=max_limit(
+                    rpc_func_stack.deadline for rpc_func_stack in rpc_func_stacks
+                ),
+            )
+
+        try:
+            count = await self.rpc_commlayer.publish(rpc_instance, channel=channel)
+        except Exception as e:
+            logger.exception("Failed to publish %s", rpc_instance)
+            count, error = 0, e
+        else:
+            error = None
+
+        logger.debug(
+            "RPC batched call: %s, %s stacks (received=%s, channel=%s)",
+            rpc_instance.uid,
+            len(rpc_func_stacks),
+            count,
+            channel,
+        )
+
+        if count == 0:
+            # Raise the error in the waiting rpc_call's
+            for rpc_func_stack in rpc_func_stacks:
+                future = self.futures.pop(rpc_func_stack.uid, None)
+                if future is None or future.done():
+                    continue
+                future.set_exception(
+                    error
+                    or NotReceived(
+                        f"rpc_call was not received by any subscriber {rpc_func_stack}"
+                    )
+                )
+
+    async def _ensure_receiving(self):
+        """
+        Subscribe and, with auto_serve, start background processing
+        if it is not running yet.
+        """
+        async with self._subscribe_lock:
+            await self.rpc_commlayer.do_subscribe()
+
+        if self.processing or not self.auto_serve:
+            return
+
+        self.processing = True
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    async def _receive(self):
+        """
+        Background processing started by _ensure_receiving, stops
+        when the subscription stops or the client is closed.
+        """
+        subscribe = asyncio.ensure_future(
+            self.rpc_commlayer.subscribe(self._on_rpc_event)
+        )
+        process = asyncio.ensure_future(self._process_queue())
+        try:
+            done, _ = await asyncio.wait(
+                [subscribe, process], return_when=asyncio.FIRST_COMPLETED
+            )
+            if process in done:
+                # Stopped by b'END', stop the subscription as well
+                await self.rpc_commlayer.unsubscribe()
+            else:
+                # Subscription stopped, stop processing the queue
+                await self.queue.put(b"END")
+                if not subscribe.cancelled() and subscribe.exception():
+                    # Reset the subscription, the next call subscribes again
+                    await self.rpc_commlayer.unsubscribe()
+            await asyncio.wait([subscribe, process])
+        finally:
+            subscribe.cancel()
+            process.cancel()
+            self.processing = False
+            self._receiver = None
+
+        for task in (subscribe, process):
+            if task.exception():
+                logger.error("RPC client processing failed: %s", task.exception())
+
+    @asynccontextmanager
+    async def _receiving(self):
+        """
+        Make sure results are received while in this context. Without
+        background processing (auto_serve disabled) the subscription is
+        shared by concurrent calls and stopped when the last one leaves.
+        """
+        await self._ensure_receiving()
+
+        if self.processing:
+            yield
+            return
+
+        self._waiting += 1
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(
+                self.rpc_commlayer.subscribe(self._on_rpc_event)
+            )
+        try:
+            yield
+        finally:
+            self._waiting -= 1
+            if self._waiting == 0:
+                async with self._subscribe_lock:
+                    # Stop subscription
+                    await self.rpc_commlayer.unsubscribe()
+                    await asyncio.gather(self._listener, return_exceptions=True)
+                    self._listener = None
 
     async def subscribe_call(
         self, rpc_sub_stack: RPCSubStack, channel=None
     ) -> Subscription:
         assert isinstance(rpc_sub_stack, RPCStack)
 
-        if not self.processing:
-            pass
-
         # Make sure to be subscribed before publishing
-        await self.rpc_commlayer.do_subscribe()
+        await self._ensure_receiving()
 
         subscription = Subscription(self, rpc_sub_stack)
 
@@ -98,56 +349,195 @@ class RPCClient(object):
 
         return subscription
 
-    async def rpc_call(self, rpc_func_stack: RPCStack, channel=None) -> RPCResult:
+    async def rpc_stream(self, rpc_func_stack: RPCStack, channel=None) -> Stream:
+        """
+        Execute the given rpc_func_stack and stream the result,
+        a (async) generator on the server side is sent in chunks:
+
+            async for item in await client.rpc_stream(rpc_func_stack):
+                ...
+
+        The chunks are received by the background processing (see
+        auto_serve), with auto_serve disabled client.serve() has to be
+        awaited. The stream can be stopped early with Stream.close().
+        """
+        assert isinstance(rpc_func_stack, RPCStack)
+
+        if not isinstance(rpc_func_stack, RPCStreamStack):
+            rpc_func_stack = RPCStreamStack(
+                rpc_func_stack.uid,
+                rpc_func_stack.namespace,
+                rpc_func_stack.timeout,
+                rpc_func_stack.stack,
+                respond_to=rpc_func_stack.respond_to,
+                priority=rpc_func_stack.priority,
+                deadline=rpc_func_stack.deadline,
+                handle=rpc_func_stack.handle,
+            )
+
+        # Make sure to be subscribed before publishing
+        await self._ensure_receiving()
+
+        stream = Stream(self, rpc_func_stack)
+        self.subscriptions[rpc_func_stack.uid] = stream
+
+        # Publish RPCStreamStack to RPCServer
+        count = await self.rpc_commlayer.publish(rpc_func_stack, channel=channel)
+
+        if count == 0:
+            self.subscriptions.pop(rpc_func_stack.uid, None)
+            raise NotReceived(
+                f"rpc_stream was not received by any server: {rpc_func_stack}"
+            )
+
+        return stream
+
+    async def rpc_handle(self, rpc_func_stack: RPCStack, channel=None) -> RPCHandle:
+        """
+        Execute the given rpc_func_stack, but keep the result on the
+        server and return a RPCHandle to it. Execute call stacks on
+        the result by setting RPCStack.handle to the handle_id:
+
+            handle = await client.rpc_handle(rpc_func_stack)
+            RPCStack(uuid4().hex, namespace, 300, stack, handle=handle.handle_id)
+
+        Release the handle with release_handle() when done.
+        """
+        assert isinstance(rpc_func_stack, RPCStack)
+
+        if not isinstance(rpc_func_stack, RPCHandleStack):
+            rpc_func_stack = RPCHandleStack(
+                rpc_func_stack.uid,
+                rpc_func_stack.namespace,
+                rpc_func_stack.timeout,
+                rpc_func_stack.stack,
+                respond_to=rpc_func_stack.respond_to,
+                priority=rpc_func_stack.priority,
+                deadline=rpc_func_stack.deadline,
+                handle=rpc_func_stack.handle,
+            )
+
+        return await self.rpc_call(rpc_func_stack, channel=channel)
+
+    async def retain_handle(self, handle: RPCHandle, channel=None) -> RPCHandle:
+        """
+        Increment the reference count of the handle, every
+        retain_handle() needs its own release_handle().
+        """
+        rpc_handle_stack = RPCHandleStack(
+            uuid4().hex, handle.namespace, 300, [], handle=handle.handle_id
+        )
+        return await self.rpc_call(rpc_handle_stack, channel=channel)
+
+    async def release_handle(self, handle: RPCHandle, channel=None) -> bool:
+        """
+        Release the handle, returns True if the object on the
+        server has been removed (no references left).
+        """
+        rpc_release_stack = RPCReleaseStack(
+            uuid4().hex, handle.namespace, 300, [], handle=handle.handle_id
+        )
+        return await self.rpc_call(rpc_release_stack, channel=channel)
+
+    async def rpc_call(
+        self, rpc_func_stack: RPCStack, channel=None, idempotent: bool = False
+    ) -> RPCResult:
         """
         Execute the given rpc_func_stack (RPCStack) and either
         return a RPCResult or raise an exception based on the returned
         RPCException.
 
         This function can both be called with awaiting client.serve() or
-        without. The difference is, that in the first case client.serve()
-        starts while loops for performing background processing.
+        without. Without client.serve() background processing is started
+        on first use, unless auto_serve is disabled. In that case every
+        call subscribes, waits for its result and unsubscribes.
 
         The channel (optional) argument can be used to override
         the default publish channel
+
+        Idempotent calls (executing them more than once does no harm) are
+        hedged according to the hedge_policy, if the client has one.
         """
         assert isinstance(rpc_func_stack, RPCStack)
 
-        # Make sure to be subscribed before publishing
-        await self.rpc_commlayer.do_subscribe()
-
-        # Always create a future before sending the rpc_func_stack
-        # else the result can come back before the future is created
-        future = asyncio.get_event_loop().create_future()
-        self.futures[rpc_func_stack.uid] = future
-        logger.debug("Added future for rpc_func_stack: %s", rpc_func_stack.uid)
+        cache_key = None
+        if (
+            self.cache is not None
+            and is_plain(rpc_func_stack)
+            and self.cache.caches(rpc_func_stack.namespace)
+        ):
+            cache_key = stack_key(
+                rpc_func_stack.namespace,
+                rpc_func_stack.stack,
+                self.rpc_commlayer.serialization,
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Cached result for rpc_func_stack %s", rpc_func_stack.uid)
+                return cached[0]
+            generation = self.cache.generation
+
+        # Let the server know when we stop waiting for the result,
+        # on a copy so rpc_func_stack can be sent again
+        rpc_func_stack = with_deadline(rpc_func_stack)
+
+        if (
+            idempotent
+            and self.hedge_policy is not None
+            and is_plain(rpc_func_stack)
+        ):
+            result = await self._hedged_call(rpc_func_stack, channel)
+        else:
+            result = await self._call(rpc_func_stack, channel)
 
-        # Publish RPCStack to RPCServer
-        count = await self.rpc_commlayer.publish(rpc_func_stack, channel=channel)
+        data = self._unpack_result(result)
+        if cache_key is not None:
+            self.cache.set(cache_key, rpc_func_stack.namespace, data, generation)
+        return data
 
-        logger.debug(
-            "RPC call rpc_func_stack: %s, %s (received=%s, channel=%s)",
-            rpc_func_stack.uid,
-            rpc_func_stack,
-            count,
-            channel,
-        )
+    async def _call(
+        self, rpc_func_stack: RPCStack, channel=None
+    ) -> Union[RPCResult, RPCException]:
+        """
+        Publish rpc_func_stack and wait for its result
+        """
+        # Make sure to be subscribed before publishing
+        async with self._receiving():
+            # Always create a future before sending the rpc_func_stack
+            # else the result can come back before the future is created
+            future = asyncio.get_event_loop().create_future()
+            self.futures[rpc_func_stack.uid] = future
+            logger.debug("Added future for rpc_func_stack: %s", rpc_func_stack.uid)
+
+            if self._batching and is_plain(rpc_func_stack):
+                # Published with other RPCStacks as one RPCBatch,
+                # errors are set on the future
+                if self._collect(rpc_func_stack, channel):
+                    await self._flush_channel(channel)
+            else:
+                # Publish RPCStack to RPCServer
+                count = await self.rpc_commlayer.publish(
+                    rpc_func_stack, channel=channel
+                )
 
-        if count == 0:
-            self.futures.pop(rpc_func_stack.uid)
-            future.set_result(None)
-            raise NotReceived(
-                f"rpc_call was not received " f"by any subscriber {rpc_func_stack}"
-            )
+                logger.debug(
+                    "RPC call rpc_func_stack: %s, %s (received=%s, channel=%s)",
+                    rpc_func_stack.uid,
+                    rpc_func_stack,
+                    count,
+                    channel,
+                )
 
-        if self.processing:
-            # client.serve() has been awaited, so
-            # background processing is taken care of.
+                if count == 0:
+                    self.futures.pop(rpc_func_stack.uid)
+                    future.set_result(None)
+                    raise NotReceived(
+                        f"rpc_call was not received "
+                        f"by any subscriber {rpc_func_stack}"
+                    )
 
-            # Create a future that should be resolved within
-            # the given timeout. The background processing initialized
-            # by client.serve() resolves the future when a result
-            # is returned.
+            # The future should be resolved within the given timeout,
+            # _on_rpc_event resolves the future when a result is returned.
             try:
                 result = await asyncio.wait_for(future, timeout=rpc_func_stack.timeout)
                 logger.debug(
@@ -158,43 +548,252 @@ class RPCClient(object):
             except asyncio.TimeoutError:
                 logger.debug("TimeoutError rpc_func_stack: %s", rpc_func_stack.uid)
                 raise RPCTimeoutError(f"rpc_func_stack: {rpc_func_stack}")
-        else:
-            # No background processing, so start the subscription
-            # and wait for result via asyncio.gather
-            # _wait_for_result is a helper function to unsubscribe
-            # on a result.
-
-            # Don't need future here anymore
-            self.futures.pop(rpc_func_stack.uid)
-            future.set_result(None)
-            try:
-                _, result = await asyncio.gather(
-                    self.rpc_commlayer.subscribe(self._on_rpc_event),
-                    self._wait_for_result(rpc_func_stack.uid),
+            finally:
+                # Timed out or cancelled
+                self.futures.pop(rpc_func_stack.uid, None)
+
+        return result
+
+    async def _hedged_call(
+        self, rpc_func_stack: RPCStack, channel=None
+    ) -> Union[RPCResult, RPCException]:
+        """
+        Publish rpc_func_stack and send hedges (copies with a new uid)
+        according to the hedge_policy, returns the first result. The
+        RPCServer being overloaded is retried as well.
+        """
+        policy = self.hedge_policy
+        policy.deposit()
+
+        namespace = rpc_func_stack.namespace
+        deadline = math.inf
+        if rpc_func_stack.timeout is not None:
+            deadline = time.monotonic() + rpc_func_stack.timeout
+        # attempt task -> (RPCStack, start time)
+        attempts = {}
+
+        def send(attempt_stack: RPCStack, attempt_channel):
+            task = asyncio.ensure_future(self._call(attempt_stack, attempt_channel))
+            attempts[task] = (attempt_stack, time.monotonic())
+            return task
+
+        pending = {send(rpc_func_stack, channel)}
+        hedges = 0
+        last = None
+        try:
+            while True:
+                can_hedge = hedges < policy.max_hedges
+                if pending:
+                    timeout = deadline - time.monotonic()
+                    if can_hedge:
+                        timeout = min(timeout, policy.delay(namespace))
+                    done, pending = await asyncio.wait(
+                        pending,
+                        timeout=None if timeout == math.inf else max(0, timeout),
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+
+                    for task in done:
+                        last = task
+                        if task.exception() is not None or self._is_overloaded(
+                            task.result()
+                        ):
+                            continue
+
+                        attempt_stack, started = attempts[task]
+                        policy.observe(namespace, time.monotonic() - started)
+                        if attempt_stack is not rpc_func_stack:
+                            policy.wins += 1
+                        return task.result()
+
+                    if done and pending:
+                        # Failed, but other attempts are still running
+                        continue
+                    if time.monotonic() >= deadline:
+                        break
+
+                # Slow or failed, hedge if within the budget
+                if not can_hedge or not policy.acquire():
+                    if not pending:
+                        break
+                    # Wait for the running attempts
+                    hedges = policy.max_hedges
+                    continue
+
+                hedges += 1
+                attempt_stack = dataclasses.replace(
+                    rpc_func_stack,
+                    uid=self.next_uid(),
+                    timeout=(
+                        None
+                        if rpc_func_stack.timeout is None
+                        else deadline - time.monotonic()
+                    ),
                 )
                 logger.debug(
-                    "Retrieved result for rpc_func_stack %s, %s",
+                    "Hedging rpc_func_stack %s with %s",
                     rpc_func_stack.uid,
-                    result,
+                    attempt_stack.uid,
                 )
-            except asyncio.TimeoutError:
-                logger.debug("TimeoutError rpc_func_stack: %s", rpc_func_stack.uid)
-                raise RPCTimeoutError(f"rpc_func_stack: {rpc_func_stack}")
+                pending.add(send(attempt_stack, policy.channel(hedges, channel)))
+        finally:
+            for task in pending:
+                # Ignore the result of this attempt
+                self._abandoned.set(attempts[task][0].uid, True)
+                task.cancel()
+
+        if last is None:
+            raise RPCTimeoutError(f"rpc_func_stack: {rpc_func_stack}")
+        # Raise the error of the last attempt or return its RPCException
+        return last.result()
+
+    @staticmethod
+    def _is_overloaded(result: Union[RPCResult, RPCException]) -> bool:
+        return (
+            isinstance(result, RPCException)
+            and result.classname == ServerOverloaded.__name__
+        )
 
+    def _unpack_result(self, result: Union[RPCResult, RPCException]):
+        """
+        Return the data of the RPCResult or raise
+        the exception of the RPCException
+        """
         if isinstance(result, RPCException):
-            logger.debug("RPC exception %s, %s", rpc_func_stack.uid, result)
-            # Try to resolve builtin errors
-            try:
-                exception_class = getattr(builtins, result.classname)
-            except AttributeError:
-                # Default to WrappedException if
-                # returned exception is not a builtin error
-                exception_class = WrappedException
+            logger.debug("RPC exception %s, %s", result.uid, result)
+            # Resolve builtin (or RPC) errors, defaults
+            # to WrappedException for other errors
+            exception_class = resolve_exception_class(result.classname)
 
             raise exception_class(*result.exc_args)
 
         return result.data
 
+    async def rpc_batch(
+        self,
+        rpc_func_stacks: List[RPCStack],
+        channel=None,
+        return_exceptions: bool = False,
+    ) -> List:
+        """
+        Execute the given RPCStacks with a single RPCBatch message, the
+        RPCServer executes them concurrently and returns all results in
+        a single message. Returns the results in the order of
+        rpc_func_stacks.
+
+        If return_exceptions is False the first exception is raised,
+        else exceptions are returned as results (like asyncio.gather).
+        """
+        assert all(isinstance(stack, RPCStack) for stack in rpc_func_stacks)
+        if not all(is_plain(stack) for stack in rpc_func_stacks):
+            raise ValueError("rpc_batch only supports plain RPCStacks (no handles)")
+
+        now = time.time()
+        rpc_func_stacks = [
+            with_deadline(rpc_func_stack, now) for rpc_func_stack in rpc_func_stacks
+        ]
+
+        timeout = max_limit(
+            rpc_func_stack.timeout for rpc_func_stack in rpc_func_stacks
+        )
+        rpc_batch = RPCBatch(
+            uuid4().hex,
+            None,
+            timeout,
+            rpc_func_stacks,
+            # Like _flush_channel, the most urgent RPCStack counts
+            priority=max(rpc_func_stack.priority for rpc_func_stack in rpc_func_stacks),
+            deadline=None if timeout is None else now + timeout,
+        )
+
+        # Make sure to be subscribed before publishing
+        async with self._receiving():
+            # Create a future for every RPCStack in the batch,
+            # they are resolved one by one from the RPCBatchResult
+            loop = asyncio.get_event_loop()
+            futures = []
+            for rpc_func_stack in rpc_func_stacks:
+                future = loop.create_future()
+                self.futures[rpc_func_stack.uid] = future
+                futures.append(future)
+
+            # Publish RPCBatch to RPCServer
+            count = await self.rpc_commlayer.publish(rpc_batch, channel=channel)
+
+            logger.debug(
+                "RPC batch: %s, %s stacks (received=%s, channel=%s)",
+                rpc_batch.uid,
+                len(rpc_func_stacks),
+                count,
+                channel,
+            )
+
+            if count == 0:
+                for rpc_func_stack in rpc_func_stacks:
+                    self.futures.pop(rpc_func_stack.uid, None)
+                raise NotReceived(
+                    f"rpc_batch was not received by any subscriber {rpc_batch}"
+                )
+
+            try:
+                await asyncio.wait_for(asyncio.gather(*futures), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.debug("TimeoutError rpc_batch: %s", rpc_batch.uid)
+                for rpc_func_stack in rpc_func_stacks:
+                    self.futures.pop(rpc_func_stack.uid, None)
+                raise RPCTimeoutError(f"rpc_batch: {rpc_batch}")
+
+        results = []
+        for future in futures:
+            try:
+                results.append(self._unpack_result(future.result()))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    def _resolve_futures(self, event: Union[RPCResult, RPCException]) -> bool:
+        """
+        Resolve the future waiting for the event, a RPCBatchResult resolves
+        the futures of all RPCStacks in the batch.
+
+        Returns False if no future was found.
+        """
+        if isinstance(event, RPCBatchResult):
+            resolved = [self._resolve_futures(entry) for entry in event.data]
+            return all(resolved)
+
+        future = self.futures.pop(event.uid, None)
+        if future is None:
+            return False
+
+        # The future is done if the rpc_call timed out
+        if not future.done():
+            future.set_result(event)
+        return True
+
+    async def _dispatch(self, event: Union[RPCResult, RPCException]):
+        """
+        Resolve the future or enqueue the event in the
+        subscription waiting for it.
+        """
+        # A future is created & awaited in self.rpc_call
+        # resolve this future to proceed in the rpc_call function
+        # and return a result
+        if isinstance(event, RPCBatchResult) or event.uid in self.futures:
+            logger.debug("Found event in futures %s", event.uid)
+            self._resolve_futures(event)
+        elif event.uid in self.subscriptions:
+            logger.debug("Found event in subscriptions %s", event.uid)
+            subscription = self.subscriptions[event.uid]
+            await subscription.enqueue(event)
+        elif event.uid in self._abandoned:
+            logger.debug("Ignoring result of hedged attempt %s", event.uid)
+        elif not isinstance(event, RPCPubResult):
+            # FUTURE NOT FOUND FOR EVENT
+            logger.exception("Future not found for %s, %s", event.uid, event)
+
     async def _on_rpc_event(self, rpc_instance: RPCBase, channel: bytes = None):
         """
         Callback function sent to rpc_commlayer, is called
@@ -202,8 +801,20 @@ class RPCClient(object):
         """
         logger.debug("New RPC event %s", rpc_instance)
         assert isinstance(rpc_instance, RPCBase)
-        # Put everything in a queue and process
-        # it afterwards
+
+        if isinstance(rpc_instance, RPCResult) or isinstance(
+            rpc_instance, RPCException
+        ):
+            # Results don't need the queue, resolve them directly
+            await self._dispatch(rpc_instance)
+            return
+
+        if isinstance(rpc_instance, RPCCacheInvalidation) and self.cache is not None:
+            logger.debug("Invalidating cache %s", rpc_instance)
+            self.cache.invalidate(rpc_instance.namespace, rpc_instance.key)
+
+        # Put RPCMessages in a queue and process
+        # them afterwards
         await self.queue.put((rpc_instance, channel))
 
     async def _process_queue(self, on_rpc_message: callable = None):
@@ -224,37 +835,24 @@ class RPCClient(object):
 
             event, channel = item
             # The event can either be a:
-            # 1) RPCResult or RPCException as a result from the RPCServer
-            # 3) RPCMessage as a message from the RPCServer
+            # 1) RPCMessage as a message from the RPCServer
+            # 2) RPCResult or RPCException put in the queue directly
             assert (
                 isinstance(event, RPCResult)
                 or isinstance(event, RPCException)
                 or isinstance(event, RPCMessage)
             )
 
-            if isinstance(event, RPCResult) or isinstance(event, RPCException):
+            if isinstance(event, RPCMessage):
+                # on_rpc_message can be set by serve() after
+                # auto_serve processing has started
+                callback = on_rpc_message or self.on_rpc_message
+                if callback:
+                    logger.debug("RPCMessage received: %s", event)
+                    await callback(event, channel)
+            else:
                 logger.debug("Received new queue item %s, %s", event.uid, event)
-                if event.uid in self.futures:
-                    logger.debug("Found event in futures %s", event.uid)
-                    # A future is created & awaited in self.rpc_call
-                    # resolve this future to proceed in the rpc_call function
-                    # and return a result
-                    future = self.futures.pop(event.uid)
-                    if future is not None:
-                        future.set_result(event)
-                elif event.uid in self.subscriptions:
-                    logger.debug("Found event in subscriptions %s", event.uid)
-                    subscription = self.subscriptions[event.uid]
-                    await subscription.enqueue(event)
-                else:
-                    # FUTURE NOT FOUND FOR EVENT
-                    if not isinstance(event, RPCPubResult):
-                        logger.exception(
-                            "Future not found for %s, %s", event.uid, event
-                        )
-            elif isinstance(event, RPCMessage) and on_rpc_message:
-                logger.debug("RPCMessage received: %s", event)
-                await on_rpc_message(event, channel)
+                await self._dispatch(event)
 
         self.processing = False
 
@@ -266,7 +864,23 @@ class RPCClient(object):
         Use this method in an async context to enable
         background processing and allowing multiple
         rpc_calls asynchroniously.
+
+        If background processing has already been started on
+        first use (auto_serve), waits for it instead.
         """
+        if on_rpc_message is not None:
+            self.on_rpc_message = on_rpc_message
+
+        if self._receiver is not None:
+            await asyncio.shield(self._receiver)
+            return
+
+        # Don't start the auto_serve processing as well
+        self.processing = True
+
+        # Make sure the subscription exists
+        async with self._subscribe_lock:
+            await self.rpc_commlayer.do_subscribe()
 
         task_args_map = {
             self.rpc_commlayer.subscribe: [self._on_rpc_event],
@@ -300,5 +914,6 @@ class RPCClient(object):
         """
         Gracefully shutdown the client and rpc_commlayer
         """
+        await self.flush()
         await self.queue.put(b"END")
         await self.rpc_commlayer.close()
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
+from typing import List
 
-from asyncio_rpc.models import RPCBase
+from asyncio_rpc.models import RPCBase, RPCResult
 
 
 class AbstractRPCCommLayer(ABC):
@@ -9,11 +10,46 @@ class AbstractRPCCommLayer(ABC):
     """
 
     @abstractmethod
-    async def publish(self, rpc_instance: RPCBase):
+    async def publish(
+        self, rpc_instance: RPCBase, channel=None, serialized_data: bytes = None
+    ):
         """
         Publish a RPCBase subclass to the other end,
         either a RPCServer or RPCClient.
+
+        For RPCResults serialized_data can be given to
+        send already serialized result data instead of
+        serializing RPCResult.data.
+        """
+
+    async def publish_many(
+        self,
+        rpc_results: List[RPCResult],
+        channels: List,
+        serialized_data: bytes,
+        expire: float = None,
+    ) -> List[int]:
+        """
+        Publish RPCResults with the same (already serialized) data,
+        rpc_results[i] is published on channels[i]. Returns the
+        number of receivers per RPCResult.
+
+        Implementations can store/send the data only once, expire is
+        the number of seconds (if set) the receivers get to retrieve
+        data that is stored once.
         """
+        if serialized_data is None:
+            # Only pass serialized_data when it is used, like RPCServer
+            return [
+                await self.publish(rpc_result, channel=channel)
+                for rpc_result, channel in zip(rpc_results, channels)
+            ]
+        return [
+            await self.publish(
+                rpc_result, channel=channel, serialized_data=serialized_data
+            )
+            for rpc_result, channel in zip(rpc_results, channels)
+        ]
 
     @abstractmethod
     async def do_subscribe(self):
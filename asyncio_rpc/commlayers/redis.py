@@ -1,12 +1,16 @@
-from typing import Optional
+import asyncio
+import math
+from typing import List, Optional
 from uuid import uuid4
 
 import redis.asyncio as async_redis
 
-from ..models import SERIALIZABLE_MODELS, RPCBase, RPCResult, RPCStack
+from ..models import SERIALIZABLE_MODELS, RPCBase, RPCException, RPCResult, RPCStack
 from .base import AbstractRPCCommLayer
 
 RESULT_EXPIRE_TIME = 300  # seconds
+CHUNK_SIZE = 4 * 1024 * 1024  # bytes
+CHUNK_CONCURRENCY = 8  # concurrent SET/GET's per chunked result
 
 
 class RPCRedisCommLayer(AbstractRPCCommLayer):
@@ -22,10 +26,18 @@ class RPCRedisCommLayer(AbstractRPCCommLayer):
         host="localhost",
         port=6379,
         serialization=None,
+        chunk_threshold: int = None,
+        chunk_size: int = CHUNK_SIZE,
     ):
         """
         Use a static create method to allow async context,
         __init__ cannot be async.
+
+        :param chunk_threshold: (optional) serialized result data larger
+            than chunk_threshold bytes is stored in chunks of chunk_size
+            bytes, instead of one redis value. Both the client and server
+            should use a version that supports chunked results.
+        :param chunk_size: the chunk size in bytes
         """
 
         self = RPCRedisCommLayer(subchannel, pubchannel)
@@ -34,6 +46,9 @@ class RPCRedisCommLayer(AbstractRPCCommLayer):
         self.host = host
         self.port = port
         self.serialization = serialization
+        assert chunk_size > 0
+        self.chunk_threshold = chunk_threshold
+        self.chunk_size = chunk_size
 
         # Redis for publishing
         self.redis = async_redis.from_url(
@@ -67,19 +82,28 @@ class RPCRedisCommLayer(AbstractRPCCommLayer):
         self.pubchannel = pubchannel
         self.redis: async_redis.Redis
         self.pub_sub = None
+        self.chunk_threshold = None
+        self.chunk_size = CHUNK_SIZE
 
     async def do_subscribe(self):
         if not self.subscribed:
+            if self.sub_redis is not None:
+                # Redis of a previous (stopped or failed) subscription
+                await self.sub_redis.close()
             # By default subscribe
             self.sub_redis = async_redis.from_url(f"redis://{self.host}")
             self.pub_sub = self.sub_redis.pubsub(ignore_subscribe_messages=True)
             await self.pub_sub.subscribe(self.subchannel)
             self.subscribed = True
 
-    async def publish(self, rpc_instance: RPCBase, channel=None):
+    async def publish(
+        self, rpc_instance: RPCBase, channel=None, serialized_data: bytes = None
+    ):
         """
         Publish redis implementation, publishes RPCBase instances.
 
+        :param serialized_data: (optional) already serialized
+            RPCResult data, used instead of rpc_instance.data
         :return: the number of receivers
         """
         # rpc_instance should be a subclass of RPCBase
@@ -89,22 +113,18 @@ class RPCRedisCommLayer(AbstractRPCCommLayer):
         if isinstance(rpc_instance, RPCStack):
             # Add subchannel to RPCStack as respond_to
             rpc_instance.respond_to = self.subchannel
-        elif isinstance(rpc_instance, RPCResult) and rpc_instance.data is not None:
+        elif isinstance(rpc_instance, RPCResult) and (
+            rpc_instance.data is not None or serialized_data is not None
+        ):
             # Customized:
             # result data via redis.set
             # result without data via redis.publish
-            redis_key = uuid4().hex
-
-            # Store the result data via key/value in redis
-            await self.redis.set(
-                redis_key,
-                self.serialization.dumpb(rpc_instance.data),
-                ex=RESULT_EXPIRE_TIME,
-            )
+            if serialized_data is None:
+                serialized_data = self.serialization.dumpb(rpc_instance.data)
 
             # Set redis_key and remove data, since
             # this is stored in redis now
-            rpc_instance.data = {"redis_key": redis_key}
+            rpc_instance.data = await self._store_data(serialized_data)
 
         # Override the pub_channel with channel, if set
         pub_channel = channel if channel is not None else self.pubchannel
@@ -114,16 +134,145 @@ class RPCRedisCommLayer(AbstractRPCCommLayer):
             pub_channel, self.serialization.dumpb(rpc_instance)
         )
 
+    async def publish_many(
+        self,
+        rpc_results: List[RPCResult],
+        channels: List,
+        serialized_data: bytes,
+        expire: float = None,
+    ) -> List[int]:
+        """
+        Redis implementation of publish_many, the data is stored once and
+        the RPCResults are published in one round trip. The stored data
+        is marked as shared, receivers don't delete it after retrieval
+        but it expires after expire seconds (RESULT_EXPIRE_TIME if not
+        set). A single RPCResult is published as usual.
+        """
+        if len(rpc_results) == 1:
+            # The receiver deletes the data after retrieval
+            return [
+                await self.publish(
+                    rpc_results[0], channel=channels[0], serialized_data=serialized_data
+                )
+            ]
+
+        data = None
+        if serialized_data is not None:
+            expire = RESULT_EXPIRE_TIME if expire is None else max(1, math.ceil(expire))
+            data = await self._store_data(serialized_data, expire=expire)
+            data["shared"] = True
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for rpc_result, channel in zip(rpc_results, channels):
+                assert isinstance(rpc_result, RPCResult)
+                rpc_result.data = data
+                pipe.publish(
+                    channel if channel is not None else self.pubchannel,
+                    self.serialization.dumpb(rpc_result),
+                )
+            return await pipe.execute()
+
+    async def _store_data(
+        self, serialized_data: bytes, expire: int = RESULT_EXPIRE_TIME
+    ) -> dict:
+        """
+        Store serialized result data for expire seconds, returns
+        the data to publish instead of the result data.
+        """
+        redis_key = uuid4().hex
+
+        if (
+            self.chunk_threshold is not None
+            and len(serialized_data) > self.chunk_threshold
+        ):
+            # Store large results in chunks
+            return await self._set_chunks(redis_key, serialized_data, expire)
+
+        # Store the result data via key/value in redis
+        await self.redis.set(redis_key, serialized_data, ex=expire)
+        return {"redis_key": redis_key}
+
     async def get_data(self, redis_key, delete=True):
         """
         Helper function to get data by redis_key, by default
         delete the data after retrieval.
         """
-        data = self.serialization.loadb(await self.redis.get(redis_key))
+        serialized_data = await self.redis.get(redis_key)
+        if serialized_data is None:
+            raise KeyError(f"Missing data {redis_key}")
+        data = self.serialization.loadb(serialized_data)
         if delete:
             await self.redis.delete(redis_key)
         return data
 
+    async def _set_chunks(
+        self, redis_key, serialized_data: bytes, expire: int = RESULT_EXPIRE_TIME
+    ):
+        """
+        Store serialized_data in chunks (concurrently) under
+        redis_key:0, redis_key:1, etc. Returns the data to
+        publish instead of the result data.
+        """
+        data = memoryview(serialized_data)
+        chunk_size = self.chunk_size
+        semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+        async def set_chunk(i, offset):
+            async with semaphore:
+                await self.redis.set(
+                    f"{redis_key}:{i}",
+                    data[offset : offset + chunk_size],
+                    ex=expire,
+                )
+
+        offsets = range(0, len(data), chunk_size)
+        await asyncio.gather(
+            *(set_chunk(i, offset) for i, offset in enumerate(offsets))
+        )
+        return {
+            "redis_key": redis_key,
+            "chunks": len(offsets),
+            "chunk_size": chunk_size,
+            "size": len(data),
+        }
+
+    async def get_chunked_data(self, chunked: dict, delete=True):
+        """
+        Get the data of a result stored in chunks, the chunks are
+        fetched concurrently into one preallocated buffer. By default
+        delete the chunks after retrieval.
+        """
+        redis_key = chunked["redis_key"]
+        chunk_size = chunked["chunk_size"]
+        keys = [f"{redis_key}:{i}" for i in range(chunked["chunks"])]
+        buffer = bytearray(chunked["size"])
+        semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+
+        async def get_chunk(i, key):
+            async with semaphore:
+                chunk = await self.redis.get(key)
+            if chunk is None:
+                raise KeyError(f"Missing chunk {key}")
+            offset = i * chunk_size
+            buffer[offset : offset + len(chunk)] = chunk
+
+        try:
+            await asyncio.gather(*(get_chunk(i, key) for i, key in enumerate(keys)))
+        finally:
+            if delete:
+                await self.redis.delete(*keys)
+        return self.serialization.loadb(buffer)
+
+    async def _get_event_data(self, stored: dict):
+        """
+        Get the result data stored via _store_data
+        """
+        # Shared data is received by multiple clients
+        delete = not stored.get("shared", False)
+        if "chunks" in stored:
+            return await self.get_chunked_data(stored, delete=delete)
+        return await self.get_data(stored["redis_key"], delete=delete)
+
     async def _process_msg(self, msg, on_rpc_event_callback, channel_name):
         """
         Interal message processing, is called on every received
@@ -143,7 +292,17 @@ class RPCRedisCommLayer(AbstractRPCCommLayer):
 
                 # Get data from redis and put it on the event
                 if isinstance(event.data, dict) and "redis_key" in event.data:
-                    event.data = await self.get_data(event.data["redis_key"])
+                    try:
+                        event.data = await self._get_event_data(event.data)
+                    except Exception as e:
+                        # The data has expired or is gone, only this result
+                        # fails instead of the whole subscription
+                        event = RPCException(
+                            uid=event.uid,
+                            namespace=event.namespace,
+                            classname=e.__class__.__name__,
+                            exc_args=list(e.args),
+                        )
 
             await on_rpc_event_callback(event, channel=channel_name)
 
@@ -165,14 +324,17 @@ class RPCRedisCommLayer(AbstractRPCCommLayer):
 
         if channel is not None:
             await pub_sub.subscribe(channel)
-        async with pub_sub as ps:
-            # Inside a while loop, wait for incoming events.
-            async for message in ps.listen():
-                if message is not None:
-                    await self._process_msg(
-                        message["data"], on_rpc_event_callback, message["channel"]
-                    )
-        self.subscribed = False
+        try:
+            async with pub_sub as ps:
+                # Inside a while loop, wait for incoming events.
+                async for message in ps.listen():
+                    if message is not None:
+                        await self._process_msg(
+                            message["data"], on_rpc_event_callback, message["channel"]
+                        )
+        finally:
+            # Also when failing, the next do_subscribe subscribes again
+            self.subscribed = False
 
     async def unsubscribe(self):
         """
@@ -0,0 +1,46 @@
+def run_in_thread(func):
+    """
+    Server side decorator for methods (or property getters) that
+    block or are CPU heavy. The DefaultExecutor runs the call stack
+    from this method onwards in its thread pool instead of on the
+    event loop.
+    """
+    func._rpc_run_in_thread = True
+    return func
+
+
+def memoize(func):
+    """
+    Server side decorator for methods (or property getters) returning
+    an intermediate resource that only depends on the call stack up
+    to and including this method. A DefaultExecutor with a prefix cache
+    keeps these resources, so call stacks sharing the prefix only
+    execute the remainder of the stack.
+
+    Only prefixes where every step is decorated are memoized.
+    """
+    func._rpc_memoize = True
+    return func
+
+
+def cacheable(ttl: float = None):
+    """
+    Server side decorator for methods (or property getters) whose
+    result only depends on their arguments. Call stacks starting with
+    this method are cached by the RPCServer result cache (if enabled)
+    for ttl seconds, or the default ttl of the cache if not given.
+    Chained call stacks are only cached if every step is decorated
+    with @cacheable or @memoize.
+
+    Usage:
+        @cacheable(ttl=60)
+        def nodes(self):
+            ...
+    """
+
+    def decorator(func):
+        func._rpc_cacheable = True
+        func._rpc_cache_ttl = ttl
+        return func
+
+    return decorator
@@ -1,3 +1,6 @@
+import builtins
+
+
 class NotReceived(Exception):
     """
     Message has not been recieved by anyone
@@ -23,3 +26,40 @@ class SubscriptionClosed(Exception):
     """
     Raised when the subscription has already been closed
     """
+
+
+class ServerOverloaded(Exception):
+    """
+    Raised when the RPCServer rejected or dropped the RPC call
+    because its queue is full. The call has not been executed,
+    it is safe to back off and retry (on another server).
+    """
+
+
+class HandleNotFound(Exception):
+    """
+    Raised when a RPCStack refers to a handle that has been
+    released, expired or evicted from the RPCServer's ObjectStore.
+    """
+
+
+# Exceptions raised by the RPCServer that can be
+# re-raised as is by the RPCClient
+RPC_EXCEPTIONS = {
+    exception.__name__: exception for exception in (ServerOverloaded, HandleNotFound)
+}
+
+
+def resolve_exception_class(classname: str):
+    """
+    Resolve the exception class of a RPCException by its classname,
+    either a builtin error or one of the RPC_EXCEPTIONS. Defaults to
+    WrappedException if the exception could not be resolved.
+    """
+    if classname in RPC_EXCEPTIONS:
+        return RPC_EXCEPTIONS[classname]
+
+    try:
+        return getattr(builtins, classname)
+    except AttributeError:
+        return WrappedException
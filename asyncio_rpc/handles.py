@@ -0,0 +1,120 @@
+import time
+from typing import Any
+
+from asyncio_rpc.cache import LRUCache, object_size
+from asyncio_rpc.exceptions import HandleNotFound
+
+
+class StoredObject:
+    __slots__ = ("obj", "namespace", "refcount", "size")
+
+    def __init__(self, obj: Any, namespace: str, size: int):
+        self.obj = obj
+        self.namespace = namespace
+        self.refcount = 1
+        self.size = size
+
+
+class ObjectStore:
+    """
+    Objects kept on the RPCServer for RPCHandles. Objects are removed
+    when they are no longer referenced, have not been used for idle_ttl
+    seconds or when the store is full (least recently used first).
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, max_size: int = None, idle_ttl: float = 600
+    ):
+        """
+        :param max_entries: maximum number of stored objects
+        :param max_size: (optional) maximum total (estimated) size
+            of the stored objects in bytes, see object_size
+        :param idle_ttl: (optional) remove objects that have not been
+            used for idle_ttl seconds
+        """
+        self.idle_ttl = idle_ttl
+        self._objects = LRUCache(max_entries=max_entries, max_size=max_size)
+        self._last_expire = time.monotonic()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, handle_id: str):
+        return handle_id in self._objects
+
+    @property
+    def size(self):
+        return self._objects.size
+
+    def _set(self, handle_id: str, stored: StoredObject):
+        self._objects.set(
+            handle_id,
+            stored,
+            ttl=self.idle_ttl,
+            size=stored.size,
+            tag=stored.namespace,
+        )
+
+    def _get(self, handle_id: str, namespace: str) -> StoredObject:
+        stored = self._objects.get(handle_id)
+        if stored is None or stored.namespace != namespace:
+            raise HandleNotFound(f"Handle {handle_id} not found in {namespace}")
+        return stored
+
+    def put(self, handle_id: str, namespace: str, obj: Any):
+        """
+        Store obj under handle_id with a reference count of 1, raises
+        ValueError if obj is larger than the max_size of the store.
+        """
+        size = object_size(obj)
+        if self._objects.max_size is not None and size > self._objects.max_size:
+            raise ValueError(
+                f"Object of {size} bytes exceeds the ObjectStore "
+                f"max_size of {self._objects.max_size} bytes"
+            )
+
+        now = time.monotonic()
+        if self.idle_ttl is not None and now - self._last_expire > 1:
+            # Otherwise idle objects are only removed when accessed
+            self._objects.expire()
+            self._last_expire = now
+
+        self._set(handle_id, StoredObject(obj, namespace, size))
+
+    def get(self, handle_id: str, namespace: str) -> Any:
+        """
+        Get the object stored under handle_id, raises HandleNotFound
+        if it does not exist (anymore).
+        """
+        stored = self._get(handle_id, namespace)
+        if self.idle_ttl is not None:
+            # Used, reset the idle time
+            self._set(handle_id, stored)
+        return stored.obj
+
+    def retain(self, handle_id: str, namespace: str):
+        """
+        Increment the reference count of handle_id
+        """
+        stored = self._get(handle_id, namespace)
+        stored.refcount += 1
+        if self.idle_ttl is not None:
+            self._set(handle_id, stored)
+
+    def release(self, handle_id: str, namespace: str) -> bool:
+        """
+        Decrement the reference count of handle_id, returns True
+        if the object has been removed.
+        """
+        stored = self._get(handle_id, namespace)
+        stored.refcount -= 1
+        if stored.refcount > 0:
+            return False
+        self._objects.pop(handle_id)
+        return True
+
+    def invalidate(self, namespace: str = None):
+        """
+        Remove all objects of namespace, or all objects
+        """
+        self._objects.invalidate(namespace)
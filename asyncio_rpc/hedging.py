@@ -0,0 +1,100 @@
+from typing import List, Sequence
+
+from asyncio_rpc.metrics import LATENCY_BUCKETS, Histogram
+
+
+class HedgePolicy:
+    """
+    Hedged requests for idempotent rpc_call's: if no result arrived
+    within the percentile latency of earlier calls of the namespace,
+    the RPCStack is sent again (with a new uid, optionally to an
+    alternate channel) and the first result is used. Results of the
+    other attempts are ignored.
+
+    Hedges and retries are limited by a budget, every idempotent call
+    adds budget tokens and every hedge costs one token, so at most
+    about budget * calls extra RPCStacks are sent.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        initial_delay: float = 0.1,
+        min_delay: float = 0.001,
+        min_samples: int = 20,
+        max_hedges: int = 1,
+        budget: float = 0.1,
+        max_tokens: float = 10,
+        channels: List = None,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        """
+        :param percentile: hedge after this percentile of the latency
+        :param initial_delay: hedge delay in seconds until min_samples
+            latencies of the namespace have been observed
+        :param min_delay: minimum hedge delay in seconds
+        :param min_samples: minimum number of observed latencies
+            before using the percentile
+        :param max_hedges: maximum number of extra attempts per call
+        :param budget: tokens added per idempotent call
+        :param max_tokens: maximum number of saved up tokens
+        :param channels: (optional) alternate channels for the hedges,
+            used round robin. By default hedges are sent to the channel
+            of the call, with a new uid another worker of
+            serve_multiprocess receives it.
+        :param buckets: upper bounds of the latency histogram buckets,
+            the delay is the upper bound of the percentile bucket
+        """
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self.budget = budget
+        self.max_tokens = max_tokens
+        self.channels = list(channels or [])
+        self.buckets = buckets
+        self.tokens = max_tokens
+        self.hedges = 0
+        self.wins = 0
+        # namespace -> Histogram of the latencies
+        self.latencies = {}
+
+    def delay(self, namespace: str) -> float:
+        """
+        Seconds to wait for a result before hedging
+        """
+        latency = self.latencies.get(namespace)
+        if latency is None or latency.count < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, latency.percentile(self.percentile))
+
+    def observe(self, namespace: str, duration: float):
+        """
+        Record the latency of an attempt of namespace
+        """
+        latency = self.latencies.get(namespace)
+        if latency is None:
+            latency = self.latencies[namespace] = Histogram(self.buckets)
+        latency.observe(duration)
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.budget)
+
+    def acquire(self) -> bool:
+        """
+        Take a token for a hedge, returns False if the budget is spent
+        """
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.hedges += 1
+        return True
+
+    def channel(self, attempt: int, channel=None):
+        """
+        The channel for the attempt (1 for the first hedge)
+        """
+        if not self.channels:
+            return channel
+        return self.channels[(attempt - 1) % len(self.channels)]
@@ -0,0 +1,260 @@
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from typing import Sequence
+
+from asyncio_rpc.models import RPCBatch, RPCStack
+
+# Reserved namespace of the metrics registered on the RPCServer
+METRICS_NAMESPACE = "__metrics__"
+
+# Methods of ServerMetrics exposed to every RPCClient
+METRICS_READ_METHODS = ["snapshot", "queue_depth", "in_flight", "profile"]
+
+# Methods of ServerMetrics changing the metrics or profiling,
+# only exposed if enabled with RPCServer(metrics_control=True)
+METRICS_CONTROL_METHODS = ["reset", "set_profiling", "reset_profile"]
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, observing a value
+    only increments a preallocated counter.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        :param buckets: the sorted upper bounds of the buckets, values
+            larger than the last bound are counted in an overflow bucket
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket containing the q-th percentile
+        (0 < q <= 100), None without observations.
+        """
+        if self.count == 0:
+            return None
+
+        rank = q / 100 * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        return {
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class NamespaceMetrics:
+    """
+    Counters and latency histogram of a single namespace
+    """
+
+    __slots__ = ("calls", "errors", "shed", "expired", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.shed = 0
+        self.expired = 0
+        self.latency = Histogram()
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": self.errors / self.calls if self.calls else 0.0,
+            "shed": self.shed,
+            "expired": self.expired,
+            "p50": self.latency.percentile(50),
+            "p99": self.latency.percentile(99),
+            "latency": self.latency.as_dict(),
+        }
+
+
+class Profiler:
+    """
+    Aggregates the time spent per step of the profiled call stacks,
+    by "Type.name" of the called method, property or attribute.
+    """
+
+    def __init__(self):
+        # name -> [calls, total time, max time]
+        self.steps = {}
+        # Steps can be executed in the thread pool
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration: float):
+        with self._lock:
+            step = self.steps.get(name)
+            if step is None:
+                self.steps[name] = [1, duration, duration]
+            else:
+                step[0] += 1
+                step[1] += duration
+                if duration > step[2]:
+                    step[2] = duration
+
+    def as_dict(self) -> dict:
+        """
+        The aggregated steps, the most expensive (total time) first
+        """
+        with self._lock:
+            steps = sorted(self.steps.items(), key=lambda item: -item[1][1])
+        return {
+            name: {"calls": calls, "total": total, "mean": total / calls, "max": max_}
+            for name, (calls, total, max_) in steps
+        }
+
+    def clear(self):
+        with self._lock:
+            self.steps = {}
+
+
+class ServerMetrics:
+    """
+    Metrics recorded by the RPCServer, registered on the RPCServer
+    under METRICS_NAMESPACE so any RPCClient can query them.
+    """
+
+    def __init__(self, server, profile_rate: int = None):
+        """
+        :param server: the RPCServer
+        :param profile_rate: (optional) profile one in every
+            profile_rate call stacks, see set_profiling
+        """
+        self._server = server
+        self.started = time.time()
+        self.in_flight = 0
+        self.namespaces = {}
+        self.profiler = Profiler()
+        self.set_profiling(profile_rate)
+
+    def set_profiling(self, rate: int = None):
+        """
+        Profile one in every rate call stacks, the time of every
+        step of the call stack is recorded. None (or 0) disables
+        profiling.
+        """
+        self.profile_rate = rate or None
+        self._profile_counter = itertools.count()
+
+    def sample(self):
+        """
+        Returns the Profiler if the next call stack should be
+        profiled, otherwise None.
+        """
+        if self.profile_rate is None:
+            return None
+        if next(self._profile_counter) % self.profile_rate == 0:
+            return self.profiler
+        return None
+
+    def profile(self) -> dict:
+        """
+        Time spent per "Type.name" step of the profiled call stacks
+        """
+        return self.profiler.as_dict()
+
+    def reset_profile(self):
+        self.profiler.clear()
+
+    def _namespace(self, namespace: str) -> NamespaceMetrics:
+        metrics = self.namespaces.get(namespace)
+        if metrics is None:
+            metrics = self.namespaces[namespace] = NamespaceMetrics()
+        return metrics
+
+    def observe(self, namespace: str, duration: float, error: bool = False):
+        """
+        Record an executed call stack of namespace
+        """
+        metrics = self._namespace(namespace)
+        metrics.calls += 1
+        if error:
+            metrics.errors += 1
+        metrics.latency.observe(duration)
+
+    def observe_shed(self, rpc_func_stack: RPCStack):
+        for namespace in self._namespaces_of(rpc_func_stack):
+            self._namespace(namespace).shed += 1
+
+    def observe_expired(self, rpc_func_stack: RPCStack):
+        for namespace in self._namespaces_of(rpc_func_stack):
+            self._namespace(namespace).expired += 1
+
+    @staticmethod
+    def _namespaces_of(rpc_func_stack: RPCStack):
+        if isinstance(rpc_func_stack, RPCBatch):
+            # Batches have no namespace, count their RPCStacks
+            return [entry.namespace for entry in rpc_func_stack.stack]
+        return [rpc_func_stack.namespace]
+
+    def queue_depth(self) -> int:
+        return self._server.queue.qsize()
+
+    def snapshot(self) -> dict:
+        """
+        All metrics as a (serializable) dict
+        """
+        return {
+            "uptime": time.time() - self.started,
+            "queue_depth": self.queue_depth(),
+            "queued": {
+                namespace: count
+                for namespace, count in self._server.queue.namespace_counts.items()
+                if count and namespace is not None
+            },
+            "in_flight": self.in_flight,
+            "namespaces": {
+                namespace: metrics.as_dict()
+                for namespace, metrics in self.namespaces.items()
+            },
+        }
+
+    def reset(self):
+        """
+        Reset the counters and histograms, not the gauges
+        """
+        self.started = time.time()
+        self.namespaces = {}
@@ -23,6 +23,20 @@ class RPCMessage(RPCBase):
     data: Any
 
 
+@dataclass
+class RPCCacheInvalidation(RPCMessage):
+    """
+    Message from the RPCServer evicting results from the ClientCache
+    of RPCClients, by key (see stack_key), by namespace or all
+    results if neither is given.
+
+    :param key: (optional) the key of the cached result
+    """
+
+    data: Any = None
+    key: str = None
+
+
 @dataclass
 class RPCCall(RPCBase):
     """
@@ -55,6 +69,16 @@ class RPCStack(RPCBase):
         ]
 
     Note: properties are also encoded as function calls.
+
+    RPCStacks with a higher priority are executed first by the
+    RPCServer, RPCStacks with equal priority in order of arrival.
+
+    The deadline is the absolute time (time.time()) after which the
+    client is no longer waiting for the result, it is set by the
+    RPCClient based on the timeout.
+
+    If handle (a RPCHandle.handle_id) is set the stack is executed on
+    the object stored under the handle instead of the registered instance.
     """
 
     uid: str
@@ -62,6 +86,9 @@ class RPCStack(RPCBase):
     timeout: float
     stack: List[RPCCall]
     respond_to: str = None
+    priority: int = 0
+    deadline: float = None
+    handle: str = None
 
 
 @dataclass
@@ -78,6 +105,50 @@ class RPCUnSubStack(RPCStack):
     """
 
 
+@dataclass
+class RPCStreamStack(RPCStack):
+    """
+    Same as RPCStack, but the result (a generator, async generator
+    or iterator) is sent back as an ordered stream of RPCStreamResults
+    """
+
+
+@dataclass
+class RPCHandleStack(RPCStack):
+    """
+    Same as RPCStack, but the result is kept on the server and a
+    RPCHandle to it is returned. A RPCHandleStack with a handle and
+    an empty stack increments the reference count of the handle.
+    """
+
+
+@dataclass
+class RPCReleaseStack(RPCStack):
+    """
+    Decrement the reference count of the handle, the stored
+    object is removed when it is no longer referenced.
+    """
+
+
+@dataclass
+class RPCBatch(RPCStack):
+    """
+    Batch of RPCStacks sent as one message, the stack holds the
+    RPCStacks (not RPCCalls). The RPCServer executes the RPCStacks
+    concurrently and returns all results in one RPCBatchResult.
+    """
+
+
+def is_plain(rpc_func_stack: RPCStack) -> bool:
+    """
+    True for plain RPCStacks (no subclass and no handle), the only
+    RPCStacks that can be batched and cached: handles are kept by a
+    specific RPCServer (worker) and other RPCStack types don't
+    return a single result.
+    """
+    return type(rpc_func_stack) is RPCStack and rpc_func_stack.handle is None
+
+
 @dataclass
 class RPCResult(RPCBase):
     """
@@ -100,6 +171,57 @@ class RPCPubResult(RPCResult):
     """
 
 
+@dataclass
+class RPCPubBatchResult(RPCPubResult):
+    """
+    Multiple publications sent as one message, data
+    is the list of published data.
+    """
+
+
+@dataclass
+class RPCStreamResult(RPCPubResult):
+    """
+    Chunk of a streamed result
+
+    :param sequence: the position of this chunk in the stream
+    :param last: True for the (empty) message closing the stream
+    """
+
+    sequence: int = 0
+    last: bool = False
+
+
+@dataclass
+class RPCStreamBatchResult(RPCStreamResult):
+    """
+    Multiple items of a streamed result sent as one
+    chunk, data is the list of items.
+    """
+
+
+@dataclass
+class RPCBatchResult(RPCResult):
+    """
+    Results of a RPCBatch, data holds a RPCResult or
+    RPCException for every RPCStack in the batch.
+    """
+
+
+@dataclass
+class RPCHandle(RPCBase):
+    """
+    Reference to an object kept on the RPCServer, use the handle_id
+    as RPCStack.handle to execute call stacks on the object.
+
+    :param handle_id: the id of the stored object
+    :param namespace: the namespace the object belongs to
+    """
+
+    handle_id: str
+    namespace: str
+
+
 @dataclass
 class RPCException(RPCBase):
     """
@@ -122,11 +244,21 @@ class RPCException(RPCBase):
 # register in the serialization
 SERIALIZABLE_MODELS = (
     RPCMessage,
+    RPCCacheInvalidation,
     RPCCall,
     RPCStack,
     RPCSubStack,
     RPCUnSubStack,
+    RPCStreamStack,
+    RPCHandleStack,
+    RPCReleaseStack,
+    RPCBatch,
     RPCResult,
     RPCPubResult,
+    RPCPubBatchResult,
+    RPCStreamResult,
+    RPCStreamBatchResult,
+    RPCBatchResult,
+    RPCHandle,
     RPCException,
 )
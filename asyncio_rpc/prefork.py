@@ -0,0 +1,186 @@
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import Callable
+
+logger = logging.getLogger("asyncio-rpc-prefork")
+
+# Seconds to wait for workers to exit after SIGTERM, before killing them
+SHUTDOWN_TIMEOUT = 30
+# Minimum number of seconds between restarts of the same worker
+RESTART_DELAY = 1.0
+
+
+def _worker_cpu(index: int):
+    """
+    The cpu to pin worker index to, round robin over
+    the cpus available to this process.
+    """
+    cpus = sorted(os.sched_getaffinity(0))
+    return cpus[index % len(cpus)]
+
+
+async def _serve_worker(factory: Callable, index: int, workers: int):
+    """
+    Create the RPCServer via factory and serve until SIGTERM
+    """
+    rpc_server = factory()
+    if inspect.isawaitable(rpc_server):
+        rpc_server = await rpc_server
+
+    # All workers subscribe to the same channel,
+    # divide the RPCStacks between them
+    rpc_server.partition = (index, workers)
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(
+        signal.SIGTERM, lambda: asyncio.ensure_future(rpc_server.close())
+    )
+
+    logger.info("Worker %s (pid %s) serving", index, os.getpid())
+    await rpc_server.serve()
+    await rpc_server.rpc_commlayer.close()
+
+
+def _run_worker(factory: Callable, index: int, workers: int, cpu: int = None):
+    """
+    Worker process entry point
+    """
+    # The supervisor handles Ctrl-C and forwards it as SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+
+    asyncio.run(_serve_worker(factory, index, workers))
+
+
+def serve_multiprocess(
+    factory: Callable,
+    workers: int = None,
+    cpu_affinity: bool = False,
+    mp_context=None,
+):
+    """
+    Run workers RPCServer processes on the same channel, blocks until
+    SIGTERM (or SIGINT) is received and all workers have exited.
+
+    Every worker builds its own RPCServer (and rpc_commlayer) by
+    calling factory, for example:
+
+        async def create_server():
+            rpc_commlayer = await RPCRedisCommLayer.create(...)
+            rpc_server = RPCServer(rpc_commlayer)
+            rpc_server.register(DefaultExecutor("TEST", Service()))
+            return rpc_server
+
+        serve_multiprocess(create_server, workers=4)
+
+    Crashed workers are restarted. The RPCStacks are divided between
+    the workers by uid (see RPCServer.partition), RPCServer state like
+    the result cache and metrics is per worker.
+
+    Note: the partitions are fixed, no load balancing is done:
+
+    - RPCStacks published while a worker is down (until it is
+      restarted, at least RESTART_DELAY seconds after it started) are
+      dropped for its partition. The other workers still receive them,
+      so the client gets a RPCTimeoutError instead of NotReceived.
+    - A busy (or stuck) worker keeps getting 1/workers of the RPCStacks,
+      use deadlines (the RPCStack timeout) to limit the waiting.
+    - Every worker receives and deserializes all RPCStacks, only
+      to ignore the ones of the other partitions.
+
+    :param factory: (async) function returning a RPCServer, called in
+        the worker processes.
+    :param workers: number of worker processes, defaults to the
+        number of cpus
+    :param cpu_affinity: pin every worker to its own cpu (Linux only)
+    :param mp_context: (optional) multiprocessing context, defaults
+        to "fork" where available
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers > 0
+
+    if cpu_affinity and not hasattr(os, "sched_setaffinity"):
+        logger.warning("cpu_affinity is not supported on this platform")
+        cpu_affinity = False
+
+    if mp_context is None:
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        mp_context = multiprocessing.get_context(method)
+
+    processes = [None] * workers
+    started = [0.0] * workers
+    stopping = False
+
+    def start(index):
+        cpu = _worker_cpu(index) if cpu_affinity else None
+        process = mp_context.Process(
+            target=_run_worker,
+            args=(factory, index, workers, cpu),
+            name=f"rpc-worker-{index}",
+        )
+        process.start()
+        processes[index] = process
+        started[index] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    previous_handlers = {
+        signum: signal.signal(signum, stop)
+        for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+
+    try:
+        for index in range(workers):
+            start(index)
+
+        while not stopping:
+            # Wake up when a worker exits, or regularly
+            # to check the stopping flag
+            wait(
+                [process.sentinel for process in processes if process.is_alive()],
+                timeout=0.5,
+            )
+
+            for index, process in enumerate(processes):
+                if stopping or process.is_alive():
+                    continue
+                if time.monotonic() - started[index] < RESTART_DELAY:
+                    # Don't restart crashing workers in a tight loop
+                    continue
+                logger.warning(
+                    "Worker %s (pid %s) exited with %s, restarting",
+                    index,
+                    process.pid,
+                    process.exitcode,
+                )
+                start(index)
+    finally:
+        # Graceful shutdown
+        for process in processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process in processes:
+            if process is None:
+                continue
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Killing worker (pid %s)", process.pid)
+                process.kill()
+                process.join()
+
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
@@ -0,0 +1,84 @@
+from typing import Tuple
+
+from asyncio_rpc.models import RPCCall, RPCStack
+
+
+class RPCProxy:
+    """
+    Records attribute access and calls on the object registered under
+    namespace on the RPCServer, awaiting the proxy executes them as
+    one RPCStack:
+
+        proxy = client.proxy("TEST")
+        coordinates = await proxy.nodes.subset("2D").coordinates
+
+    Attribute chains are created once and cached on the parent proxy,
+    so repeated calls only create the RPCCall with the arguments. The
+    RPCStack is built and serialized in full on every await.
+    """
+
+    __slots__ = ("_client", "_namespace", "_stack", "_timeout", "_channel", "_children")
+
+    def __init__(
+        self,
+        client,
+        namespace: str,
+        stack: Tuple[RPCCall, ...] = (),
+        timeout: float = 300,
+        channel=None,
+    ):
+        self._client = client
+        self._namespace = namespace
+        self._stack = stack
+        self._timeout = timeout
+        self._channel = channel
+        # name -> RPCProxy of the attribute
+        self._children = {}
+
+    def _child(self, stack: Tuple[RPCCall, ...]) -> "RPCProxy":
+        return RPCProxy(
+            self._client, self._namespace, stack, self._timeout, self._channel
+        )
+
+    def __getattr__(self, name: str) -> "RPCProxy":
+        if name.startswith("_"):
+            # Not exposed by the DefaultExecutor either
+            raise AttributeError(name)
+
+        child = self._children.get(name)
+        if child is None:
+            child = self._children[name] = self._child(
+                self._stack + (RPCCall(name, [], {}),)
+            )
+        return child
+
+    def __call__(self, *args, **kwargs) -> "RPCProxy":
+        if not self._stack or self._stack[-1].func_args or self._stack[-1].func_kwargs:
+            raise TypeError(f"{self!r} is not callable")
+
+        if not args and not kwargs:
+            # Same RPCCall as the attribute
+            return self
+
+        func_name = self._stack[-1].func_name
+        return self._child(self._stack[:-1] + (RPCCall(func_name, list(args), kwargs),))
+
+    def __await__(self):
+        assert self._stack, "Nothing to execute"
+        rpc_func_stack = RPCStack(
+            self._client.next_uid(), self._namespace, self._timeout, list(self._stack)
+        )
+        return self._client.rpc_call(rpc_func_stack, channel=self._channel).__await__()
+
+    def __repr__(self):
+        steps = [self._namespace]
+        for rpc_func_call in self._stack:
+            step = rpc_func_call.func_name
+            if rpc_func_call.func_args or rpc_func_call.func_kwargs:
+                arguments = [repr(arg) for arg in rpc_func_call.func_args] + [
+                    f"{key}={value!r}"
+                    for key, value in rpc_func_call.func_kwargs.items()
+                ]
+                step += f"({', '.join(arguments)})"
+            steps.append(step)
+        return f"<RPCProxy {'.'.join(steps)}>"
@@ -1,19 +1,55 @@
 import asyncio
-import builtins
-from typing import Any, AsyncIterator
+import dataclasses
+from typing import Any, AsyncIterator, Hashable
 
-from asyncio_rpc.exceptions import WrappedException
-from asyncio_rpc.models import RPCException, RPCPubResult, RPCStack, RPCUnSubStack
+from asyncio_rpc.cache import object_size
+from asyncio_rpc.exceptions import resolve_exception_class
+from asyncio_rpc.models import (
+    RPCException,
+    RPCPubBatchResult,
+    RPCPubResult,
+    RPCStack,
+    RPCStreamBatchResult,
+    RPCStreamResult,
+    RPCUnSubStack,
+)
 
 
 class Publisher:
+    """
+    Publishes data to the client of a subscription. By default every
+    publish() is sent as its own message, see set_batching and
+    set_latest_only for combining publications into one message.
+    """
+
     def __init__(self, server, rpc_stack: RPCStack):
         self._rpc_stack = rpc_stack
         self._server = server
         self._is_active = True
 
+        # Batching
+        self._batching = False
+        self._max_items = None
+        self._window = None
+        self._max_bytes = None
+        self._latest_only = False
+        self._buffer = {}
+        self._buffer_bytes = 0
+        self._counter = 0
+        self._flush_timer = None
+        self._flush_task = None
+        self._receiver_count = None
+
     def set_is_active(self, is_active: bool):
         self._is_active = is_active
+        if not is_active:
+            self._cancel_flush_timer()
+
+    def unsubscribe(self, uid: str):
+        """
+        The subscriber with uid unsubscribed
+        """
+        self.set_is_active(False)
 
     @property
     def is_active(self):
@@ -23,30 +59,233 @@ class Publisher:
     def rpc_stack(self):
         return self._rpc_stack
 
-    async def publish(self, data: Any):
+    def set_batching(
+        self, max_items: int = None, window: float = None, max_bytes: int = None
+    ):
+        """
+        Collect publications and send them as one message (a
+        RPCPubBatchResult) when max_items publications or max_bytes
+        (estimated) bytes have been collected, or window seconds
+        after the first collected publication.
+
+        Call flush() or close() to send the remaining publications.
+        """
+        assert max_items or window or max_bytes
+        self._batching = True
+        self._max_items = max_items
+        self._window = window
+        self._max_bytes = max_bytes
+
+    def set_latest_only(self, window: float = 0.1, max_items: int = None):
+        """
+        Only send the latest publication per key (see publish)
+        collected during window seconds, older publications with
+        the same key are dropped.
+        """
+        self.set_batching(max_items=max_items, window=window)
+        self._latest_only = True
+
+    async def publish(self, data: Any, key: Hashable = None):
         """
         Publish data to the client
+
+        :param key: (optional) in latest only mode, publications
+            with the same key replace the collected publication
+        :return: the number of receivers, when batching the number
+            of receivers of the last sent batch (None if none yet)
         """
         if not self.is_active:
             return 0
 
+        if self._batching:
+            return await self._collect(data, key)
+
         # Publish the data as partial data
-        publication = RPCPubResult(self._rpc_stack.uid, self._rpc_stack.namespace, data)
+        return await self._send(self._publication(data))
+
+    async def _send(self, publication: RPCPubResult):
         receiver_count = await self._server.rpc_commlayer.publish(
             publication, channel=self._rpc_stack.respond_to
         )
 
         if receiver_count == 0:
-            self._is_active = False
+            self.set_is_active(False)
             self._server.publishers.pop(self._rpc_stack.uid, None)
             return 0
 
+        self._receiver_count = receiver_count
         return receiver_count
 
+    async def _collect(self, data: Any, key: Hashable):
+        if not self._latest_only or key is None:
+            # Unique key, keeps all publications
+            key = ("_publication", self._counter)
+            self._counter += 1
+        elif key in self._buffer:
+            # Replace the older publication, the newest is sent last
+            self._buffer_bytes -= self._buffer.pop(key)[1]
+
+        size = object_size(data) if self._max_bytes is not None else 0
+        self._buffer[key] = (data, size)
+        self._buffer_bytes += size
+
+        if (self._max_items is not None and len(self._buffer) >= self._max_items) or (
+            self._max_bytes is not None and self._buffer_bytes >= self._max_bytes
+        ):
+            return await self.flush()
+
+        if self._window is not None and self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(
+                self._window, self._on_flush_timer
+            )
+        return self._receiver_count
+
+    def _on_flush_timer(self):
+        self._flush_timer = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    def _cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    async def flush(self):
+        """
+        Send the collected publications
+        """
+        self._cancel_flush_timer()
+        if not self._buffer or not self.is_active:
+            return self._receiver_count
+
+        items = [data for data, _ in self._buffer.values()]
+        self._buffer = {}
+        self._buffer_bytes = 0
+        return await self._send(self._batch_publication(items))
+
+    async def close(self):
+        """
+        Send the collected publications and stop publishing
+        """
+        receiver_count = await self.flush()
+        self.set_is_active(False)
+        self._server.publishers.pop(self._rpc_stack.uid, None)
+        return receiver_count
+
+    def _publication(self, data: Any):
+        return RPCPubResult(self._rpc_stack.uid, self._rpc_stack.namespace, data)
+
+    def _batch_publication(self, items: list):
+        return RPCPubBatchResult(self._rpc_stack.uid, self._rpc_stack.namespace, items)
+
     def __del__(self):
         self._server.publishers.pop(self._rpc_stack.uid, None)
 
 
+class FanoutPublisher(Publisher):
+    """
+    Publisher shared by identical subscriptions (RPCSubStacks) of
+    multiple clients. The data is serialized and stored once and sent
+    to every subscriber, subscribers can join and leave at any time.
+    """
+
+    def __init__(self, server, rpc_stack: RPCStack):
+        super().__init__(server, rpc_stack)
+        self.subscribers = {rpc_stack.uid: rpc_stack}
+
+    def subscribe(self, rpc_stack: RPCStack):
+        """
+        Add the subscriber of rpc_stack, receives the
+        publications from now on.
+        """
+        self.subscribers[rpc_stack.uid] = rpc_stack
+        self._server.publishers[rpc_stack.uid] = self
+
+    def unsubscribe(self, uid: str):
+        self.subscribers.pop(uid, None)
+        self._server.publishers.pop(uid, None)
+        if not self.subscribers:
+            self.set_is_active(False)
+
+    async def _send(self, publication: RPCPubResult):
+        subscribers = list(self.subscribers.values())
+        serialized_data = None
+        if publication.data is not None:
+            serialized_data = self._server.rpc_commlayer.serialization.dumpb(
+                publication.data
+            )
+
+        # The subscribers retrieve the shared data within their timeout
+        timeouts = [subscriber.timeout for subscriber in subscribers]
+        expire = None if None in timeouts else max(timeouts)
+
+        receiver_counts = await self._server.rpc_commlayer.publish_many(
+            [
+                dataclasses.replace(
+                    publication, uid=subscriber.uid, namespace=subscriber.namespace
+                )
+                for subscriber in subscribers
+            ],
+            [subscriber.respond_to for subscriber in subscribers],
+            serialized_data=serialized_data,
+            expire=expire,
+        )
+
+        for subscriber, receiver_count in zip(subscribers, receiver_counts):
+            if receiver_count == 0:
+                # The subscriber is gone
+                self.unsubscribe(subscriber.uid)
+
+        self._receiver_count = sum(receiver_counts)
+        return self._receiver_count
+
+    async def close(self):
+        receiver_count = await self.flush()
+        for uid in list(self.subscribers):
+            self.unsubscribe(uid)
+        return receiver_count
+
+    def __del__(self):
+        for uid in self.subscribers:
+            self._server.publishers.pop(uid, None)
+
+
+class StreamPublisher(Publisher):
+    """
+    Publishes the chunks of a streamed result with a sequence
+    number, close() publishes the closing (last) message. With
+    set_batching every chunk (a RPCStreamBatchResult) holds
+    multiple items.
+    """
+
+    def __init__(self, server, rpc_stack: RPCStack):
+        super().__init__(server, rpc_stack)
+        self._sequence = 0
+        self._last = False
+
+    def _publication(self, data: Any, cls=RPCStreamResult):
+        publication = cls(
+            self._rpc_stack.uid,
+            self._rpc_stack.namespace,
+            data,
+            sequence=self._sequence,
+            last=self._last,
+        )
+        self._sequence += 1
+        return publication
+
+    def _batch_publication(self, items: list):
+        return self._publication(items, cls=RPCStreamBatchResult)
+
+    async def close(self):
+        receiver_count = await self.flush()
+        if self.is_active:
+            self._last = True
+            receiver_count = await self._send(self._publication(None))
+        self.set_is_active(False)
+        self._server.publishers.pop(self._rpc_stack.uid, None)
+        return receiver_count
+
+
 class Subscription:
     def __init__(self, client, rpc_stack: RPCStack):
         self.queue = asyncio.Queue()
@@ -78,17 +317,69 @@ class Subscription:
                 break
 
             if isinstance(result, RPCException):
-                # Try to resolve builtin errors
-                try:
-                    exception_class = getattr(builtins, result.classname)
-                except AttributeError:
-                    # Default to WrappedException if
-                    # returned exception is not a builtin error
-                    exception_class = WrappedException
+                # Resolve builtin (or RPC) errors, defaults
+                # to WrappedException for other errors
+                exception_class = resolve_exception_class(result.classname)
 
                 raise exception_class(*result.exc_args)
 
-            yield result.data
+            if isinstance(result, RPCPubBatchResult):
+                for data in result.data:
+                    yield data
+            else:
+                yield result.data
 
     def __del__(self):
         self._client.subscriptions.pop(self._rpc_stack.uid, None)
+
+
+class Stream(Subscription):
+    """
+    Client side of a streamed result, async iterate over
+    the stream to receive the chunks in order.
+    """
+
+    def __init__(self, client, rpc_stack: RPCStack):
+        super().__init__(client, rpc_stack)
+        self._finished = False
+
+    def __aiter__(self):
+        return self.enumerate()
+
+    def _finish(self):
+        self._finished = True
+        self._client.subscriptions.pop(self._rpc_stack.uid, None)
+
+    async def close(self):
+        if self._finished:
+            return
+        self._finished = True
+        await super().close()
+
+    async def enumerate(self) -> AsyncIterator[Any]:
+        # Chunks might arrive out of order, keep them
+        # until the missing chunks have been received
+        pending = {}
+        sequence = 0
+        while not self._finished:
+            result = await self.queue.get()
+            if result == b"STOP":
+                break
+
+            if isinstance(result, RPCException):
+                self._finish()
+                exception_class = resolve_exception_class(result.classname)
+                raise exception_class(*result.exc_args)
+
+            pending[result.sequence] = result
+            while sequence in pending:
+                result = pending.pop(sequence)
+                sequence += 1
+                if result.last:
+                    self._finish()
+                    return
+                if isinstance(result, RPCStreamBatchResult):
+                    for data in result.data:
+                        yield data
+                else:
+                    yield result.data
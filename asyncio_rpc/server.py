@@ -1,20 +1,110 @@
 import asyncio
+import contextvars
+import dataclasses
+import functools
+import heapq
+import importlib
+import inspect
+import itertools
 import logging
-from typing import List
+import math
+import multiprocessing
+import threading
+import time
+import types
+import zlib
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional, Tuple, Union
+from uuid import uuid4
 
+from asyncio_rpc.cache import LRUCache, prefix_keys, stack_key
 from asyncio_rpc.commlayers.base import AbstractRPCCommLayer
+from asyncio_rpc.exceptions import HandleNotFound, ServerOverloaded
+from asyncio_rpc.handles import ObjectStore
+from asyncio_rpc.metrics import (
+    METRICS_CONTROL_METHODS,
+    METRICS_NAMESPACE,
+    METRICS_READ_METHODS,
+    ServerMetrics,
+)
 from asyncio_rpc.models import (
+    SERIALIZABLE_MODELS,
+    RPCBatch,
+    RPCBatchResult,
+    RPCCacheInvalidation,
     RPCCall,
     RPCException,
+    RPCHandle,
+    RPCHandleStack,
+    RPCReleaseStack,
     RPCResult,
     RPCStack,
+    RPCStreamStack,
     RPCSubStack,
     RPCUnSubStack,
+    is_plain,
 )
-from asyncio_rpc.pubsub import Publisher
+from asyncio_rpc.pubsub import FanoutPublisher, Publisher, StreamPublisher
+from asyncio_rpc.serialization import msgpack as msgpack_serialization
 
 logger = logging.getLogger("asyncio-rpc-server")
 
+# Deadline (time.time()) of the RPCStack being executed
+rpc_deadline = contextvars.ContextVar("rpc_deadline", default=None)
+
+# Profiler of the RPCStack being executed, if it is sampled for profiling
+rpc_profiler = contextvars.ContextVar("rpc_profiler", default=None)
+
+# CacheCheck of the RPCStack being executed, if its result can be cached
+rpc_cache_check = contextvars.ContextVar("rpc_cache_check", default=None)
+
+
+class CacheCheck:
+    """
+    Whether the result of the RPCStack being executed can be cached,
+    the steps after the first one can only be resolved while executing.
+    Executors set cacheable to False when a step is not cacheable.
+    """
+
+    __slots__ = ("cacheable",)
+
+    def __init__(self):
+        self.cacheable = True
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Returns the number of seconds left before the deadline of the
+    RPCStack currently being executed, or None if it has no deadline.
+
+    Can be used by executors (and the methods they call) to skip
+    work the client is no longer waiting for.
+    """
+    deadline = rpc_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def is_expired(rpc_func_stack: RPCStack) -> bool:
+    """
+    Returns True if the deadline of rpc_func_stack has passed
+    """
+    return rpc_func_stack.deadline is not None and rpc_func_stack.deadline < time.time()
+
+
+def stack_counts(rpc_func_stack: RPCStack) -> Counter:
+    """
+    The number of RPCStacks per namespace in rpc_func_stack,
+    every RPCStack of a RPCBatch counts.
+    """
+    if isinstance(rpc_func_stack, RPCBatch):
+        return Counter(entry.namespace for entry in rpc_func_stack.stack)
+    return Counter({rpc_func_stack.namespace: 1})
+
 
 class NamespaceError(Exception):
     """
@@ -23,22 +113,280 @@ class NamespaceError(Exception):
     """
 
 
+# Load shedding policies
+REJECT_NEWEST = "reject_newest"
+DROP_OLDEST = "drop_oldest"
+
+
+class RPCQueue(asyncio.Queue):
+    """
+    Queue for (RPCStack, channel) items, popping the items with the
+    highest RPCStack.priority first and items with equal priority in
+    FIFO order. Other items (like b"END") get the lowest priority.
+
+    RPCStacks of blocked namespaces (at their concurrency limit) stay
+    in the queue until the namespace is unblocked, subscribes and
+    unsubscribes are never held back. Other items are only popped
+    when no RPCStacks are held back.
+
+    Keeps track of the number of queued RPCStacks per namespace, the
+    RPCStacks of a RPCBatch are counted one by one (also by qsize()).
+    """
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._counter = itertools.count()
+        self.namespace_counts = Counter()
+        self.blocked = set()
+        # Number of queued RPCStacks per namespace that can be blocked
+        self._blockable_counts = defaultdict(int)
+        # Number of queued other items
+        self._other_count = 0
+        # Number of queued RPCStacks (and other items)
+        self._size = 0
+
+    @staticmethod
+    def _blockable(item) -> bool:
+        return isinstance(item, tuple) and not isinstance(
+            item[0], (RPCSubStack, RPCUnSubStack, RPCBatch)
+        )
+
+    def _held_back(self) -> int:
+        return sum(self._blockable_counts[namespace] for namespace in self.blocked)
+
+    def _available(self, item, held_back: int) -> bool:
+        if not isinstance(item, tuple):
+            # Process all RPCStacks before b"END"
+            return held_back == 0
+        return not self._blockable(item) or item[0].namespace not in self.blocked
+
+    def _put(self, item):
+        if isinstance(item, tuple):
+            key = -(item[0].priority or 0)
+            counts = stack_counts(item[0])
+            self.namespace_counts.update(counts)
+            self._size += counts.total()
+            if self._blockable(item):
+                self._blockable_counts[item[0].namespace] += 1
+        else:
+            key = math.inf
+            self._other_count += 1
+            self._size += 1
+        heapq.heappush(self._queue, (key, next(self._counter), item))
+
+    def _get(self):
+        held_back = self._held_back()
+        if self._available(self._queue[0][-1], held_back):
+            entry = heapq.heappop(self._queue)
+        else:
+            entry = min(
+                entry for entry in self._queue if self._available(entry[-1], held_back)
+            )
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        return self._removed(entry[-1])
+
+    def _removed(self, item):
+        if isinstance(item, tuple):
+            counts = stack_counts(item[0])
+            self.namespace_counts.subtract(counts)
+            self._size -= counts.total()
+            if self._blockable(item):
+                self._blockable_counts[item[0].namespace] -= 1
+        else:
+            self._other_count -= 1
+            self._size -= 1
+        return item
+
+    def qsize(self):
+        """
+        Number of queued RPCStacks (and other items)
+        """
+        return self._size
+
+    def empty(self):
+        """
+        True if there is no item that can be popped, items of
+        blocked namespaces are still counted by qsize().
+        """
+        held_back = self._held_back()
+        if held_back == 0:
+            return not self._queue
+        return len(self._queue) - held_back - self._other_count == 0
+
+    def block(self, namespace: str):
+        """
+        Hold back the RPCStacks of namespace
+        """
+        self.blocked.add(namespace)
+
+    def unblock(self, namespace: str):
+        """
+        Pop the RPCStacks of namespace again
+        """
+        self.blocked.discard(namespace)
+        if not self.empty():
+            # Wake up a get() waiting for an available item
+            self._wakeup_next(self._getters)
+
+    def pop_oldest(self):
+        """
+        Remove and return the (RPCStack, channel) item that has been
+        in the queue the longest (blocked or not), or None if there is
+        none. Unsubscribes are never removed since they free up resources.
+        """
+        entries = [
+            entry
+            for entry in self._queue
+            if isinstance(entry[-1], tuple)
+            and not isinstance(entry[-1][0], RPCUnSubStack)
+        ]
+        if not entries:
+            return None
+
+        oldest = min(entries, key=lambda entry: entry[1])
+        self._queue.remove(oldest)
+        heapq.heapify(self._queue)
+        self.task_done()
+        return self._removed(oldest[-1])
+
+
 class RPCServer(object):
     """
     Remote procedure server class. Allows to register executors
     by namespace and execute RPC calls from a RPCClient
     """
 
-    def __init__(self, rpc_commlayer: AbstractRPCCommLayer = None):
+    def __init__(
+        self,
+        rpc_commlayer: AbstractRPCCommLayer = None,
+        max_in_flight: int = None,
+        result_cache: LRUCache = None,
+        coalesce: bool = False,
+        max_queue_size: int = None,
+        shed_policy: str = REJECT_NEWEST,
+        namespace_quotas: dict = None,
+        metrics: bool = True,
+        metrics_control: bool = False,
+        profile_rate: int = None,
+        partition: Tuple[int, int] = None,
+        object_store: ObjectStore = None,
+        share_subscriptions: bool = False,
+        stream_chunk_items: int = None,
+        stream_chunk_bytes: int = None,
+    ):
+        """
+        Initialize a new RPCServer by providing an implementation of
+        AbstractRPCCommlayer.
+
+        :param max_in_flight: if set, RPCStacks are dispatched concurrently,
+            each in their own task, with at most max_in_flight RPCStacks
+            being executed at the same time. By default RPCStacks are
+            processed one after the other.
+        :param result_cache: (optional) LRUCache for caching the serialized
+            results of cacheable call stacks, see @cacheable. The size of
+            the entries is the number of serialized bytes.
+        :param coalesce: if True, identical RPCStacks (same namespace and
+            call stack) arriving while the first one is still executing
+            share its result instead of being executed again. Only useful
+            in combination with max_in_flight and for call stacks without
+            side effects.
+        :param max_queue_size: (optional) maximum number of queued RPCStacks,
+            when full RPCStacks are shed according to shed_policy. Shed
+            RPCStacks get a ServerOverloaded exception as result.
+        :param shed_policy: REJECT_NEWEST (reject the incoming RPCStack) or
+            DROP_OLDEST (drop the RPCStack that has been queued the longest)
+        :param namespace_quotas: (optional) maximum number of queued
+            RPCStacks per namespace, {namespace: quota}. Incoming RPCStacks
+            for a namespace at its quota are rejected.
+        :param metrics: record per namespace call counts, error counts and
+            latency histograms, together with the queue depth and number
+            of in flight calls. The metrics can be queried by any RPCClient
+            via the METRICS_NAMESPACE namespace, see ServerMetrics.
+        :param metrics_control: if True, RPCClients can also reset the
+            metrics and change the profiling via the METRICS_NAMESPACE
+            namespace, by default only reading the metrics is allowed.
+        :param profile_rate: (optional) profile one in every profile_rate
+            RPCStacks, recording the time spent in every step of the call
+            stack. Requires metrics, can be changed at runtime via
+            set_profiling of the METRICS_NAMESPACE namespace (see
+            metrics_control) or self.metrics.set_profiling.
+        :param partition: (optional) (index, count), only process the
+            RPCStacks of partition index out of count partitions (by uid).
+            Used for running count RPCServers on the same channel, see
+            asyncio_rpc.prefork.serve_multiprocess. RPCStacks of a
+            partition without a running RPCServer are not executed,
+            the clients time out.
+        :param object_store: (optional) ObjectStore keeping the objects of
+            RPCHandles, by default an ObjectStore with default limits.
+        :param share_subscriptions: if True, identical RPCSubStacks (same
+            namespace and call stack) share one executor.subscribe_call and
+            its publications are serialized once and sent to all
+            subscribers. Subscribers that join later only receive the
+            publications from then on.
+        :param stream_chunk_items: (optional) send the items of a stream
+            (see RPCClient.rpc_stream) in chunks of at most
+            stream_chunk_items items instead of one message per item.
+        :param stream_chunk_bytes: (optional) send a chunk of stream items
+            as soon as it holds (an estimated) stream_chunk_bytes bytes.
+        """
         assert isinstance(rpc_commlayer, AbstractRPCCommLayer)
-        self.queue = asyncio.Queue()
+        assert max_in_flight is None or max_in_flight > 0
+        assert shed_policy in (REJECT_NEWEST, DROP_OLDEST)
+        self.queue = RPCQueue()
         self._alive = True
+        self.partition = partition
+        self.object_store = object_store if object_store is not None else ObjectStore()
+
+        # Load shedding
+        self.max_queue_size = max_queue_size
+        self.shed_policy = shed_policy
+        self.namespace_quotas = namespace_quotas or {}
+
+        # Concurrent dispatching
+        self.max_in_flight = max_in_flight
+        self._in_flight = set()
+        self._in_flight_semaphore = (
+            asyncio.Semaphore(max_in_flight) if max_in_flight is not None else None
+        )
+
+        # Per namespace concurrency limits, RPCStacks for a namespace
+        # at its limit stay in the queue until one of its calls is done
+        # (so they still count for load shedding).
+        self.namespace_limits = {}
+        self._namespace_in_flight = defaultdict(int)
+        # RPCStacks of a RPCBatch are not queued, they wait for a slot
+        self._namespace_waiters = defaultdict(deque)
+
+        self.result_cache = result_cache
+        # Channels of the RPCClients, for RPCCacheInvalidation messages
+        self.client_channels = set()
+
+        # Single flight, coalesce key -> future of (result, serialized data)
+        self.coalesce = coalesce
+        self._running_calls = {}
 
         # Allow multiple executors to be registered by
         # namespace
         self.registry = {}
         self.publishers = {}
+        self.share_subscriptions = share_subscriptions
+        self.stream_chunk_items = stream_chunk_items
+        self.stream_chunk_bytes = stream_chunk_bytes
+        # stack_key -> FanoutPublisher of shared subscriptions
+        self._fanouts = {}
+        self._background_tasks = set()
         self.rpc_commlayer = rpc_commlayer
+
+        self.metrics = None
+        if metrics:
+            self.metrics = ServerMetrics(self, profile_rate=profile_rate)
+            exposed = list(METRICS_READ_METHODS)
+            if metrics_control:
+                exposed += METRICS_CONTROL_METHODS
+            self.register(
+                DefaultExecutor(METRICS_NAMESPACE, self.metrics, exposed=exposed)
+            )
         logger.debug("Initialized RPCServer")
 
     def register_models(self, models):
@@ -50,20 +398,27 @@ class RPCServer(object):
         for model in models:
             self.rpc_commlayer.serialization.register(model)
 
-    def register(self, executor):
+    def register(self, executor, max_in_flight: int = None):
         """
         Register an executor for a namespace, the namespace
         should be unique and is used to route RPC calls from
         the client to the correct executor in the registry of
         the RPCServer.
+
+        :param max_in_flight: (optional) maximum number of RPCStacks
+            executed concurrently for this namespace, only applies
+            if the RPCServer dispatches concurrently.
         """
         assert hasattr(executor, "namespace")
+        assert max_in_flight is None or max_in_flight > 0
 
         if executor.namespace in self.registry:
             raise NamespaceError("Namespace already exists")
 
         # Register executor for this namespaces
         self.registry[executor.namespace] = executor
+        if max_in_flight is not None:
+            self.namespace_limits[executor.namespace] = max_in_flight
 
     async def rpc_call(self, rpc_func_stack: RPCStack):
         """
@@ -88,14 +443,34 @@ class RPCServer(object):
 
         executor = self.registry[rpc_func_stack.namespace]
 
+        timeout = rpc_func_stack.timeout
+        if rpc_func_stack.deadline is not None:
+            # Don't run longer than the client is waiting
+            remaining = rpc_func_stack.deadline - time.time()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        # Executors can check the deadline via remaining_time(),
+        # wait_for runs the executor in a task with a copy of the context
+        token = rpc_deadline.set(rpc_func_stack.deadline)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.in_flight += 1
+            profiler_token = rpc_profiler.set(metrics.sample())
+        start = time.perf_counter()
         try:
             # Wait for result from executor
             logger.debug(
                 "Going to run executor for rpc_func_stack: %s", rpc_func_stack.uid
             )
-            result.data = await asyncio.wait_for(
-                executor.rpc_call(rpc_func_stack.stack), timeout=rpc_func_stack.timeout
-            )
+            if rpc_func_stack.handle is None:
+                call = executor.rpc_call(rpc_func_stack.stack)
+            else:
+                # Start from the object stored under the handle
+                resource = self.object_store.get(
+                    rpc_func_stack.handle, rpc_func_stack.namespace
+                )
+                call = executor.rpc_call(rpc_func_stack.stack, resource=resource)
+            result.data = await asyncio.wait_for(call, timeout=timeout)
             logger.debug(
                 "Got result for rpc_func_stack: %s, %s", rpc_func_stack.uid, result
             )
@@ -111,6 +486,16 @@ class RPCServer(object):
             logger.debug(
                 "Exception occurred for rpc_funct_stack: %s, %s", rpc_func_stack.uid, e
             )
+        finally:
+            rpc_deadline.reset(token)
+            if metrics is not None:
+                rpc_profiler.reset(profiler_token)
+                metrics.in_flight -= 1
+                metrics.observe(
+                    rpc_func_stack.namespace,
+                    time.perf_counter() - start,
+                    isinstance(result, RPCException),
+                )
 
         return result
 
@@ -126,27 +511,702 @@ class RPCServer(object):
                 f"no subscribe_call function"
             )
 
-        publisher = Publisher(self, rpc_sub_stack)
-        self.publishers[rpc_sub_stack.uid] = publisher
+        if not self.share_subscriptions:
+            publisher = Publisher(self, rpc_sub_stack)
+            self.publishers[rpc_sub_stack.uid] = publisher
+
+            # Create task for this publisher
+            asyncio.create_task(executor.subscribe_call(publisher))
+            return
 
-        # Create task for this publisher
-        asyncio.create_task(executor.subscribe_call(publisher))
+        key = stack_key(rpc_sub_stack.namespace, rpc_sub_stack.stack)
+        fanout = self._fanouts.get(key)
+        if fanout is not None and fanout.is_active:
+            # Join the running subscription
+            fanout.subscribe(rpc_sub_stack)
+            return
+
+        fanout = FanoutPublisher(self, rpc_sub_stack)
+        self.publishers[rpc_sub_stack.uid] = fanout
+        self._fanouts[key] = fanout
+
+        task = asyncio.create_task(executor.subscribe_call(fanout))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        task.add_done_callback(functools.partial(self._on_fanout_done, key, fanout))
+
+    def _on_fanout_done(self, key: str, fanout: FanoutPublisher, task: asyncio.Task):
+        # New identical subscriptions start a new subscribe_call
+        if self._fanouts.get(key) is fanout:
+            del self._fanouts[key]
+
+    async def stream_call(self, rpc_stream_stack: RPCStreamStack):
+        """
+        Start streaming the result of the RPCStreamStack to the client,
+        the stream is stopped early by a RPCUnSubStack.
+        """
+        assert isinstance(rpc_stream_stack, RPCStreamStack)
+        if rpc_stream_stack.namespace not in self.registry:
+            raise NamespaceError("Unknown namespace")
+
+        executor = self.registry[rpc_stream_stack.namespace]
+        if not hasattr(executor, "rpc_stream"):
+            raise NotImplementedError(
+                f"Executor for namespace: {rpc_stream_stack.namespace} has "
+                f"no rpc_stream function"
+            )
+
+        publisher = StreamPublisher(self, rpc_stream_stack)
+        if self.stream_chunk_items or self.stream_chunk_bytes:
+            publisher.set_batching(
+                max_items=self.stream_chunk_items, max_bytes=self.stream_chunk_bytes
+            )
+        self.publishers[rpc_stream_stack.uid] = publisher
+
+        # Keep a reference to the task until the stream is done
+        task = asyncio.create_task(self._stream(executor, publisher))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _stream(self, executor, publisher: StreamPublisher):
+        """
+        Publish the items of the executor's stream one by one (or in
+        chunks), followed by the closing message (or the exception).
+        """
+        rpc_stream_stack = publisher.rpc_stack
+        # Executors can check the deadline via remaining_time(),
+        # this task runs in its own copy of the context
+        rpc_deadline.set(rpc_stream_stack.deadline)
+        stream = None
+        try:
+            if rpc_stream_stack.handle is None:
+                stream = executor.rpc_stream(rpc_stream_stack.stack)
+            else:
+                # Start from the object stored under the handle
+                resource = self.object_store.get(
+                    rpc_stream_stack.handle, rpc_stream_stack.namespace
+                )
+                stream = executor.rpc_stream(rpc_stream_stack.stack, resource=resource)
+            async for item in stream:
+                if not publisher.is_active:
+                    # Unsubscribed or the client is gone
+                    return
+                await publisher.publish(item)
+            await publisher.close()
+        except Exception as e:
+            logger.debug("Error occured for %s: %s", rpc_stream_stack.uid, e)
+            publisher.set_is_active(False)
+            result = RPCException(
+                uid=rpc_stream_stack.uid,
+                namespace=rpc_stream_stack.namespace,
+                classname=e.__class__.__name__,
+                exc_args=e.args,
+            )
+            await self.rpc_commlayer.publish(
+                result, channel=rpc_stream_stack.respond_to
+            )
+        finally:
+            self.publishers.pop(rpc_stream_stack.uid, None)
+            if stream is not None:
+                await stream.aclose()
 
     async def _on_rpc_event(self, rpc_func_stack: RPCStack, channel: bytes = None):
         """
         Callback function sent to rpc_commlayer, is called
         when a RPCStack is received by the rpc_commlayer subscription
         """
+        if rpc_func_stack.respond_to is not None:
+            self.client_channels.add(rpc_func_stack.respond_to)
+
+        if self.partition is not None:
+            # Every server on the channel receives every RPCStack,
+            # only process the RPCStacks of our own partition. RPCStacks
+            # on a handle go to the server that created the handle
+            # (the handle_id is the uid of the RPCHandleStack).
+            index, count = self.partition
+            key = rpc_func_stack.handle or rpc_func_stack.uid
+            if zlib.crc32(str(key).encode()) % count != index:
+                return
+
+        if not isinstance(rpc_func_stack, RPCUnSubStack):
+            # Check if the queue is full, unsubscribes are never shed
+            # since they free up resources. Every RPCStack of a RPCBatch
+            # counts, a RPCBatch is shed as a whole.
+            counts = stack_counts(rpc_func_stack)
+            for namespace, count in counts.items():
+                quota = self.namespace_quotas.get(namespace)
+                if (
+                    quota is not None
+                    and self.queue.namespace_counts[namespace] + count > quota
+                ):
+                    await self._shed(rpc_func_stack, f"Quota of namespace {namespace}")
+                    return
+
+            size = counts.total()
+            if self.max_queue_size is not None and size > self.max_queue_size:
+                await self._shed(rpc_func_stack, "Larger than the queue")
+                return
+
+            while (
+                self.max_queue_size is not None
+                and self.queue.qsize() + size > self.max_queue_size
+            ):
+                if self.shed_policy == REJECT_NEWEST:
+                    await self._shed(rpc_func_stack, "Queue full")
+                    return
+
+                oldest = self.queue.pop_oldest()
+                if oldest is None:
+                    # Only unsubscribes are queued
+                    await self._shed(rpc_func_stack, "Queue full")
+                    return
+                await self._shed(oldest[0], "Queue full")
+
         await self.queue.put((rpc_func_stack, channel))
 
+    async def _shed(self, rpc_func_stack: RPCStack, reason: str):
+        """
+        Let the client know rpc_func_stack has not been executed,
+        because the server is overloaded.
+        """
+        logger.warning("Shedding rpcstack %s: %s", rpc_func_stack.uid, reason)
+        if self.metrics is not None:
+            self.metrics.observe_shed(rpc_func_stack)
+        result = RPCException(
+            uid=rpc_func_stack.uid,
+            namespace=rpc_func_stack.namespace,
+            classname=ServerOverloaded.__name__,
+            exc_args=[f"{reason}, rpc_func_stack {rpc_func_stack.uid} not executed"],
+        )
+        if isinstance(rpc_func_stack, RPCBatch):
+            # Every RPCStack in the batch gets the exception
+            result = RPCBatchResult(
+                uid=rpc_func_stack.uid,
+                namespace=rpc_func_stack.namespace,
+                data=[
+                    dataclasses.replace(
+                        result, uid=entry.uid, namespace=entry.namespace
+                    )
+                    for entry in rpc_func_stack.stack
+                ],
+            )
+        await self.rpc_commlayer.publish(result, channel=rpc_func_stack.respond_to)
+
+    def _observe_expired(self, rpc_func_stack: RPCStack):
+        if self.metrics is not None:
+            self.metrics.observe_expired(rpc_func_stack)
+
+    async def _process_rpc_stack(self, rpc_func_stack: RPCStack):
+        """
+        Process a single RPCStack popped from the queue and
+        publish the result (or exception) to the client
+        """
+        logger.debug("Processing rpcstack %s, %s", rpc_func_stack.uid, rpc_func_stack)
+
+        if isinstance(rpc_func_stack, (RPCSubStack, RPCStreamStack)):
+            try:
+                # Process rpc_func_call_stack
+                if isinstance(rpc_func_stack, RPCStreamStack):
+                    await self.stream_call(rpc_func_stack)
+                else:
+                    await self.subscribe_call(rpc_func_stack)
+            except Exception as e:
+                # Log everything that is not an
+                # instance of RPCException
+                if not isinstance(e, RPCException):
+                    logger.exception(e)
+                result = RPCException(
+                    uid=rpc_func_stack.uid,
+                    namespace=rpc_func_stack.namespace,
+                    classname=e.__class__.__name__,
+                    exc_args=e.args,
+                )
+                # Publish exception
+                await self.rpc_commlayer.publish(
+                    result, channel=rpc_func_stack.respond_to
+                )
+        elif isinstance(rpc_func_stack, RPCUnSubStack):
+            publisher = self.publishers.pop(rpc_func_stack.uid, None)
+            if publisher is not None:
+                publisher.unsubscribe(rpc_func_stack.uid)
+        else:
+            try:
+                # Process rpc_func_call_stack (or batch) and publish the result
+                if isinstance(rpc_func_stack, RPCBatch):
+                    await self._batch_call_and_publish(rpc_func_stack)
+                elif isinstance(rpc_func_stack, RPCHandleStack):
+                    await self._handle_call_and_publish(rpc_func_stack)
+                elif isinstance(rpc_func_stack, RPCReleaseStack):
+                    await self._release_and_publish(rpc_func_stack)
+                else:
+                    await self._call_and_publish(rpc_func_stack)
+            except Exception as e:
+                logger.debug("Error occured for %s: %s", rpc_func_stack.uid, e)
+                # Log everything that is not an
+                # instance of RPCException
+                if not isinstance(e, RPCException):
+                    logger.exception(e)
+
+                result = RPCException(
+                    uid=rpc_func_stack.uid,
+                    namespace=rpc_func_stack.namespace,
+                    classname=e.__class__.__name__,
+                    exc_args=e.args,
+                )
+                # Try to publish error
+                await self.rpc_commlayer.publish(
+                    result, channel=rpc_func_stack.respond_to
+                )
+
+    def _cache_policy(self, rpc_func_stack: RPCStack):
+        """
+        Returns (cache_key, ttl) if the result of rpc_func_stack
+        can be cached, else (None, None)
+        """
+        if (
+            self.result_cache is None
+            or not rpc_func_stack.stack
+            or rpc_func_stack.handle is not None
+        ):
+            return None, None
+
+        executor = self.registry.get(rpc_func_stack.namespace)
+        cache_policy = getattr(executor, "cache_policy", None)
+        if cache_policy is None:
+            return None, None
+
+        cacheable, ttl = cache_policy(rpc_func_stack.stack)
+        if not cacheable:
+            return None, None
+
+        return stack_key(rpc_func_stack.namespace, rpc_func_stack.stack), ttl
+
+    async def _call_and_publish(self, rpc_func_stack: RPCStack):
+        """
+        Execute the rpc_func_stack and publish the result,
+        see _execute_stack
+        """
+        outcome = await self._execute_stack(rpc_func_stack)
+        if outcome is not None:
+            await self._publish_result(rpc_func_stack, *outcome)
+
+    async def _execute_stack(self, rpc_func_stack: RPCStack):
+        """
+        Execute the rpc_func_stack, using the result cache (if enabled)
+        for cacheable call stacks. Returns (result, serialized_data)
+        or None if rpc_func_stack has expired.
+
+        If coalescing is enabled identical call stacks arriving while
+        the first one is still executing wait for, and get, its result.
+        The result can therefore have the uid of another RPCStack.
+        serialized_data is the serialized result.data if it is
+        available (cache hits leave result.data None), else None.
+        """
+        if is_expired(rpc_func_stack):
+            # Waited too long for a free slot, the client
+            # is not waiting for the result anymore
+            logger.debug("Dropping expired rpcstack %s", rpc_func_stack.uid)
+            self._observe_expired(rpc_func_stack)
+            return None
+
+        cache_key, ttl = self._cache_policy(rpc_func_stack)
+
+        if cache_key is not None:
+            serialized_data = self.result_cache.get(cache_key)
+            if serialized_data is not None:
+                # Cache hit, the data is already serialized
+                logger.debug("Using cached result for %s", rpc_func_stack.uid)
+                result = RPCResult(
+                    uid=rpc_func_stack.uid,
+                    namespace=rpc_func_stack.namespace,
+                    data=None,
+                )
+                return result, serialized_data
+
+        coalesce_key = None
+        if self.coalesce and rpc_func_stack.stack and rpc_func_stack.handle is None:
+            coalesce_key = cache_key or stack_key(
+                rpc_func_stack.namespace, rpc_func_stack.stack
+            )
+            running = self._running_calls.get(coalesce_key)
+            if running is None:
+                self._running_calls[coalesce_key] = (
+                    asyncio.get_running_loop().create_future()
+                )
+            else:
+                logger.debug("Coalescing %s with running call", rpc_func_stack.uid)
+                outcome = await asyncio.shield(running)
+                if outcome is not None:
+                    return outcome
+                # The running call failed, execute it ourselves
+                coalesce_key = None
+
+        outcome = None
+        try:
+            cache_check = None
+            if cache_key is not None:
+                # wait_for copies the context, the CacheCheck is shared
+                cache_check = CacheCheck()
+                token = rpc_cache_check.set(cache_check)
+            try:
+                result = await self.rpc_call(rpc_func_stack)
+            finally:
+                if cache_check is not None:
+                    rpc_cache_check.reset(token)
+
+            if cache_check is not None and not cache_check.cacheable:
+                logger.debug("Not caching %s, not all steps cacheable", cache_key)
+                cache_key = None
+
+            # Serialize once for both the cache and coalesced calls
+            serialized_data = None
+            if isinstance(result, RPCResult) and (
+                cache_key is not None or coalesce_key is not None
+            ):
+                serialized_data = self.rpc_commlayer.serialization.dumpb(result.data)
+            if cache_key is not None and serialized_data is not None:
+                self.result_cache.set(
+                    cache_key,
+                    serialized_data,
+                    ttl=ttl,
+                    size=len(serialized_data),
+                    tag=rpc_func_stack.namespace,
+                )
+            outcome = (result, serialized_data)
+        finally:
+            if coalesce_key is not None:
+                self._running_calls.pop(coalesce_key).set_result(outcome)
+
+        return outcome
+
+    @asynccontextmanager
+    async def _batch_entry_slots(self, namespace: str):
+        """
+        Hold a slot of the namespace limit (if any) and an in-flight
+        slot (if max_in_flight has been set) for a RPCStack of a RPCBatch.
+        The namespace slot is acquired first, in-flight slots are only
+        held while executing.
+        """
+        limited = namespace in self.namespace_limits
+        if limited:
+            await self._acquire_namespace(namespace)
+        try:
+            if self._in_flight_semaphore is None:
+                yield
+            else:
+                async with self._in_flight_semaphore:
+                    yield
+        finally:
+            if limited:
+                self._release_namespace(namespace)
+
+    async def _batch_entry_call(self, rpc_func_stack: RPCStack):
+        """
+        Execute a single RPCStack of a RPCBatch like any other
+        RPCStack (see _execute_stack), returns a RPCResult
+        or RPCException with the uid of rpc_func_stack.
+        """
+        try:
+            if not is_plain(rpc_func_stack):
+                raise ValueError(
+                    f"RPCBatch only supports plain RPCStacks, "
+                    f"got {rpc_func_stack.__class__.__name__}"
+                )
+            async with self._batch_entry_slots(rpc_func_stack.namespace):
+                outcome = await self._execute_stack(rpc_func_stack)
+            if outcome is None:
+                raise TimeoutError(f"Deadline of {rpc_func_stack.uid} has passed")
+
+            result, serialized_data = outcome
+            if (
+                isinstance(result, RPCResult)
+                and result.data is None
+                and serialized_data is not None
+            ):
+                # Cache hit, the RPCBatchResult is serialized as a whole
+                result = dataclasses.replace(
+                    result,
+                    data=self.rpc_commlayer.serialization.loadb(serialized_data),
+                )
+            if result.uid != rpc_func_stack.uid:
+                result = dataclasses.replace(result, uid=rpc_func_stack.uid)
+            return result
+        except Exception as e:
+            return RPCException(
+                uid=rpc_func_stack.uid,
+                namespace=rpc_func_stack.namespace,
+                classname=e.__class__.__name__,
+                exc_args=e.args,
+            )
+
+    async def _batch_call_and_publish(self, rpc_batch: RPCBatch):
+        """
+        Execute the RPCStacks of the rpc_batch concurrently and
+        publish all results in one RPCBatchResult. Every RPCStack
+        counts against the namespace limits and max_in_flight.
+        """
+        if is_expired(rpc_batch):
+            logger.debug("Dropping expired rpcbatch %s", rpc_batch.uid)
+            self._observe_expired(rpc_batch)
+            return
+
+        results = await asyncio.gather(
+            *[
+                self._batch_entry_call(rpc_func_stack)
+                for rpc_func_stack in rpc_batch.stack
+            ]
+        )
+        result = RPCBatchResult(
+            uid=rpc_batch.uid, namespace=rpc_batch.namespace, data=results
+        )
+        logger.debug("Publishing batch result for %s", rpc_batch.uid)
+        await self.rpc_commlayer.publish(result, channel=rpc_batch.respond_to)
+
+    async def _handle_call_and_publish(self, rpc_handle_stack: RPCHandleStack):
+        """
+        Execute the rpc_handle_stack, store the result in the object
+        store and publish a RPCHandle to it. The uid of the
+        rpc_handle_stack is used as handle_id.
+        """
+        if is_expired(rpc_handle_stack):
+            logger.debug("Dropping expired rpcstack %s", rpc_handle_stack.uid)
+            self._observe_expired(rpc_handle_stack)
+            return
+
+        namespace = rpc_handle_stack.namespace
+        if rpc_handle_stack.handle is not None and not rpc_handle_stack.stack:
+            # Another reference to an existing handle
+            result = RPCResult(
+                uid=rpc_handle_stack.uid,
+                namespace=namespace,
+                data=RPCHandle(rpc_handle_stack.handle, namespace),
+            )
+            try:
+                self.object_store.retain(rpc_handle_stack.handle, namespace)
+            except HandleNotFound as e:
+                result = RPCException(
+                    rpc_handle_stack.uid, namespace, e.__class__.__name__, e.args
+                )
+        else:
+            result = await self.rpc_call(rpc_handle_stack)
+            if isinstance(result, RPCResult):
+                try:
+                    self.object_store.put(rpc_handle_stack.uid, namespace, result.data)
+                    result.data = RPCHandle(rpc_handle_stack.uid, namespace)
+                except ValueError as e:
+                    # Too large to be stored
+                    result = RPCException(
+                        rpc_handle_stack.uid, namespace, e.__class__.__name__, e.args
+                    )
+
+        await self._publish_result(rpc_handle_stack, result)
+
+    async def _release_and_publish(self, rpc_release_stack: RPCReleaseStack):
+        """
+        Release the handle of rpc_release_stack, publishes
+        True if the stored object has been removed.
+        """
+        try:
+            removed = self.object_store.release(
+                rpc_release_stack.handle, rpc_release_stack.namespace
+            )
+            result = RPCResult(
+                rpc_release_stack.uid, rpc_release_stack.namespace, removed
+            )
+        except HandleNotFound as e:
+            result = RPCException(
+                rpc_release_stack.uid,
+                rpc_release_stack.namespace,
+                e.__class__.__name__,
+                e.args,
+            )
+        await self._publish_result(rpc_release_stack, result)
+
+    async def _publish_result(
+        self, rpc_func_stack: RPCStack, result, serialized_data: bytes = None
+    ):
+        """
+        Publish the result (or exception) for rpc_func_stack. The result
+        can be one of another (coalesced) RPCStack, then a copy with the
+        uid of rpc_func_stack is published.
+        """
+        if result.uid != rpc_func_stack.uid:
+            if isinstance(result, RPCResult) and serialized_data is not None:
+                result = dataclasses.replace(result, uid=rpc_func_stack.uid, data=None)
+            else:
+                result = dataclasses.replace(result, uid=rpc_func_stack.uid)
+
+        logger.debug("Publishing result for %s, %s", rpc_func_stack.uid, rpc_func_stack)
+        # Publish result of rpc call, rpc_commlayers without support
+        # for serialized_data only get it passed when it is used
+        if serialized_data is None:
+            await self.rpc_commlayer.publish(result, channel=rpc_func_stack.respond_to)
+        else:
+            await self.rpc_commlayer.publish(
+                result,
+                channel=rpc_func_stack.respond_to,
+                serialized_data=serialized_data,
+            )
+        logger.debug("Publishing done for %s", rpc_func_stack.uid)
+
+    def invalidate_cache(self, namespace: str = None, stack: List[RPCCall] = None):
+        """
+        Invalidate the result cache for the given namespace and call
+        stack, all call stacks of the namespace if no stack is given
+        or the complete cache if no namespace is given either.
+        """
+        if self.result_cache is None:
+            return
+
+        if stack is not None:
+            assert namespace is not None
+            self.result_cache.pop(stack_key(namespace, stack))
+        else:
+            self.result_cache.invalidate(namespace)
+
+    async def invalidate_client_caches(
+        self, namespace: str = None, stack: List[RPCCall] = None, channels=None
+    ) -> int:
+        """
+        Send a RPCCacheInvalidation to the RPCClients, evicting the
+        cached result (see ClientCache) of the namespace and call stack,
+        all results of the namespace if no stack is given or all
+        results if no namespace is given either.
+
+        :param channels: (optional) the channels of the RPCClients,
+            defaults to the respond_to channels of the received RPCStacks
+        :return: the number of receivers
+        """
+        key = None
+        if stack is not None:
+            assert namespace is not None
+            key = stack_key(namespace, stack, self.rpc_commlayer.serialization)
+
+        if channels is None:
+            channels = list(self.client_channels)
+
+        receivers = 0
+        for channel in channels:
+            count = await self.rpc_commlayer.publish(
+                RPCCacheInvalidation(uuid4().hex, namespace, key=key),
+                channel=channel,
+            )
+            if count == 0:
+                # Client is gone
+                self.client_channels.discard(channel)
+            receivers += count
+        return receivers
+
+    async def _dispatch(self, rpc_func_stack: RPCStack, channel: bytes = None):
+        """
+        Run _process_rpc_stack in its own task. Waits for a free
+        in-flight slot first, so the queue is not drained faster
+        than RPCStacks can be executed.
+
+        RPCStacks for a namespace at its limit are not popped from
+        the queue, see _take_namespace.
+
+        The RPCStacks of a RPCBatch take their own slots, the
+        RPCBatch itself doesn't hold one while executing.
+        """
+        namespace = None
+        if rpc_func_stack.namespace in self.namespace_limits and not isinstance(
+            rpc_func_stack, (RPCSubStack, RPCUnSubStack)
+        ):
+            namespace = rpc_func_stack.namespace
+            self._take_namespace(namespace)
+
+        if is_expired(rpc_func_stack) and not isinstance(rpc_func_stack, RPCUnSubStack):
+            # Waited too long in the queue, the client
+            # is not waiting for the result anymore
+            logger.debug("Dropping expired rpcstack %s", rpc_func_stack.uid)
+            self._observe_expired(rpc_func_stack)
+            if namespace is not None:
+                self._release_namespace(namespace)
+            return
+
+        holds_slot = not isinstance(rpc_func_stack, RPCBatch)
+        if holds_slot:
+            await self._in_flight_semaphore.acquire()
+        else:
+            # Don't hold the slot, it would be taken twice by the
+            # RPCStacks of the batch, see _batch_entry_slots
+            async with self._in_flight_semaphore:
+                pass
+        task = asyncio.ensure_future(self._process_rpc_stack(rpc_func_stack))
+        self._in_flight.add(task)
+        task.add_done_callback(
+            functools.partial(self._on_dispatch_done, namespace, holds_slot)
+        )
+
+    def _on_dispatch_done(self, namespace, holds_slot: bool, task: asyncio.Task):
+        """
+        Release the in-flight slot(s) of a finished dispatch task
+        """
+        self._in_flight.discard(task)
+        if holds_slot:
+            self._in_flight_semaphore.release()
+
+        if namespace is not None:
+            self._release_namespace(namespace)
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.exception(task.exception())
+
+    def _take_namespace(self, namespace: str):
+        """
+        Take a slot of the namespace limit, the RPCStacks of the
+        namespace are held back in the queue when it is at its limit.
+        """
+        self._namespace_in_flight[namespace] += 1
+        if self._namespace_in_flight[namespace] >= self.namespace_limits[namespace]:
+            self.queue.block(namespace)
+
+    async def _acquire_namespace(self, namespace: str):
+        """
+        Wait for a slot of the namespace limit, for RPCStacks that
+        are not queued (the RPCStacks of a RPCBatch).
+        """
+        if self._namespace_in_flight[namespace] < self.namespace_limits[namespace]:
+            self._take_namespace(namespace)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._namespace_waiters[namespace].append(waiter)
+        try:
+            # The slot is handed over by _release_namespace
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release_namespace(namespace)
+            raise
+
+    def _release_namespace(self, namespace: str):
+        """
+        Release a slot of the namespace limit, it is handed over to
+        a waiting RPCStack (if any), else the queued RPCStacks of
+        the namespace can be popped again.
+        """
+        waiters = self._namespace_waiters[namespace]
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._namespace_in_flight[namespace] -= 1
+        if self._namespace_in_flight[namespace] < self.namespace_limits[namespace]:
+            self.queue.unblock(namespace)
+
     async def _process_queue(self):
         """
         Background queue processing function, processes
-        the internal self.queue until b'END' is received
-
+        the internal self.queue until b'END' is received.
+        RPCStacks are popped by priority, see RPCQueue.
 
-        if on_rpc_message has been set, it will be called
-        whenever a RPCMessage is popped from the queue.
+        If max_in_flight has been set, every RPCStack is
+        processed concurrently in its own task, else
+        RPCStacks are processed one by one.
         """
 
         while self._alive:
@@ -159,65 +1219,23 @@ class RPCServer(object):
 
             assert isinstance(rpc_func_stack, RPCStack)
 
-            logger.debug(
-                "Processing rpcstack %s, %s", rpc_func_stack.uid, rpc_func_stack
-            )
-
-            if isinstance(rpc_func_stack, RPCSubStack):
-                try:
-                    # Process rpc_func_call_stack
-                    await self.subscribe_call(rpc_func_stack)
-                except Exception as e:
-                    # Log everything that is not an
-                    # instance of RPCException
-                    if not isinstance(e, RPCException):
-                        logger.exception(e)
-                    result = RPCException(
-                        uid=rpc_func_stack.uid,
-                        namespace=rpc_func_stack.namespace,
-                        classname=e.__class__.__name__,
-                        exc_args=e.args,
-                    )
-                    # Publish exception
-                    await self.rpc_commlayer.publish(
-                        result, channel=rpc_func_stack.respond_to
-                    )
-            elif isinstance(rpc_func_stack, RPCUnSubStack):
-                publisher = self.publishers.pop(rpc_func_stack.uid, None)
-                if publisher is not None:
-                    publisher.set_is_active(False)
+            if self.max_in_flight is not None:
+                # Checks the deadline after the namespace limits
+                await self._dispatch(rpc_func_stack, channel)
+            elif is_expired(rpc_func_stack) and not isinstance(
+                rpc_func_stack, RPCUnSubStack
+            ):
+                # Waited too long in the queue, the client
+                # is not waiting for the result anymore
+                logger.debug("Dropping expired rpcstack %s", rpc_func_stack.uid)
+                self._observe_expired(rpc_func_stack)
             else:
-                try:
-                    # Process rpc_func_call_stack
-                    result = await self.rpc_call(rpc_func_stack)
-
-                    logger.debug(
-                        "Publishing result for %s, %s",
-                        rpc_func_stack.uid,
-                        rpc_func_stack,
-                    )
-                    # Publish result of rpc call
-                    await self.rpc_commlayer.publish(
-                        result, channel=rpc_func_stack.respond_to
-                    )
-                    logger.debug("Publishing done for %s", rpc_func_stack.uid)
-                except Exception as e:
-                    logger.debug("Error occured for %s: %s", rpc_func_stack.uid, e)
-                    # Log everything that is not an
-                    # instance of RPCException
-                    if not isinstance(e, RPCException):
-                        logger.exception(e)
+                await self._process_rpc_stack(rpc_func_stack)
 
-                    result = RPCException(
-                        uid=rpc_func_stack.uid,
-                        namespace=rpc_func_stack.namespace,
-                        classname=e.__class__.__name__,
-                        exc_args=e.args,
-                    )
-                    # Try to publish error
-                    await self.rpc_commlayer.publish(
-                        result, channel=rpc_func_stack.respond_to
-                    )
+        # Let RPCStacks that are still running finish
+        # and publish their results
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
 
     async def serve(self):
         """
@@ -255,17 +1273,215 @@ class RPCServer(object):
                     main_tasks[new_task] = (coro, args)
                     running.add(new_task)
 
+    async def close(self):
+        """
+        Stop serving, makes serve() return after the
+        already queued RPCStacks have been processed.
+        """
+        await self.rpc_commlayer.unsubscribe()
+        await self.queue.put(b"END")
+
+
+class ThreadPoolStats:
+    """
+    Statistics of the thread pool of a DefaultExecutor, used
+    to see if the thread pool is saturated.
+
+    Note: updated from both the event loop and the worker threads
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.submitted = 0
+        self.completed = 0
+        # Calls waiting for a free thread
+        self.waiting = 0
+        # Calls currently executing in a thread
+        self.running = 0
+        # Time (in seconds) calls waited for a free thread
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def saturation(self) -> float:
+        """
+        The number of submitted, not yet completed, calls divided
+        by the number of worker threads. A value above 1.0 means
+        calls are waiting for a free thread.
+        """
+        return (self.waiting + self.running) / self.max_workers
+
+    @property
+    def mean_wait_time(self) -> float:
+        started = self.submitted - self.waiting
+        return self.total_wait_time / started if started else 0.0
+
+    def submit(self):
+        with self._lock:
+            self.submitted += 1
+            self.waiting += 1
+
+    def start(self, wait_time: float):
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def done(self):
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "waiting": self.waiting,
+            "running": self.running,
+            "saturation": self.saturation,
+            "mean_wait_time": self.mean_wait_time,
+            "max_wait_time": self.max_wait_time,
+        }
+
+
+class RPCAttribute:
+    """
+    Dispatch table entry for a method, property or other attribute
+    that can be called via a RPCCall.
+    """
+
+    FUNCTION = 0
+    PROPERTY = 1
+    ATTRIBUTE = 2
+
+    __slots__ = (
+        "name",
+        "kind",
+        "target",
+        "run_in_thread",
+        "cacheable",
+        "cache_ttl",
+        "memoize",
+    )
+
+    def __init__(self, name: str, kind: int, target=None):
+        self.name = name
+        self.kind = kind
+        self.target = target
+        # Markers set by the decorators in asyncio_rpc.decorators
+        self.run_in_thread = getattr(target, "_rpc_run_in_thread", False)
+        self.cacheable = getattr(target, "_rpc_cacheable", False)
+        self.cache_ttl = getattr(target, "_rpc_cache_ttl", None)
+        self.memoize = getattr(target, "_rpc_memoize", False)
+
+    @classmethod
+    def from_type(cls, klass: type, name: str):
+        """
+        Introspect the attribute name of klass without executing it,
+        returns None if klass has no such attribute.
+        """
+        try:
+            attr = inspect.getattr_static(klass, name)
+        except AttributeError:
+            return None
+
+        if isinstance(attr, property):
+            return cls(name, cls.PROPERTY, attr.fget)
+        elif isinstance(attr, types.FunctionType):
+            return cls(name, cls.FUNCTION, attr)
+        # staticmethod, classmethod, class variables etc.
+        return cls(name, cls.ATTRIBUTE, attr)
+
+    def apply(self, resource, rpc_func_call: RPCCall):
+        """
+        Execute rpc_func_call on resource
+        """
+        if self.kind == self.FUNCTION:
+            return self.target(
+                resource, *rpc_func_call.func_args, **rpc_func_call.func_kwargs
+            )
+
+        if self.kind == self.PROPERTY:
+            instance_attr = self.target(resource)
+        else:
+            instance_attr = getattr(resource, self.name)
+
+        if callable(instance_attr):
+            # Function
+            return instance_attr(*rpc_func_call.func_args, **rpc_func_call.func_kwargs)
+        # Asume property
+        return instance_attr
+
 
 class DefaultExecutor:
     """
     Default executor implementation, override if necessary
     """
 
-    def __init__(self, namespace, instance):
+    def __init__(
+        self,
+        namespace,
+        instance,
+        thread_pool: Union[int, ThreadPoolExecutor] = None,
+        run_in_thread: bool = False,
+        exposed: List[str] = None,
+        prefix_cache_size: int = None,
+    ):
+        """
+        :param namespace: the namespace to register the executor under
+        :param instance: the instance to execute the RPCCall's on
+        :param thread_pool: (optional) the number of worker threads or a
+            ThreadPoolExecutor for running synchronous call stacks. Used
+            for methods decorated with @run_in_thread or for all call
+            stacks if run_in_thread is True.
+        :param run_in_thread: run every call stack in the thread pool
+        :param exposed: (optional) names of the methods and properties of
+            instance that can be called, by default all names that do not
+            start with an underscore.
+        :param prefix_cache_size: (optional) keep the resources of at most
+            prefix_cache_size call stack prefixes, see @memoize.
+        """
         assert namespace is not None
         assert instance is not None
         self.namespace = namespace
         self.instance = instance
+        self.run_in_thread = run_in_thread
+
+        if isinstance(thread_pool, int):
+            thread_pool = ThreadPoolExecutor(
+                max_workers=thread_pool, thread_name_prefix=f"rpc-{namespace}"
+            )
+        elif thread_pool is None and run_in_thread:
+            thread_pool = ThreadPoolExecutor(thread_name_prefix=f"rpc-{namespace}")
+
+        self.thread_pool = thread_pool
+        self.thread_pool_stats = (
+            ThreadPoolStats(thread_pool._max_workers) if thread_pool else None
+        )
+
+        # Dispatch table of the instance, for the first RPCCall of
+        # every call stack. Chained RPCCalls are resolved via
+        # per type dispatch tables filled on first use.
+        if exposed is None:
+            exposed = [name for name in dir(instance) if not name.startswith("_")]
+        self.dispatch_table = {}
+        for name in exposed:
+            attribute = RPCAttribute.from_type(type(instance), name)
+            if attribute is None:
+                # Instance attribute
+                attribute = RPCAttribute(name, RPCAttribute.ATTRIBUTE)
+            self.dispatch_table[name] = attribute
+        self._type_dispatch_tables = {}
+
+        # Resources of memoized call stack prefixes, (resource,) by
+        # prefix key. Also used from the thread pool, hence the lock.
+        self.prefix_cache = (
+            LRUCache(max_entries=prefix_cache_size) if prefix_cache_size else None
+        )
+        self._prefix_lock = threading.Lock()
 
     async def subscribe_call(self, publisher: Publisher):
         """
@@ -275,28 +1491,391 @@ class DefaultExecutor:
         #     await publisher.publish(b'blaat')
         pass
 
-    async def rpc_call(self, stack: List[RPCCall] = []):
+    def cache_policy(self, stack: List[RPCCall]):
+        """
+        Returns (cacheable, ttl) for the call stack, the call stack is
+        cacheable if it starts with a method decorated with @cacheable.
+
+        The other steps are checked while executing (see CacheCheck),
+        they should be decorated with @cacheable or @memoize as well.
+        """
+        attribute = self.dispatch_table.get(stack[0].func_name)
+        if attribute is None or not attribute.cacheable:
+            return False, None
+        return True, attribute.cache_ttl
+
+    def _validate(self, stack: List[RPCCall], root: bool = True):
+        """
+        Reject call stacks with unknown or private names
+        before executing anything, root should be True if the
+        call stack starts at the instance.
+        """
+        for i, rpc_func_call in enumerate(stack):
+            assert isinstance(rpc_func_call, RPCCall)
+            func_name = rpc_func_call.func_name
+            if (root and i == 0 and func_name not in self.dispatch_table) or (
+                func_name.startswith("_")
+            ):
+                raise AttributeError(
+                    f"'{func_name}' is not exposed in namespace {self.namespace}"
+                )
+
+    def _resolve(self, resource, func_name: str, root: bool = False) -> RPCAttribute:
+        """
+        Lookup func_name in the dispatch table of the instance (root)
+        or the dispatch table for the type of resource
+        """
+        if root:
+            return self.dispatch_table[func_name]
+
+        klass = type(resource)
+        type_dispatch_table = self._type_dispatch_tables.get(klass)
+        if type_dispatch_table is None:
+            type_dispatch_table = self._type_dispatch_tables[klass] = {}
+
+        attribute = type_dispatch_table.get(func_name)
+        if attribute is None:
+            attribute = RPCAttribute.from_type(klass, func_name)
+            if attribute is None:
+                # Not a class attribute (instance attribute or
+                # non-existing), don't add it to the dispatch table
+                return RPCAttribute(func_name, RPCAttribute.ATTRIBUTE)
+            type_dispatch_table[func_name] = attribute
+        return attribute
+
+    def _execute(self, resource, stack: List[RPCCall], root: bool = False, keys=None):
+        """
+        Synchronously execute the (remainder of the) call stack on resource,
+        root should be True if resource is the instance. keys are the
+        prefix keys of the steps in stack, see _memoize.
+        """
+        profiler = rpc_profiler.get()
+        cache_check = rpc_cache_check.get()
+        for i, rpc_func_call in enumerate(stack):
+            attribute = self._resolve(
+                resource, rpc_func_call.func_name, root and i == 0
+            )
+            if cache_check is not None and not (
+                attribute.cacheable or attribute.memoize
+            ):
+                cache_check.cacheable = False
+            if profiler is None:
+                resource = attribute.apply(resource, rpc_func_call)
+            else:
+                resource = self._profiled_apply(
+                    profiler, attribute, resource, rpc_func_call
+                )
+            if keys is not None:
+                keys = self._memoize(keys, i, attribute, resource)
+
+        return resource
+
+    def _lookup_prefix(self, stack: List[RPCCall]):
+        """
+        Find the longest memoized prefix of the call stack, returns
+        (start, resource, keys): the index of the first step to execute,
+        the resource to execute it on and the prefix keys (or None if
+        the call stack can't be memoized).
+        """
+        try:
+            keys = prefix_keys(stack)
+        except Exception:
+            # Arguments that can't be serialized
+            return 0, self.instance, None
+
+        with self._prefix_lock:
+            for i in range(len(keys) - 1, -1, -1):
+                cached = self.prefix_cache.get(keys[i])
+                if cached is not None:
+                    return i + 1, cached[0], keys
+        return 0, self.instance, keys
+
+    def _memoize(self, keys: List[str], i: int, attribute: RPCAttribute, resource):
+        """
+        Memoize the resource of step i if every step up to and
+        including i is memoizable. Returns the keys for the next
+        steps, None if they are not memoizable anymore.
+        """
+        if not attribute.memoize or i >= len(keys):
+            return None
+        with self._prefix_lock:
+            self.prefix_cache.set(keys[i], (resource,))
+        return keys
+
+    def invalidate_prefixes(self):
+        """
+        Remove all memoized resources, for example
+        after the instance has changed.
+        """
+        if self.prefix_cache is not None:
+            with self._prefix_lock:
+                self.prefix_cache.clear()
+
+    @staticmethod
+    def _profiled_apply(profiler, attribute: RPCAttribute, resource, rpc_func_call):
+        """
+        Apply the attribute on resource and record the time it took
+        """
+        start = time.perf_counter()
+        try:
+            return attribute.apply(resource, rpc_func_call)
+        finally:
+            profiler.record(
+                f"{type(resource).__name__}.{attribute.name}",
+                time.perf_counter() - start,
+            )
+
+    def _execute_in_thread(
+        self, submitted: float, resource, stack: List[RPCCall], root: bool, keys
+    ):
+        """
+        Wrapper around _execute keeping track of the thread pool stats
+        """
+        stats = self.thread_pool_stats
+        stats.start(time.perf_counter() - submitted)
+        try:
+            return self._execute(resource, stack, root, keys)
+        finally:
+            stats.done()
+
+    async def _run_in_thread(
+        self, resource, stack: List[RPCCall], root: bool, keys=None
+    ):
+        """
+        Execute the (remainder of the) call stack in the thread pool,
+        the event loop keeps processing other calls in the meantime.
+        """
+        if self.thread_pool is None:
+            # Create the thread pool when the first
+            # @run_in_thread method is called
+            self.thread_pool = ThreadPoolExecutor(
+                thread_name_prefix=f"rpc-{self.namespace}"
+            )
+            self.thread_pool_stats = ThreadPoolStats(self.thread_pool._max_workers)
+
+        self.thread_pool_stats.submit()
+        func = functools.partial(
+            self._execute_in_thread, time.perf_counter(), resource, stack, root, keys
+        )
+        # Copy the context, just like asyncio.to_thread
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.thread_pool, context.run, func
+        )
+
+    async def rpc_call(self, stack: List[RPCCall] = [], resource=None):
         """
         Process incoming rpc call stack.
         The stack can contain multiple chained function calls for example:
             node.filter(id=1).reproject_to('4326').data
+
+        The call stack is executed on the event loop, unless it
+        reaches a method decorated with @run_in_thread (or run_in_thread
+        is set), from there on it is executed in the thread pool.
+
+        :param resource: (optional) the object to execute the call
+            stack on (for RPCHandles), defaults to the instance.
         """
+        root = resource is None
+        self._validate(stack, root)
 
-        resource = self.instance
+        keys = None
+        if root:
+            resource = self.instance
+            if self.prefix_cache is not None and len(stack) > 1:
+                # Skip the memoized prefix of the call stack
+                start, resource, keys = self._lookup_prefix(stack)
+                if start > 0:
+                    root = False
+                    stack = stack[start:]
+                    keys = keys[start:]
 
-        for rpc_func_call in stack:
-            assert isinstance(rpc_func_call, RPCCall)
+        if self.run_in_thread:
+            return await self._run_in_thread(resource, stack, root, keys)
 
-            # Try to get the function/property from self.instance
-            instance_attr = getattr(resource, rpc_func_call.func_name)
+        profiler = rpc_profiler.get()
+        cache_check = rpc_cache_check.get()
+        for i, rpc_func_call in enumerate(stack):
+            attribute = self._resolve(
+                resource, rpc_func_call.func_name, root and i == 0
+            )
 
-            if callable(instance_attr):
-                # Function
-                resource = instance_attr(
-                    *rpc_func_call.func_args, **rpc_func_call.func_kwargs
+            if attribute.run_in_thread:
+                return await self._run_in_thread(
+                    resource,
+                    stack[i:],
+                    root and i == 0,
+                    keys[i:] if keys is not None else None,
                 )
+
+            if cache_check is not None and not (
+                attribute.cacheable or attribute.memoize
+            ):
+                cache_check.cacheable = False
+            if profiler is None:
+                resource = attribute.apply(resource, rpc_func_call)
             else:
-                # Asume property
-                resource = instance_attr
+                resource = self._profiled_apply(
+                    profiler, attribute, resource, rpc_func_call
+                )
+            if keys is not None:
+                keys = self._memoize(keys, i, attribute, resource)
 
         return resource
+
+    async def rpc_stream(self, stack: List[RPCCall] = [], resource=None):
+        """
+        Process incoming rpc stream call stack, yields the items of
+        a (async) generator or iterator result one by one. Any other
+        result is yielded as a single item.
+
+        Synchronous generators are advanced in the thread pool
+        if the executor has one.
+
+        :param resource: (optional) the object to execute the call
+            stack on, see rpc_call
+        """
+        resource = await self.rpc_call(stack, resource=resource)
+
+        if hasattr(resource, "__aiter__"):
+            try:
+                async for item in resource:
+                    yield item
+            finally:
+                if hasattr(resource, "aclose"):
+                    await resource.aclose()
+        elif isinstance(resource, Iterator):
+            loop = asyncio.get_running_loop()
+            done = object()
+            try:
+                while True:
+                    if self.thread_pool is not None:
+                        item = await loop.run_in_executor(
+                            self.thread_pool, next, resource, done
+                        )
+                    else:
+                        item = next(resource, done)
+                    if item is done:
+                        break
+                    yield item
+            finally:
+                if hasattr(resource, "close"):
+                    resource.close()
+        else:
+            yield resource
+
+
+# The executor of a ProcessExecutor worker process,
+# set by _process_worker_init.
+_process_executor = None
+
+
+def _process_worker_init(namespace, factory, models, serialization_name):
+    """
+    Initializer of ProcessExecutor worker processes, creates
+    the worker's own instance via factory.
+    """
+    global _process_executor
+    serialization = importlib.import_module(serialization_name)
+    for model in SERIALIZABLE_MODELS + tuple(models):
+        serialization.register(model)
+    _process_executor = DefaultExecutor(namespace, factory())
+    _process_executor.serialization = serialization
+
+
+def _process_worker_call(packed_stack: bytes) -> bytes:
+    """
+    Execute a serialized call stack on the instance of
+    this worker process and return the serialized result.
+    """
+    executor = _process_executor
+    stack = executor.serialization.loadb(packed_stack)
+    executor._validate(stack)
+    resource = executor._execute(executor.instance, stack, root=True)
+    return executor.serialization.dumpb(resource)
+
+
+class ProcessExecutor:
+    """
+    Executor running call stacks in a pool of worker processes,
+    for CPU bound (pure Python) instances that would otherwise be
+    limited by the GIL.
+
+    Every worker process holds its own instance, created by
+    calling factory. Call stacks and results are sent to and from
+    the workers serialized with the given serialization.
+
+    Call stacks on RPCHandles (RPCStack.handle) are not supported, the
+    objects of RPCHandles are kept in the RPCServer process.
+
+    Note: factory and models should be picklable, for example
+    a class or a module level function.
+    """
+
+    def __init__(
+        self,
+        namespace,
+        factory: Callable,
+        workers: int = None,
+        models: List = (),
+        serialization=msgpack_serialization,
+        mp_context=None,
+    ):
+        """
+        :param namespace: the namespace to register the executor under
+        :param factory: callable creating the instance in a worker process
+        :param workers: the number of worker processes, defaults
+            to the number of CPU's
+        :param models: custom dataclasses to register in the workers
+        :param serialization: the serialization used to send call stacks
+            and results to and from the worker processes
+        :param mp_context: (optional) multiprocessing context, defaults to
+            "forkserver" (or "spawn" where not available). Forking would
+            copy the running event loop, connections and thread pools.
+        """
+        assert namespace is not None
+        assert factory is not None
+        self.namespace = namespace
+        self.serialization = serialization
+        # Call stacks are serialized in this process as well
+        for model in SERIALIZABLE_MODELS + tuple(models):
+            serialization.register(model)
+
+        if mp_context is None:
+            method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+            mp_context = multiprocessing.get_context(method)
+        self.process_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=_process_worker_init,
+            initargs=(namespace, factory, tuple(models), serialization.__name__),
+        )
+
+    async def rpc_call(self, stack: List[RPCCall] = [], resource=None):
+        """
+        Process incoming rpc call stack in one of the worker processes
+
+        :param resource: the object of a RPCHandle, not supported as
+            the object lives in this process and not in the workers
+        """
+        if resource is not None:
+            raise NotImplementedError(
+                f"Executor for namespace: {self.namespace} can't execute "
+                f"call stacks on RPCHandles"
+            )
+        packed_result = await asyncio.get_running_loop().run_in_executor(
+            self.process_pool,
+            _process_worker_call,
+            self.serialization.dumpb(stack),
+        )
+        return self.serialization.loadb(packed_result)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shutdown the worker processes
+        """
+        self.process_pool.shutdown(wait=wait)
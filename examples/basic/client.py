@@ -79,6 +79,9 @@ async def main(args):
 
     print(result)
 
+    # Stop the background processing and close the commlayer
+    await rpc_client.close()
+
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -57,6 +57,8 @@ async def main(args):
 
     print(result)
 
+    await rpc_client.close()
+
 
 if __name__ == "__main__":
     parser = ArgumentParser()
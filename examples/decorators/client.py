@@ -78,6 +78,8 @@ async def main(args):
     except AttributeError as e:
         print(e)
 
+    await rpc_client.close()
+
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -32,14 +32,20 @@ def serialize_deserialize():
 @pytest.fixture
 async def do_rpc_call():
     async def wrapper(
-        service_client, executor, func, custom_dataclasses=[], client_processing=False
+        service_client,
+        executor,
+        func,
+        custom_dataclasses=[],
+        client_processing=False,
+        server_kwargs={},
+        register_kwargs={},
     ):
         # Initialize both client & server
         rpc_client = RPCClient(await rpc_commlayer(b"pub", b"sub"))
-        rpc_server = RPCServer(await rpc_commlayer(b"sub", b"pub"))
+        rpc_server = RPCServer(await rpc_commlayer(b"sub", b"pub"), **server_kwargs)
 
         service_client.client = rpc_client
-        rpc_server.register(executor)
+        rpc_server.register(executor, **register_kwargs)
 
         # Register any given custom dataclasses on both ends
         rpc_client.register_models(custom_dataclasses)
@@ -0,0 +1,338 @@
+import asyncio
+import time
+from uuid import uuid4
+
+import pytest
+
+from asyncio_rpc.cache import ClientCache, LRUCache, prefix_keys, stack_key
+from asyncio_rpc.client import RPCClient
+from asyncio_rpc.decorators import cacheable, memoize, run_in_thread
+from asyncio_rpc.models import RPCCall, RPCStack
+from asyncio_rpc.server import DefaultExecutor, RPCServer
+
+from .utils import rpc_commlayer
+
+
+def test_stack_key():
+    key = stack_key("TEST", [RPCCall("multiply", [1], {"x": 1, "y": 2})])
+    assert key == stack_key("TEST", [RPCCall("multiply", (1,), {"y": 2, "x": 1})])
+    assert key != stack_key("OTHER", [RPCCall("multiply", [1], {"x": 1, "y": 2})])
+    assert key != stack_key("TEST", [RPCCall("multiply", [2], {"x": 1, "y": 2})])
+
+
+def test_prefix_keys():
+    stack = [RPCCall("nodes", [], {}), RPCCall("subset", ["2D"], {})]
+    keys = prefix_keys(stack + [RPCCall("count", [], {})])
+    assert len(keys) == 2
+    assert keys == prefix_keys(stack + [RPCCall("data", [], {})])
+    assert keys[0] == prefix_keys(stack)[0]
+    assert keys[1] != prefix_keys(stack[:1] + [RPCCall("subset", ["1D"], {})] * 2)[1]
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_size_eviction():
+    cache = LRUCache(max_entries=None, max_size=10)
+    cache.set("a", b"12345", size=5)
+    cache.set("b", b"12345", size=5)
+    cache.set("c", b"1", size=1)
+    assert "a" not in cache
+    assert cache.size == 6
+
+    # Larger than the cache itself
+    cache.set("d", b"1" * 11, size=11)
+    assert "d" not in cache
+    assert len(cache) == 2
+
+
+def test_ttl():
+    cache = LRUCache(default_ttl=10)
+    cache.set("a", 1, ttl=0.01)
+    cache.set("b", 2)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_invalidate_by_tag():
+    cache = LRUCache()
+    cache.set("a", 1, tag="TEST")
+    cache.set("b", 2, tag="TEST")
+    cache.set("c", 3, tag="OTHER")
+    cache.invalidate("TEST")
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+class CachedService:
+    def __init__(self):
+        self.calls = 0
+
+    @cacheable(ttl=60)
+    def multiply(self, x, y=1):
+        self.calls += 1
+        return x * y
+
+    def not_cached(self):
+        self.calls += 1
+        return self.calls
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def bump(self):
+        self.count += 1
+        return self.count
+
+    @cacheable()
+    def double(self, x):
+        return 2 * x
+
+
+class ChainedService:
+    def __init__(self):
+        self.counter_instance = Counter()
+
+    @cacheable(ttl=60)
+    def counter(self):
+        return self.counter_instance
+
+
+class CachedServiceClient:
+    def __init__(self, client):
+        self.client = client
+
+    async def call(self, func_name, *args):
+        rpc_func_call = RPCCall(func_name, list(args), {})
+        rpc_func_stack = RPCStack(uuid4().hex, "CACHED", 300, [rpc_func_call])
+        return await self.client.rpc_call(rpc_func_stack)
+
+
+def test_cache_policy():
+    executor = DefaultExecutor("CACHED", CachedService())
+    assert executor.cache_policy([RPCCall("multiply", [1], {})]) == (True, 60)
+    assert executor.cache_policy([RPCCall("not_cached", [], {})]) == (False, None)
+
+
+async def test_server_result_cache(do_rpc_call):
+    service = CachedService()
+    service_client = CachedServiceClient(None)
+    result_cache = LRUCache()
+
+    async def calls():
+        results = [
+            await service_client.call("multiply", 10, 10),
+            await service_client.call("multiply", 10, 10),
+            await service_client.call("not_cached"),
+            await service_client.call("not_cached"),
+        ]
+        result_cache.invalidate("CACHED")
+        results.append(await service_client.call("multiply", 10, 10))
+        return results
+
+    results = await do_rpc_call(
+        service_client,
+        DefaultExecutor("CACHED", service),
+        calls(),
+        server_kwargs={"result_cache": result_cache},
+    )
+    assert results == [100, 100, 2, 3, 100]
+    assert service.calls == 4
+    assert result_cache.hits == 1
+
+
+async def test_server_result_cache_batching(do_rpc_call):
+    service = CachedService()
+    service_client = CachedServiceClient(None)
+    result_cache = LRUCache()
+
+    async def calls():
+        # Batched RPCStacks use the result cache as well
+        service_client.client.set_batching(max_items=2)
+        results = await asyncio.gather(
+            service_client.call("multiply", 10, 10), service_client.call("not_cached")
+        )
+        results += await asyncio.gather(
+            service_client.call("multiply", 10, 10),
+            service_client.call("multiply", 10, 10),
+        )
+        return results
+
+    results = await do_rpc_call(
+        service_client,
+        DefaultExecutor("CACHED", service),
+        calls(),
+        server_kwargs={"result_cache": result_cache},
+    )
+    assert results == [100, 2, 100, 100]
+    assert service.calls == 2
+    assert result_cache.hits == 2
+
+
+async def test_server_result_cache_chained(do_rpc_call):
+    service = ChainedService()
+    service_client = CachedServiceClient(None)
+    result_cache = LRUCache()
+
+    async def call(*stack):
+        rpc_func_stack = RPCStack(uuid4().hex, "CACHED", 300, list(stack))
+        return await service_client.client.rpc_call(rpc_func_stack)
+
+    async def calls():
+        counter = RPCCall("counter", [], {})
+        # bump is not cacheable, even though counter is
+        bumps = [await call(counter, RPCCall("bump", [], {})) for _ in range(3)]
+        doubles = [await call(counter, RPCCall("double", [2], {})) for _ in range(3)]
+        return bumps, doubles
+
+    bumps, doubles = await do_rpc_call(
+        service_client,
+        DefaultExecutor("CACHED", service),
+        calls(),
+        server_kwargs={"result_cache": result_cache},
+    )
+    assert bumps == [1, 2, 3]
+    assert doubles == [4, 4, 4]
+    assert result_cache.hits == 2
+    assert len(result_cache) == 1
+
+
+def test_client_cache():
+    cache = ClientCache({"TEST": 0.05, "FOREVER": None})
+    assert cache.caches("TEST")
+    assert not cache.caches("OTHER")
+
+    cache.set("a", "TEST", [1], cache.generation)
+    cache.set("b", "FOREVER", None, cache.generation)
+    assert cache.get("a") == ([1],)
+    assert cache.get("b") == (None,)
+
+    # Results of calls started before an invalidation are not cached
+    generation = cache.generation
+    cache.invalidate(key="a")
+    cache.set("c", "TEST", 3, generation)
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+    cache.set("a", "TEST", [1], cache.generation)
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.get("b") == (None,)
+
+    cache.invalidate("FOREVER")
+    assert len(cache) == 0
+
+
+async def test_client_cache_invalidation():
+    service = CachedService()
+    rpc_client = RPCClient(
+        await rpc_commlayer(b"pub", b"sub"), cache=ClientCache({"CACHED": 60})
+    )
+    rpc_server = RPCServer(await rpc_commlayer(b"sub", b"pub"))
+    rpc_server.register(DefaultExecutor("CACHED", service))
+    await rpc_server.rpc_commlayer.do_subscribe()
+    service_client = CachedServiceClient(rpc_client)
+
+    async def calls():
+        try:
+            results = [
+                await service_client.call("not_cached"),
+                await service_client.call("not_cached"),
+            ]
+            # Evict the result of this call stack from the client caches
+            assert await rpc_server.invalidate_client_caches(
+                "CACHED", [RPCCall("not_cached", [], {})]
+            )
+            # Wait for the RPCCacheInvalidation
+            while len(rpc_client.cache):
+                await asyncio.sleep(0.01)
+            results.append(await service_client.call("not_cached"))
+            return results
+        finally:
+            await rpc_server.queue.put(b"END")
+            await rpc_server.rpc_commlayer.unsubscribe()
+
+    results, _ = await asyncio.gather(calls(), rpc_server.serve())
+
+    assert results == [1, 1, 2]
+    assert service.calls == 2
+    assert rpc_client.cache.hits == 1
+
+    await rpc_client.close()
+    await rpc_server.rpc_commlayer.close()
+
+
+class Nodes:
+    def __init__(self, values, service):
+        self.values = values
+        self.service = service
+
+    @memoize
+    def subset(self, minimum):
+        self.service.calls.append(f"subset({minimum})")
+        return Nodes([value for value in self.values if value >= minimum], self.service)
+
+    @run_in_thread
+    @memoize
+    def slow_subset(self, minimum):
+        return self.subset(minimum)
+
+    def filter(self, maximum):
+        self.service.calls.append(f"filter({maximum})")
+        return Nodes([value for value in self.values if value <= maximum], self.service)
+
+    @property
+    def count(self):
+        return len(self.values)
+
+
+class NodesService:
+    def __init__(self):
+        self.calls = []
+
+    @property
+    @memoize
+    def nodes(self):
+        self.calls.append("nodes")
+        return Nodes(list(range(100)), self)
+
+
+@pytest.mark.parametrize("subset", ["subset", "slow_subset"])
+async def test_memoize(subset):
+    service = NodesService()
+    executor = DefaultExecutor("TEST", service, prefix_cache_size=10)
+
+    def stack(*calls):
+        return [RPCCall("nodes", [], {})] + [RPCCall(*call) for call in calls]
+
+    count = ("count", [], {})
+    assert await executor.rpc_call(stack((subset, [50], {}), count)) == 50
+    assert await executor.rpc_call(stack((subset, [50], {}), count)) == 50
+    assert await executor.rpc_call(stack((subset, [90], {}), count)) == 10
+    assert service.calls == ["nodes", "subset(50)", "subset(90)"]
+
+    # filter is not memoized, neither are the steps after it
+    service.calls.clear()
+    filtered = stack((subset, [50], {}), ("filter", [60], {}), (subset, [55], {}))
+    for _ in range(2):
+        assert len((await executor.rpc_call(filtered)).values) == 6
+    assert service.calls == ["filter(60)", "subset(55)"] * 2
+
+    executor.invalidate_prefixes()
+    service.calls.clear()
+    assert await executor.rpc_call(stack((subset, [50], {}), count)) == 50
+    assert service.calls == ["nodes", "subset(50)"]
@@ -0,0 +1,170 @@
+import time
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from asyncio_rpc.exceptions import HandleNotFound
+from asyncio_rpc.handles import ObjectStore
+from asyncio_rpc.models import RPCCall, RPCHandle, RPCStack
+from asyncio_rpc.server import DefaultExecutor
+
+
+def test_object_store_refcount():
+    store = ObjectStore()
+    store.put("1", "TEST", [1, 2, 3])
+    assert store.get("1", "TEST") == [1, 2, 3]
+
+    with pytest.raises(HandleNotFound):
+        store.get("1", "OTHER")
+
+    store.retain("1", "TEST")
+    assert not store.release("1", "TEST")
+    assert store.release("1", "TEST")
+    assert "1" not in store
+
+    with pytest.raises(HandleNotFound):
+        store.release("1", "TEST")
+
+
+def test_object_store_idle_ttl():
+    store = ObjectStore(idle_ttl=0.05)
+    store.put("1", "TEST", "foo")
+    time.sleep(0.03)
+    # Using the object resets the idle time
+    assert store.get("1", "TEST") == "foo"
+    time.sleep(0.03)
+    assert store.get("1", "TEST") == "foo"
+    time.sleep(0.06)
+    with pytest.raises(HandleNotFound):
+        store.get("1", "TEST")
+
+
+def test_object_store_max_size():
+    store = ObjectStore(max_size=2000)
+    store.put("1", "TEST", np.zeros(100))
+    store.put("2", "TEST", np.zeros(100))
+    assert store.size == 1600
+
+    # Evicts the least recently used
+    store.get("1", "TEST")
+    store.put("3", "TEST", np.zeros(100))
+    assert "1" in store
+    assert "2" not in store
+    assert "3" in store
+
+    with pytest.raises(ValueError):
+        store.put("4", "TEST", np.zeros(1000))
+    assert "4" not in store
+
+
+class Subset:
+    def __init__(self, values):
+        self.values = values
+
+    def filter(self, minimum):
+        return Subset([value for value in self.values if value >= minimum])
+
+    def sum(self):
+        return sum(self.values)
+
+    def rows(self):
+        for value in self.values:
+            yield value
+
+
+class SubsetService:
+    def __init__(self):
+        self.calls = 0
+
+    def subset(self, n):
+        self.calls += 1
+        return Subset(list(range(n)))
+
+
+class SubsetServiceClient:
+    def __init__(self, client):
+        self.client = client
+
+    async def subset(self, n) -> RPCHandle:
+        rpc_func_stack = RPCStack(
+            uuid4().hex, "TEST", 300, [RPCCall("subset", [n], {})]
+        )
+        return await self.client.rpc_handle(rpc_func_stack)
+
+    async def call(self, handle: RPCHandle, stack):
+        rpc_func_stack = RPCStack(
+            uuid4().hex, "TEST", 300, stack, handle=handle.handle_id
+        )
+        return await self.client.rpc_call(rpc_func_stack)
+
+    async def stream(self, handle: RPCHandle, stack):
+        rpc_func_stack = RPCStack(
+            uuid4().hex, "TEST", 300, stack, handle=handle.handle_id
+        )
+        return [item async for item in await self.client.rpc_stream(rpc_func_stack)]
+
+
+async def test_handles(do_rpc_call):
+    service = SubsetService()
+    service_client = SubsetServiceClient(None)
+    executor = DefaultExecutor("TEST", service)
+
+    async def calls():
+        handle = await service_client.subset(100)
+        assert isinstance(handle, RPCHandle)
+
+        total = await service_client.call(handle, [RPCCall("sum", [], {})])
+        filtered = await service_client.call(
+            handle, [RPCCall("filter", [50], {}), RPCCall("sum", [], {})]
+        )
+
+        # Private names are rejected on handles as well
+        with pytest.raises(AttributeError):
+            await service_client.call(handle, [RPCCall("__class__", [], {})])
+
+        assert await service_client.client.retain_handle(handle) == handle
+        assert not await service_client.client.release_handle(handle)
+        assert await service_client.client.release_handle(handle)
+
+        with pytest.raises(HandleNotFound):
+            await service_client.call(handle, [RPCCall("sum", [], {})])
+
+        return total, filtered
+
+    assert await do_rpc_call(service_client, executor, calls()) == (4950, 3725)
+    assert service.calls == 1
+
+
+async def test_handle_stream(do_rpc_call):
+    service_client = SubsetServiceClient(None)
+    executor = DefaultExecutor("TEST", SubsetService())
+
+    async def calls():
+        handle = await service_client.subset(4)
+        return await service_client.stream(
+            handle, [RPCCall("filter", [1], {}), RPCCall("rows", [], {})]
+        )
+
+    result = await do_rpc_call(
+        service_client, executor, calls(), client_processing=True
+    )
+    assert result == [1, 2, 3]
+
+
+async def test_handle_too_large(do_rpc_call):
+    service_client = SubsetServiceClient(None)
+    executor = DefaultExecutor("TEST", SubsetService())
+
+    async def calls():
+        # Not stored, so no handle is returned
+        with pytest.raises(ValueError):
+            await service_client.subset(100)
+        return True
+
+    assert await do_rpc_call(
+        service_client,
+        executor,
+        calls(),
+        server_kwargs={"object_store": ObjectStore(max_size=10)},
+    )
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from uuid import uuid4
+
+from asyncio_rpc.client import RPCClient
+from asyncio_rpc.decorators import run_in_thread
+from asyncio_rpc.hedging import HedgePolicy
+from asyncio_rpc.models import RPCCall, RPCStack
+from asyncio_rpc.server import DefaultExecutor, RPCServer
+
+from .utils import rpc_commlayer
+
+
+class NamedService:
+    def __init__(self, name, delay):
+        self.name = name
+        self.delay = delay
+        self.calls = 0
+
+    @run_in_thread
+    def get_name(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.name
+
+
+def test_hedge_policy():
+    policy = HedgePolicy(
+        percentile=50, initial_delay=0.5, min_samples=2, budget=0.5, max_tokens=1
+    )
+    assert policy.delay("TEST") == 0.5
+    policy.observe("TEST", 0.002)
+    policy.observe("TEST", 0.002)
+    assert policy.delay("TEST") == 0.0025
+
+    assert policy.acquire()
+    assert not policy.acquire()
+    policy.deposit()
+    policy.deposit()
+    assert policy.acquire()
+
+    assert policy.channel(1, b"sub") == b"sub"
+    policy.channels = [b"a", b"b"]
+    assert [policy.channel(attempt) for attempt in (1, 2, 3)] == [b"a", b"b", b"a"]
+
+
+async def hedged_calls(hedge_policy: HedgePolicy, count: int):
+    """
+    Call get_name count times with a slow RPCServer on the default
+    channel and a fast one on the alternate channel b"alt"
+    """
+    rpc_client = RPCClient(
+        await rpc_commlayer(b"pub", b"sub"), hedge_policy=hedge_policy
+    )
+    slow = NamedService("slow", 0.3)
+    fast = NamedService("fast", 0)
+    rpc_servers = [
+        RPCServer(await rpc_commlayer(b"sub", b"pub")),
+        RPCServer(await rpc_commlayer(b"alt", b"pub")),
+    ]
+    for rpc_server, service in zip(rpc_servers, (slow, fast)):
+        rpc_server.register(DefaultExecutor("TEST", service))
+        await rpc_server.rpc_commlayer.do_subscribe()
+
+    async def calls():
+        try:
+            results = []
+            for _ in range(count):
+                rpc_func_stack = RPCStack(
+                    uuid4().hex, "TEST", 10, [RPCCall("get_name", [], {})]
+                )
+                results.append(
+                    await rpc_client.rpc_call(rpc_func_stack, idempotent=True)
+                )
+            return results
+        finally:
+            # Wait for the slow calls before stopping
+            await asyncio.sleep(0.35)
+            for rpc_server in rpc_servers:
+                await rpc_server.queue.put(b"END")
+                await rpc_server.rpc_commlayer.unsubscribe()
+
+    results, *_ = await asyncio.gather(
+        calls(), *[rpc_server.serve() for rpc_server in rpc_servers]
+    )
+
+    await rpc_client.close()
+    for rpc_server in rpc_servers:
+        await rpc_server.rpc_commlayer.close()
+    return results, slow, fast
+
+
+async def test_hedged_call():
+    policy = HedgePolicy(initial_delay=0.05, channels=[b"alt"])
+    started = time.monotonic()
+    results, slow, fast = await hedged_calls(policy, 1)
+
+    assert results == ["fast"]
+    # Did not wait for the slow RPCServer
+    assert time.monotonic() - started < 0.3 + 0.35
+    assert (slow.calls, fast.calls) == (1, 1)
+    assert (policy.hedges, policy.wins) == (1, 1)
+
+
+async def test_hedge_budget():
+    policy = HedgePolicy(
+        initial_delay=0.05, channels=[b"alt"], budget=0.5, max_tokens=1
+    )
+    results, slow, fast = await hedged_calls(policy, 3)
+
+    # The second call has no budget left for a hedge
+    assert results == ["fast", "slow", "fast"]
+    assert policy.hedges == 2
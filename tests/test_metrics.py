@@ -0,0 +1,107 @@
+from uuid import uuid4
+
+import pytest
+
+from asyncio_rpc.exceptions import WrappedException
+from asyncio_rpc.metrics import METRICS_NAMESPACE, Histogram, ServerMetrics
+from asyncio_rpc.models import RPCCall, RPCStack
+from asyncio_rpc.server import DefaultExecutor
+
+from .utils import Service, ServiceClient
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    assert histogram.percentile(50) is None
+
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(5.65)
+    assert histogram.percentile(50) == 0.1
+    assert histogram.percentile(75) == 1.0
+    assert histogram.percentile(100) == float("inf")
+
+
+class MetricsServiceClient(ServiceClient):
+    async def metrics(self, func_name="snapshot"):
+        rpc_func_call = RPCCall(func_name, [], {})
+        rpc_func_stack = RPCStack(uuid4().hex, METRICS_NAMESPACE, 300, [rpc_func_call])
+        return await self.client.rpc_call(rpc_func_stack)
+
+
+async def test_metrics_namespace(do_rpc_call):
+    service_client = MetricsServiceClient(None)
+    executor = DefaultExecutor("TEST", Service())
+
+    async def calls():
+        for i in range(3):
+            await service_client.multiply(i)
+        with pytest.raises(WrappedException):
+            await service_client.custom_error()
+        return await service_client.metrics()
+
+    snapshot = await do_rpc_call(service_client, executor, calls())
+
+    assert snapshot["queue_depth"] == 0
+    # The snapshot call itself
+    assert snapshot["in_flight"] == 1
+
+    metrics = snapshot["namespaces"]["TEST"]
+    assert metrics["calls"] == 4
+    assert metrics["errors"] == 1
+    assert metrics["latency"]["count"] == 4
+    assert sum(metrics["latency"]["counts"]) == 4
+
+
+@pytest.mark.parametrize("metrics_control", [False, True])
+async def test_metrics_control(do_rpc_call, metrics_control):
+    service_client = MetricsServiceClient(None)
+    executor = DefaultExecutor("TEST", Service())
+
+    async def calls():
+        await service_client.multiply(2)
+        try:
+            await service_client.metrics("reset")
+        except AttributeError:
+            return False
+        return True
+
+    reset = await do_rpc_call(
+        service_client,
+        executor,
+        calls(),
+        server_kwargs={"metrics_control": metrics_control},
+    )
+    # Only reading the metrics is allowed by default
+    assert reset == metrics_control
+
+
+def test_profile_sampling():
+    metrics = ServerMetrics(None)
+    assert metrics.sample() is None
+
+    metrics.set_profiling(3)
+    sampled = [metrics.sample() is not None for _ in range(6)]
+    assert sampled == [True, False, False, True, False, False]
+
+
+async def test_profile(do_rpc_call):
+    service_client = MetricsServiceClient(None)
+    executor = DefaultExecutor("TEST", Service())
+
+    async def calls():
+        for i in range(3):
+            await service_client.multiply(i)
+        await service_client.get_item("foo")
+        return await service_client.metrics("profile")
+
+    profile = await do_rpc_call(
+        service_client, executor, calls(), server_kwargs={"profile_rate": 1}
+    )
+
+    assert profile["Service.multiply"]["calls"] == 3
+    assert profile["Service.get_item"]["calls"] == 1
+    assert profile["Service.multiply"]["total"] >= profile["Service.multiply"]["max"]
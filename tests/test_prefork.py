@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+from uuid import uuid4
+
+import pytest
+
+from asyncio_rpc.client import RPCClient
+from asyncio_rpc.exceptions import RPCTimeoutError
+from asyncio_rpc.models import RPCCall, RPCStack
+from asyncio_rpc.prefork import serve_multiprocess
+from asyncio_rpc.server import DefaultExecutor, RPCServer
+
+from .utils import rpc_commlayer
+
+WORKERS = 2
+
+
+class PidService:
+    def pid(self):
+        return os.getpid()
+
+    def crash(self):
+        os._exit(1)
+
+
+async def create_server():
+    rpc_server = RPCServer(await rpc_commlayer(b"prefork-sub", b"prefork-pub"))
+    rpc_server.register(DefaultExecutor("PREFORK", PidService()))
+    return rpc_server
+
+
+async def call(rpc_client, func_name, timeout=5):
+    rpc_func_stack = RPCStack(
+        uuid4().hex, "PREFORK", timeout, [RPCCall(func_name, [], {})]
+    )
+    return await rpc_client.rpc_call(rpc_func_stack)
+
+
+async def worker_pids(rpc_client):
+    return {await call(rpc_client, "pid") for _ in range(20)}
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="requires fork"
+)
+async def test_serve_multiprocess():
+    # Spawn, a forked child would inherit the running event loop
+    supervisor = multiprocessing.get_context("spawn").Process(
+        target=serve_multiprocess, args=(create_server,), kwargs={"workers": WORKERS}
+    )
+    supervisor.start()
+
+    rpc_client = RPCClient(await rpc_commlayer(b"prefork-pub", b"prefork-sub"))
+    client_task = asyncio.create_task(rpc_client.serve())
+    try:
+        # Wait for the workers to subscribe
+        for _ in range(50):
+            if await rpc_client.rpc_commlayer.redis.execute_command(
+                "PUBSUB", "NUMSUB", b"prefork-sub"
+            ) == [b"prefork-sub", WORKERS]:
+                break
+            await asyncio.sleep(0.1)
+
+        # Every RPCStack is executed by exactly one worker
+        pids = await worker_pids(rpc_client)
+        assert len(pids) == WORKERS
+
+        # Crashed workers are restarted
+        with pytest.raises(RPCTimeoutError):
+            await call(rpc_client, "crash", timeout=0.5)
+        await asyncio.sleep(2)
+        new_pids = await worker_pids(rpc_client)
+        assert len(new_pids) == WORKERS
+        assert len(pids & new_pids) == WORKERS - 1
+    finally:
+        await rpc_client.queue.put(b"END")
+        await rpc_client.rpc_commlayer.unsubscribe()
+        await client_task
+        await rpc_client.rpc_commlayer.close()
+        os.kill(supervisor.pid, signal.SIGTERM)
+        supervisor.join(10)
+
+    assert supervisor.exitcode == 0
@@ -0,0 +1,77 @@
+import pytest
+
+from asyncio_rpc.client import RPCClient
+from asyncio_rpc.models import RPCCall
+from asyncio_rpc.server import DefaultExecutor
+
+
+class Nodes:
+    def __init__(self, values):
+        self.values = values
+
+    def subset(self, minimum, maximum=None):
+        return Nodes(
+            [
+                value
+                for value in self.values
+                if value >= minimum and (maximum is None or value <= maximum)
+            ]
+        )
+
+    @property
+    def count(self):
+        return len(self.values)
+
+
+class NodesService:
+    @property
+    def nodes(self):
+        return Nodes(list(range(10)))
+
+    def multiply(self, x, y=1):
+        return x * y
+
+
+class ProxyServiceClient:
+    def __init__(self, client: RPCClient):
+        self.client = client
+
+
+def test_proxy_stack(rpc_client: RPCClient):
+    proxy = rpc_client.proxy("TEST")
+
+    assert proxy.nodes is proxy.nodes
+    assert proxy.nodes() is proxy.nodes
+    assert proxy.nodes.subset(5, maximum=7)._stack == (
+        RPCCall("nodes", [], {}),
+        RPCCall("subset", [5], {"maximum": 7}),
+    )
+    assert repr(proxy.nodes.subset(5).count) == "<RPCProxy TEST.nodes.subset(5).count>"
+
+    with pytest.raises(TypeError):
+        proxy()
+    with pytest.raises(TypeError):
+        proxy.multiply(1)(2)
+    with pytest.raises(AttributeError):
+        proxy._private
+
+    uid = rpc_client.next_uid()
+    assert uid != rpc_client.next_uid()
+
+
+async def test_proxy(do_rpc_call):
+    service_client = ProxyServiceClient(None)
+
+    async def calls():
+        proxy = service_client.client.proxy("TEST")
+        return [
+            await proxy.multiply(10, y=10),
+            await proxy.nodes.count,
+            await proxy.nodes.subset(5).count,
+            await proxy.nodes.subset(5, maximum=7).count,
+        ]
+
+    result = await do_rpc_call(
+        service_client, DefaultExecutor("TEST", NodesService()), calls()
+    )
+    assert result == [100, 10, 5, 3]
@@ -1,10 +1,19 @@
 import asyncio
 from uuid import uuid4
 
+import pytest
+
 from asyncio_rpc.client import RPCClient
-from asyncio_rpc.models import RPCCall, RPCSubStack
+from asyncio_rpc.commlayers.base import AbstractRPCCommLayer
+from asyncio_rpc.models import (
+    RPCCall,
+    RPCPubResult,
+    RPCStack,
+    RPCStreamBatchResult,
+    RPCSubStack,
+)
 from asyncio_rpc.pubsub import Publisher
-from asyncio_rpc.server import RPCServer
+from asyncio_rpc.server import DefaultExecutor, RPCServer
 
 from .conftest import rpc_commlayer
 
@@ -70,3 +79,305 @@ async def test_pubsub():
 
     await rpc_client.rpc_commlayer.close()
     await rpc_server.rpc_commlayer.close()
+
+
+class StreamService:
+    def rows(self, n):
+        for i in range(n):
+            yield {"row": i}
+
+    async def async_rows(self, n):
+        for i in range(n):
+            await asyncio.sleep(0)
+            yield {"row": i}
+
+    def single(self):
+        return 42
+
+    def broken(self, n):
+        for i in range(n):
+            yield i
+        raise ValueError("broken")
+
+
+class StreamServiceClient:
+    def __init__(self, client):
+        self.client = client
+
+    async def stream(self, func_name, *args):
+        rpc_func_call = RPCCall(func_name, list(args), {})
+        rpc_func_stack = RPCStack(uuid4().hex, "STREAM", 300, [rpc_func_call])
+        return await self.client.rpc_stream(rpc_func_stack)
+
+
+@pytest.mark.parametrize("thread_pool", [None, 2])
+@pytest.mark.parametrize("func_name", ["rows", "async_rows"])
+async def test_stream(do_rpc_call, func_name, thread_pool):
+    service_client = StreamServiceClient(None)
+    executor = DefaultExecutor("STREAM", StreamService(), thread_pool=thread_pool)
+
+    async def collect():
+        return [item async for item in await service_client.stream(func_name, 50)]
+
+    result = await do_rpc_call(
+        service_client, executor, collect(), client_processing=True
+    )
+    assert result == [{"row": i} for i in range(50)]
+
+
+async def test_stream_single_value(do_rpc_call):
+    service_client = StreamServiceClient(None)
+    executor = DefaultExecutor("STREAM", StreamService())
+
+    async def collect():
+        return [item async for item in await service_client.stream("single")]
+
+    result = await do_rpc_call(
+        service_client, executor, collect(), client_processing=True
+    )
+    assert result == [42]
+
+
+async def test_stream_error(do_rpc_call):
+    service_client = StreamServiceClient(None)
+    executor = DefaultExecutor("STREAM", StreamService())
+    items = []
+
+    async def collect():
+        async for item in await service_client.stream("broken", 3):
+            items.append(item)
+
+    with pytest.raises(ValueError):
+        await do_rpc_call(service_client, executor, collect(), client_processing=True)
+    assert items == [0, 1, 2]
+
+
+async def test_stream_close(do_rpc_call):
+    service_client = StreamServiceClient(None)
+    executor = DefaultExecutor("STREAM", StreamService())
+
+    async def collect():
+        stream = await service_client.stream("async_rows", 10000)
+        items = []
+        async for item in stream:
+            items.append(item)
+            if len(items) == 5:
+                await stream.close()
+        return items, service_client.client.subscriptions
+
+    items, subscriptions = await do_rpc_call(
+        service_client, executor, collect(), client_processing=True
+    )
+    assert items == [{"row": i} for i in range(5)]
+    assert not subscriptions
+
+
+@pytest.mark.parametrize(
+    "server_kwargs",
+    [{"stream_chunk_items": 8}, {"stream_chunk_bytes": 200}],
+)
+async def test_stream_chunks(do_rpc_call, server_kwargs):
+    service_client = StreamServiceClient(None)
+    executor = DefaultExecutor("STREAM", StreamService())
+    chunks = []
+
+    async def collect():
+        stream = await service_client.stream("rows", 50)
+        enqueue = stream.enqueue
+
+        async def counting_enqueue(result):
+            if isinstance(result, RPCStreamBatchResult):
+                chunks.append(len(result.data))
+            await enqueue(result)
+
+        stream.enqueue = counting_enqueue
+        return [item async for item in stream]
+
+    result = await do_rpc_call(
+        service_client,
+        executor,
+        collect(),
+        client_processing=True,
+        server_kwargs=server_kwargs,
+    )
+    assert result == [{"row": i} for i in range(50)]
+    assert sum(chunks) == 50
+    assert 1 < len(chunks) < 50
+    if "stream_chunk_items" in server_kwargs:
+        assert sorted(chunks, reverse=True) == [8] * 6 + [2]
+
+
+class BatchingExecutor:
+    """
+    Publishes 0..19 in batches of at most 8 items, or only the
+    latest value per key (value % 3) in latest only mode
+    """
+
+    def __init__(self, namespace, latest_only=False):
+        self.namespace = namespace
+        self.latest_only = latest_only
+        self.batches = []
+
+    async def subscribe_call(self, publisher: Publisher):
+        if self.latest_only:
+            publisher.set_latest_only(window=0.05)
+        else:
+            publisher.set_batching(max_items=8, window=0.05)
+
+        send = publisher._send
+
+        async def counting_send(publication):
+            self.batches.append(len(publication.data))
+            return await send(publication)
+
+        publisher._send = counting_send
+
+        for i in range(20):
+            await publisher.publish(i, key=i % 3)
+        await publisher.close()
+
+    async def rpc_call(self, rpc_stack):
+        pass
+
+
+@pytest.mark.parametrize(
+    "latest_only,items,batches",
+    [(False, list(range(20)), [8, 8, 4]), (True, [17, 18, 19], [3])],
+)
+async def test_publisher_batching(do_rpc_call, latest_only, items, batches):
+    executor = BatchingExecutor("PUBSUB", latest_only=latest_only)
+    service_client = StreamServiceClient(None)
+
+    async def collect():
+        rpc_func_stack = RPCSubStack(uuid4().hex, "PUBSUB", 300, [])
+        subscription = await service_client.client.subscribe_call(rpc_func_stack)
+        received = []
+        async for item in subscription.enumerate():
+            received.append(item)
+            if len(received) == len(items):
+                await subscription.close()
+        return received
+
+    result = await do_rpc_call(
+        service_client, executor, collect(), client_processing=True
+    )
+    assert result == items
+    assert executor.batches == batches
+
+
+class SharedExecutor:
+    """
+    Publishes 0, 1, 2, ... until all subscribers are gone
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.calls = 0
+
+    async def subscribe_call(self, publisher: Publisher):
+        self.calls += 1
+        i = 0
+        while publisher.is_active:
+            await publisher.publish(i)
+            i += 1
+            await asyncio.sleep(0.01)
+
+    async def rpc_call(self, rpc_stack):
+        pass
+
+
+async def test_shared_subscriptions():
+    rpc_server = RPCServer(
+        await rpc_commlayer(b"sub", b"pub"), share_subscriptions=True
+    )
+    executor = SharedExecutor("SHARED")
+    rpc_server.register(executor)
+    await rpc_server.rpc_commlayer.do_subscribe()
+
+    rpc_clients = [
+        RPCClient(await rpc_commlayer(channel, b"sub"))
+        for channel in (b"shared-1", b"shared-2", b"shared-3")
+    ]
+
+    async def subscriber(rpc_client, delay):
+        await asyncio.sleep(delay)
+        rpc_func_stack = RPCSubStack(
+            uuid4().hex, "SHARED", 300, [RPCCall("counter", [], {})]
+        )
+        subscription = await rpc_client.subscribe_call(rpc_func_stack)
+        items = []
+        async for item in subscription.enumerate():
+            items.append(item)
+            if len(items) == 5:
+                await subscription.close()
+        await rpc_client.queue.put(b"END")
+        await rpc_client.rpc_commlayer.unsubscribe()
+        return items
+
+    async def subscribers():
+        try:
+            return await asyncio.gather(
+                *[
+                    subscriber(rpc_client, delay)
+                    for rpc_client, delay in zip(rpc_clients, (0, 0, 0.03))
+                ]
+            )
+        finally:
+            await rpc_server.close()
+
+    results = (
+        await asyncio.gather(
+            subscribers(),
+            rpc_server.serve(),
+            *[rpc_client.serve() for rpc_client in rpc_clients],
+        )
+    )[0]
+
+    for rpc_client in rpc_clients:
+        await rpc_client.rpc_commlayer.close()
+    await rpc_server.rpc_commlayer.close()
+
+    # One producer, every subscriber receives consecutive items
+    assert executor.calls == 1
+    for items in results:
+        assert items == list(range(items[0], items[0] + 5))
+    assert results[2][0] > 0
+
+
+class RecordingCommLayer(AbstractRPCCommLayer):
+    """
+    rpc_commlayer without its own publish_many
+    """
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, rpc_instance, channel=None, serialized_data=None):
+        self.published.append((rpc_instance, channel, serialized_data))
+        return 0 if channel == b"gone" else 1
+
+    async def do_subscribe(self):
+        pass
+
+    async def subscribe(self, on_rpc_event_callback):
+        pass
+
+    async def unsubscribe(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def test_publish_many_fallback():
+    commlayer = RecordingCommLayer()
+    rpc_results = [RPCPubResult("1", "TEST", None), RPCPubResult("2", "TEST", None)]
+
+    receiver_counts = await commlayer.publish_many(
+        rpc_results, [b"client", b"gone"], serialized_data=b"data", expire=5
+    )
+    assert receiver_counts == [1, 0]
+    assert commlayer.published == [
+        (rpc_results[0], b"client", b"data"),
+        (rpc_results[1], b"gone", b"data"),
+    ]
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+import pytest
+
+from asyncio_rpc.commlayers.redis import RPCRedisCommLayer
+from asyncio_rpc.models import RPCException, RPCResult
+from asyncio_rpc.serialization import msgpack as msgpack_serialization
+
+from .utils import REDIS_HOST
+
+
+async def publish_to_self(commlayer, rpc_instance):
+    """
+    Publish rpc_instance and return it as received
+    via the subscription
+    """
+    received = []
+
+    async def on_rpc_event(event, channel):
+        received.append(event)
+        await commlayer.unsubscribe()
+
+    await commlayer.publish(rpc_instance)
+    await commlayer.subscribe(on_rpc_event)
+    return received[0]
+
+
+@pytest.mark.parametrize("size,chunked", [(100, False), (10000, True)])
+async def test_chunked_result(size, chunked):
+    commlayer = await RPCRedisCommLayer.create(
+        subchannel=b"chunked",
+        pubchannel=b"chunked",
+        host=REDIS_HOST,
+        serialization=msgpack_serialization,
+        chunk_threshold=1024,
+        chunk_size=1000,
+    )
+    value = np.arange(size, dtype=np.float64)
+    result = RPCResult("1", "TEST", value)
+
+    try:
+        received = await publish_to_self(commlayer, result)
+
+        # The published data only refers to the stored data
+        assert ("chunks" in result.data) == chunked
+        if chunked:
+            assert result.data["chunks"] == math.ceil(result.data["size"] / 1000)
+        assert np.all(received.data == value)
+
+        # All chunks have been deleted
+        redis_key = result.data["redis_key"]
+        assert await commlayer.redis.keys(f"{redis_key}*") == []
+    finally:
+        await commlayer.close()
+
+
+@pytest.mark.parametrize("size", [100, 10000])
+async def test_missing_result_data(size):
+    commlayer = await RPCRedisCommLayer.create(
+        subchannel=b"missing",
+        pubchannel=b"missing",
+        host=REDIS_HOST,
+        serialization=msgpack_serialization,
+        chunk_threshold=1024,
+        chunk_size=1000,
+    )
+    received = []
+
+    async def on_rpc_event(event, channel):
+        received.append(event)
+        if len(received) == 2:
+            await commlayer.unsubscribe()
+
+    try:
+        result = RPCResult("1", "TEST", np.arange(size, dtype=np.float64))
+        await commlayer.publish(result)
+        # The stored data expired before it was received
+        await commlayer.redis.delete(
+            *await commlayer.redis.keys(f"{result.data['redis_key']}*")
+        )
+        await commlayer.publish(RPCResult("2", "TEST", 42))
+        await commlayer.subscribe(on_rpc_event)
+
+        # Only the result with missing data failed
+        assert isinstance(received[0], RPCException)
+        assert received[0].uid == "1"
+        assert received[0].classname == "KeyError"
+        assert received[1].data == 42
+    finally:
+        await commlayer.close()
+
+
+@pytest.mark.parametrize("count", [1, 3])
+async def test_publish_many(count):
+    commlayer = await RPCRedisCommLayer.create(
+        subchannel=b"many",
+        pubchannel=b"many",
+        host=REDIS_HOST,
+        serialization=msgpack_serialization,
+    )
+    received = []
+
+    async def on_rpc_event(event, channel):
+        received.append(event)
+        if len(received) == count:
+            await commlayer.unsubscribe()
+
+    try:
+        rpc_results = [RPCResult(str(i), "TEST", None) for i in range(count)]
+        receiver_counts = await commlayer.publish_many(
+            rpc_results,
+            [None] * count,
+            serialized_data=msgpack_serialization.dumpb(42),
+            expire=5,
+        )
+        assert receiver_counts == [1] * count
+        redis_key = rpc_results[0].data["redis_key"]
+
+        await commlayer.subscribe(on_rpc_event)
+        assert [event.data for event in received] == [42] * count
+
+        if count == 1:
+            # Deleted by the only receiver
+            assert await commlayer.redis.keys(f"{redis_key}*") == []
+        else:
+            # Shared data expires shortly after
+            assert 0 < await commlayer.redis.ttl(redis_key) <= 5
+    finally:
+        await commlayer.close()
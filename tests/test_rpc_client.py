@@ -1,5 +1,21 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
 from asyncio_rpc.client import RPCClient
-from asyncio_rpc.models import RPCMessage
+from asyncio_rpc.exceptions import NotReceived, RPCTimeoutError
+from asyncio_rpc.models import (
+    RPCBatch,
+    RPCCall,
+    RPCHandleStack,
+    RPCMessage,
+    RPCStack,
+    RPCStreamStack,
+)
+from asyncio_rpc.server import DefaultExecutor, RPCServer
+
+from .utils import Service, rpc_commlayer
 
 
 async def stop_rpc_client_on_rpc_message(
@@ -31,3 +47,297 @@ async def test_rpc_message(rpc_client: RPCClient):
     )
 
     await rpc_client.rpc_commlayer.close()
+
+
+async def test_rpc_call_auto_serve(rpc_client: RPCClient, rpc_server: RPCServer):
+    rpc_server.register(DefaultExecutor("TEST", Service()))
+    await rpc_server.rpc_commlayer.do_subscribe()
+
+    async def calls():
+        try:
+            results = []
+            connections = []
+            for i in range(3):
+                rpc_func_stack = RPCStack(
+                    uuid4().hex, "TEST", 10, [RPCCall("multiply", [i, 2], {})]
+                )
+                results.append(await rpc_client.rpc_call(rpc_func_stack))
+                connections.append(rpc_client.rpc_commlayer.sub_redis)
+
+            # Concurrent calls share the background processing
+            results += await asyncio.gather(
+                *[
+                    rpc_client.rpc_call(
+                        RPCStack(
+                            uuid4().hex, "TEST", 10, [RPCCall("multiply", [i], {})]
+                        )
+                    )
+                    for i in range(5)
+                ]
+            )
+            return results, connections
+        finally:
+            await rpc_server.queue.put(b"END")
+            await rpc_server.rpc_commlayer.unsubscribe()
+
+    (results, connections), _ = await asyncio.gather(calls(), rpc_server.serve())
+
+    assert results == [0, 2, 4, 0, 1, 2, 3, 4]
+    # A single subscription for all calls
+    assert all(connection is connections[0] for connection in connections)
+    assert rpc_client.processing
+
+    receiver = rpc_client._receiver
+    await rpc_client.close()
+    await receiver
+    assert not rpc_client.processing
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_rpc_call_without_auto_serve(rpc_server: RPCServer):
+    rpc_client = RPCClient(await rpc_commlayer(b"pub", b"sub"), auto_serve=False)
+    rpc_server.register(DefaultExecutor("TEST", Service()))
+    await rpc_server.rpc_commlayer.do_subscribe()
+
+    async def calls():
+        try:
+            results = [
+                await rpc_client.rpc_call(
+                    RPCStack(uuid4().hex, "TEST", 10, [RPCCall("multiply", [3, 2], {})])
+                )
+            ]
+            # Concurrent calls don't discard each others results
+            results += await asyncio.gather(
+                *[
+                    rpc_client.rpc_call(
+                        RPCStack(
+                            uuid4().hex, "TEST", 10, [RPCCall("multiply", [i], {})]
+                        )
+                    )
+                    for i in range(5)
+                ]
+            )
+            return results
+        finally:
+            await rpc_server.queue.put(b"END")
+            await rpc_server.rpc_commlayer.unsubscribe()
+
+    results, _ = await asyncio.gather(calls(), rpc_server.serve())
+
+    assert results == [6, 0, 1, 2, 3, 4]
+    assert not rpc_client.processing
+    # Unsubscribed after the call
+    assert not rpc_client.rpc_commlayer.subscribed
+
+    await rpc_client.rpc_commlayer.close()
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_rpc_call_deadline(rpc_client: RPCClient, rpc_server: RPCServer):
+    rpc_server.register(DefaultExecutor("TEST", Service()))
+    await rpc_server.rpc_commlayer.do_subscribe()
+
+    rpc_func_stack = RPCStack(uuid4().hex, "TEST", 1, [RPCCall("multiply", [3], {})])
+
+    async def calls():
+        try:
+            results = []
+            for _ in range(2):
+                # The stack is not modified, so it can be sent again
+                results.append(await rpc_client.rpc_call(rpc_func_stack))
+                assert rpc_func_stack.deadline is None
+
+            # No timeout, no deadline
+            results.append(
+                await rpc_client.rpc_call(
+                    RPCStack(uuid4().hex, "TEST", None, [RPCCall("multiply", [2], {})])
+                )
+            )
+            return results
+        finally:
+            await rpc_server.queue.put(b"END")
+            await rpc_server.rpc_commlayer.unsubscribe()
+
+    results, _ = await asyncio.gather(calls(), rpc_server.serve())
+    assert results == [3, 3, 2]
+
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_rpc_call_missing_data(rpc_client: RPCClient, rpc_server: RPCServer):
+    rpc_server.register(DefaultExecutor("TEST", Service()))
+    await rpc_server.rpc_commlayer.do_subscribe()
+    get_data = rpc_client.rpc_commlayer.get_data
+
+    async def expired_get_data(redis_key, delete=True):
+        # The stored result data has expired once
+        rpc_client.rpc_commlayer.get_data = get_data
+        await get_data(redis_key, delete=delete)
+        raise KeyError(f"Missing data {redis_key}")
+
+    rpc_client.rpc_commlayer.get_data = expired_get_data
+
+    async def calls():
+        try:
+            with pytest.raises(KeyError):
+                await rpc_client.rpc_call(
+                    RPCStack(uuid4().hex, "TEST", 10, [RPCCall("multiply", [3], {})])
+                )
+            # Only the result with missing data failed
+            return await rpc_client.rpc_call(
+                RPCStack(uuid4().hex, "TEST", 10, [RPCCall("multiply", [2], {})])
+            )
+        finally:
+            await rpc_server.queue.put(b"END")
+            await rpc_server.rpc_commlayer.unsubscribe()
+
+    result, _ = await asyncio.gather(calls(), rpc_server.serve())
+    assert result == 2
+
+    await rpc_client.close()
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_rpc_call_resubscribe(rpc_client: RPCClient, rpc_server: RPCServer):
+    rpc_server.register(DefaultExecutor("TEST", Service()))
+    await rpc_server.rpc_commlayer.do_subscribe()
+    process_msg = rpc_client.rpc_commlayer._process_msg
+
+    async def broken_process_msg(*args):
+        rpc_client.rpc_commlayer._process_msg = process_msg
+        raise ConnectionError("broken")
+
+    rpc_client.rpc_commlayer._process_msg = broken_process_msg
+
+    async def calls():
+        try:
+            with pytest.raises(RPCTimeoutError):
+                await rpc_client.rpc_call(
+                    RPCStack(uuid4().hex, "TEST", 0.5, [RPCCall("multiply", [3], {})])
+                )
+            # The failed subscription has been reset, the next call subscribes
+            assert not rpc_client.processing
+            return await rpc_client.rpc_call(
+                RPCStack(uuid4().hex, "TEST", 10, [RPCCall("multiply", [2], {})])
+            )
+        finally:
+            await rpc_server.queue.put(b"END")
+            await rpc_server.rpc_commlayer.unsubscribe()
+
+    result, _ = await asyncio.gather(calls(), rpc_server.serve())
+    assert result == 2
+
+    await rpc_client.close()
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_rpc_call_batching(rpc_client: RPCClient, rpc_server: RPCServer):
+    rpc_server.register(DefaultExecutor("TEST", Service()))
+    await rpc_server.rpc_commlayer.do_subscribe()
+    rpc_client.set_batching(max_items=3, window=0.01)
+
+    published = []
+    publish = rpc_client.rpc_commlayer.publish
+
+    async def record_publish(rpc_instance, channel=None):
+        published.append(rpc_instance)
+        return await publish(rpc_instance, channel=channel)
+
+    rpc_client.rpc_commlayer.publish = record_publish
+
+    async def calls():
+        try:
+            return await asyncio.gather(
+                *[
+                    rpc_client.rpc_call(
+                        RPCStack(
+                            uuid4().hex, "TEST", 10, [RPCCall("multiply", [i, 2], {})]
+                        )
+                    )
+                    for i in range(7)
+                ]
+            )
+        finally:
+            await rpc_server.queue.put(b"END")
+            await rpc_server.rpc_commlayer.unsubscribe()
+
+    results, _ = await asyncio.gather(calls(), rpc_server.serve())
+
+    assert results == [0, 2, 4, 6, 8, 10, 12]
+    # Two full batches, the last RPCStack is sent after the window
+    assert [type(rpc_instance) for rpc_instance in published] == [
+        RPCBatch,
+        RPCBatch,
+        RPCStack,
+    ]
+    assert [len(rpc_batch.stack) for rpc_batch in published[:2]] == [3, 3]
+
+    await rpc_client.close()
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_rpc_call_batching_not_received(rpc_client: RPCClient):
+    rpc_client.set_batching()
+
+    with pytest.raises(NotReceived):
+        await asyncio.gather(
+            *[
+                rpc_client.rpc_call(
+                    RPCStack(uuid4().hex, "NOBODY", 1, [RPCCall("multiply", [i], {})])
+                )
+                for i in range(2)
+            ]
+        )
+    assert not rpc_client.futures
+
+    await rpc_client.close()
+
+
+async def test_rpc_batch_rejects_non_plain(rpc_client: RPCClient):
+    for rpc_func_stack in [
+        RPCHandleStack(uuid4().hex, "TEST", 10, [RPCCall("multiply", [2], {})]),
+        RPCStack(uuid4().hex, "TEST", 10, [RPCCall("multiply", [2], {})], handle="1"),
+    ]:
+        with pytest.raises(ValueError):
+            await rpc_client.rpc_batch([rpc_func_stack])
+
+
+async def test_rpc_batch_priority(rpc_client: RPCClient):
+    published = []
+
+    async def record_publish(rpc_instance, channel=None):
+        published.append(rpc_instance)
+        return 0
+
+    rpc_client.rpc_commlayer.publish = record_publish
+
+    with pytest.raises(NotReceived):
+        await rpc_client.rpc_batch(
+            [
+                RPCStack(uuid4().hex, "TEST", 10, [], priority=priority)
+                for priority in (0, 5, 1)
+            ]
+        )
+    # The most urgent RPCStack counts, like batches of set_batching
+    assert published[0].priority == 5
+
+
+async def test_rpc_stream_keeps_handle_and_deadline(rpc_client: RPCClient):
+    published = []
+
+    async def record_publish(rpc_instance, channel=None):
+        published.append(rpc_instance)
+        return 0
+
+    rpc_client.rpc_commlayer.publish = record_publish
+
+    rpc_func_stack = RPCStack(
+        uuid4().hex, "TEST", 10, [RPCCall("rows", [], {})], handle="1", deadline=5.0
+    )
+    with pytest.raises(NotReceived):
+        await rpc_client.rpc_stream(rpc_func_stack)
+    assert isinstance(published[0], RPCStreamStack)
+    assert published[0].handle == "1"
+    assert published[0].deadline == 5.0
+
+    await rpc_client.close()
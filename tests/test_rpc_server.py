@@ -1,7 +1,33 @@
+import asyncio
+import os
+import time
+from uuid import uuid4
+
 import pytest
 
-from asyncio_rpc.models import RPCStack
-from asyncio_rpc.server import DefaultExecutor, NamespaceError, RPCServer
+from asyncio_rpc.commlayers.base import AbstractRPCCommLayer
+from asyncio_rpc.decorators import run_in_thread
+from asyncio_rpc.exceptions import ServerOverloaded
+from asyncio_rpc.models import (
+    RPCBatch,
+    RPCCall,
+    RPCException,
+    RPCResult,
+    RPCStack,
+    RPCSubStack,
+    RPCUnSubStack,
+)
+from asyncio_rpc.server import (
+    DROP_OLDEST,
+    DefaultExecutor,
+    NamespaceError,
+    ProcessExecutor,
+    RPCQueue,
+    RPCServer,
+    remaining_time,
+)
+
+from .utils import Service, rpc_commlayer
 
 
 class MockService:
@@ -29,3 +55,529 @@ async def test_unknown_namespace_error(rpc_server: RPCServer):
         )
 
     await rpc_server.rpc_commlayer.close()
+
+
+async def test_rpc_queue_priority():
+    queue = RPCQueue()
+    await queue.put(b"END")
+    for uid, priority in [("1", 0), ("2", 10), ("3", 0), ("4", -1), ("5", 10)]:
+        rpc_func_stack = RPCStack(uid, "TEST", 300, [], priority=priority)
+        await queue.put((rpc_func_stack, None))
+
+    uids = [(await queue.get())[0].uid for _ in range(5)]
+    assert uids == ["2", "5", "1", "3", "4"]
+    assert await queue.get() == b"END"
+
+
+class SleepExecutor:
+    """
+    Executor that sleeps for the given amount of seconds
+    before returning it
+    """
+
+    namespace = "SLEEP"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def rpc_call(self, stack):
+        self.calls += 1
+        seconds = stack[0].func_args[0]
+        await asyncio.sleep(seconds)
+        return seconds
+
+
+class BlockingSleepService:
+    @run_in_thread
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+
+class SleepServiceClient:
+    def __init__(self, client, namespace="SLEEP"):
+        self.client = client
+        self.namespace = namespace
+
+    async def sleep(self, seconds):
+        rpc_func_call = RPCCall("sleep", [seconds], {})
+        rpc_func_stack = RPCStack(uuid4().hex, self.namespace, 300, [rpc_func_call])
+        return await self.client.rpc_call(rpc_func_stack)
+
+
+async def finish_order(service_client, seconds_list):
+    finished = []
+
+    async def sleep(seconds, delay):
+        # Delay publishing to make sure the RPCStacks
+        # arrive in the order of seconds_list
+        await asyncio.sleep(delay)
+        finished.append(await service_client.sleep(seconds))
+
+    await asyncio.gather(
+        *[sleep(seconds, i * 0.05) for i, seconds in enumerate(seconds_list)]
+    )
+    return finished
+
+
+async def test_sequential_dispatch(do_rpc_call):
+    service_client = SleepServiceClient(None)
+    result = await do_rpc_call(
+        service_client,
+        SleepExecutor(),
+        finish_order(service_client, [0.2, 0]),
+        client_processing=True,
+    )
+    assert result == [0.2, 0]
+
+
+async def test_concurrent_dispatch(do_rpc_call):
+    service_client = SleepServiceClient(None)
+    result = await do_rpc_call(
+        service_client,
+        SleepExecutor(),
+        finish_order(service_client, [0.2, 0]),
+        client_processing=True,
+        server_kwargs={"max_in_flight": 2},
+    )
+    assert result == [0, 0.2]
+
+
+async def test_namespace_limit(do_rpc_call):
+    service_client = SleepServiceClient(None)
+    result = await do_rpc_call(
+        service_client,
+        SleepExecutor(),
+        finish_order(service_client, [0.2, 0]),
+        client_processing=True,
+        server_kwargs={"max_in_flight": 2},
+        register_kwargs={"max_in_flight": 1},
+    )
+    assert result == [0.2, 0]
+
+
+async def test_coalesce(do_rpc_call):
+    service_client = SleepServiceClient(None)
+    executor = SleepExecutor()
+    result = await do_rpc_call(
+        service_client,
+        executor,
+        finish_order(service_client, [0.2, 0.2, 0.2]),
+        client_processing=True,
+        server_kwargs={"max_in_flight": 4, "coalesce": True},
+    )
+    assert result == [0.2, 0.2, 0.2]
+    assert executor.calls == 1
+
+
+async def test_run_in_thread(do_rpc_call):
+    service_client = SleepServiceClient(None, namespace="BLOCKING")
+    executor = DefaultExecutor("BLOCKING", BlockingSleepService(), thread_pool=2)
+    result = await do_rpc_call(
+        service_client,
+        executor,
+        finish_order(service_client, [0.2, 0]),
+        client_processing=True,
+        server_kwargs={"max_in_flight": 2},
+    )
+    assert result == [0, 0.2]
+
+    stats = executor.thread_pool_stats.as_dict()
+    assert stats["submitted"] == stats["completed"] == 2
+    assert stats["saturation"] == 0
+
+
+class ProcessService:
+    def pid(self):
+        return os.getpid()
+
+    def multiply(self, x, y=1):
+        return x * y
+
+
+async def test_process_executor():
+    executor = ProcessExecutor("PROCESS", ProcessService, workers=2)
+    try:
+        result = await executor.rpc_call([RPCCall("multiply", [10], {"y": 10})])
+        assert result == 100
+
+        pid = await executor.rpc_call([RPCCall("pid", [], {})])
+        assert pid != os.getpid()
+
+        with pytest.raises(AttributeError):
+            await executor.rpc_call([RPCCall("unknown", [], {})])
+
+        # The objects of RPCHandles are not available in the workers
+        with pytest.raises(NotImplementedError):
+            await executor.rpc_call([RPCCall("pid", [], {})], resource=[1, 2])
+    finally:
+        executor.shutdown()
+
+
+class Integer:
+    def __init__(self, value):
+        self.value = value
+
+    def multiply(self, x):
+        return self.value * x
+
+    def _private(self):
+        return self.value
+
+
+class ResolverService:
+    def __init__(self):
+        self.data = {"foo": "bar"}
+
+    @property
+    def integer(self):
+        return Integer(10)
+
+    def multiply(self, x, y=1):
+        return x * y
+
+    def _private(self):
+        return "private"
+
+
+async def test_resolver():
+    executor = DefaultExecutor("TEST", ResolverService())
+    assert await executor.rpc_call([RPCCall("data", [], {})]) == {"foo": "bar"}
+    assert await executor.rpc_call([RPCCall("multiply", [2], {"y": 3})]) == 6
+
+    stack = [RPCCall("integer", [], {}), RPCCall("multiply", [10], {})]
+    assert await executor.rpc_call(stack) == 100
+    assert await executor.rpc_call(stack) == 100
+    assert "multiply" in executor._type_dispatch_tables[Integer]
+
+    stack = [RPCCall("integer", [], {}), RPCCall("value", [], {})]
+    assert await executor.rpc_call(stack) == 10
+
+
+@pytest.mark.parametrize(
+    "stack",
+    [
+        [RPCCall("unknown", [], {})],
+        [RPCCall("_private", [], {})],
+        [RPCCall("__class__", [], {})],
+        [RPCCall("integer", [], {}), RPCCall("_private", [], {})],
+    ],
+)
+async def test_resolver_rejects(stack):
+    executor = DefaultExecutor("TEST", ResolverService())
+    with pytest.raises(AttributeError):
+        await executor.rpc_call(stack)
+
+
+async def test_resolver_exposed():
+    executor = DefaultExecutor("TEST", ResolverService(), exposed=["integer"])
+    stack = [RPCCall("integer", [], {}), RPCCall("multiply", [10], {})]
+    assert await executor.rpc_call(stack) == 100
+
+    with pytest.raises(AttributeError):
+        await executor.rpc_call([RPCCall("multiply", [2], {})])
+
+
+class DeadlineExecutor:
+    namespace = "DEADLINE"
+
+    def __init__(self):
+        self.remaining = []
+
+    async def rpc_call(self, stack):
+        self.remaining.append(remaining_time())
+
+
+async def test_remaining_time(rpc_server: RPCServer):
+    executor = DeadlineExecutor()
+    rpc_server.register(executor)
+
+    await rpc_server.rpc_call(RPCStack("1", "DEADLINE", 300, []))
+    await rpc_server.rpc_call(
+        RPCStack("2", "DEADLINE", 300, [], deadline=time.time() + 10)
+    )
+    assert executor.remaining[0] is None
+    assert 9 < executor.remaining[1] <= 10
+
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_drop_expired(rpc_server: RPCServer):
+    executor = DeadlineExecutor()
+    rpc_server.register(executor)
+
+    expired = RPCStack("1", "DEADLINE", 300, [], deadline=time.time() - 1)
+    await rpc_server._on_rpc_event(expired)
+    await rpc_server.queue.put(b"END")
+    await rpc_server._process_queue()
+    assert executor.remaining == []
+
+    await rpc_server.rpc_commlayer.close()
+
+
+@pytest.mark.parametrize(
+    "server_kwargs,queued_uids",
+    [
+        ({"max_queue_size": 2}, ["1", "2"]),
+        ({"max_queue_size": 2, "shed_policy": DROP_OLDEST}, ["2", "3"]),
+        ({"namespace_quotas": {"TEST": 1}}, ["1", "3"]),
+    ],
+)
+async def test_load_shedding(server_kwargs, queued_uids):
+    rpc_server = RPCServer(await rpc_commlayer(b"sub", b"pub"), **server_kwargs)
+    for uid, namespace in [("1", "TEST"), ("2", "TEST"), ("3", "OTHER")]:
+        await rpc_server._on_rpc_event(RPCStack(uid, namespace, 300, []))
+
+    uids = [(await rpc_server.queue.get())[0].uid for _ in queued_uids]
+    assert uids == queued_uids
+    assert rpc_server.queue.empty()
+
+    await rpc_server.rpc_commlayer.close()
+
+
+@pytest.mark.parametrize(
+    "server_kwargs,queued_uids",
+    [
+        ({"max_queue_size": 3}, ["1", "2"]),
+        ({"max_queue_size": 3, "shed_policy": DROP_OLDEST}, ["large"]),
+        ({"max_queue_size": 1, "shed_policy": DROP_OLDEST}, ["2"]),
+        ({"namespace_quotas": {"TEST": 3}}, ["1", "2", "batch"]),
+        ({"namespace_quotas": {"OTHER": 1}}, ["1", "2", "batch"]),
+    ],
+)
+async def test_load_shedding_batch(server_kwargs, queued_uids):
+    rpc_server = RPCServer(LegacyCommLayer(), **server_kwargs)
+    await rpc_server._on_rpc_event(RPCStack("1", "TEST", 300, []))
+    await rpc_server._on_rpc_event(RPCStack("2", "TEST", 300, []))
+
+    # Every RPCStack of the batch counts
+    stacks = [
+        RPCStack("3", "TEST", 300, []),
+        RPCStack("4", "OTHER", 300, []),
+        RPCStack("5", "OTHER", 300, []),
+    ]
+    await rpc_server._on_rpc_event(RPCBatch("batch", None, 300, stacks[:2]))
+    await rpc_server._on_rpc_event(RPCBatch("large", None, 300, stacks))
+    assert rpc_server.queue.qsize() == sum(
+        3 if uid == "large" else 2 if uid == "batch" else 1 for uid in queued_uids
+    )
+
+    uids = [(await rpc_server.queue.get())[0].uid for _ in queued_uids]
+    assert uids == queued_uids
+    assert rpc_server.queue.empty()
+    assert rpc_server.queue.qsize() == 0
+
+
+async def test_load_shedding_keeps_unsubscribes():
+    rpc_server = RPCServer(
+        await rpc_commlayer(b"sub", b"pub"), max_queue_size=2, shed_policy=DROP_OLDEST
+    )
+    await rpc_server._on_rpc_event(RPCUnSubStack("1", "TEST", 300, []))
+    for uid in ["2", "3", "4"]:
+        await rpc_server._on_rpc_event(RPCStack(uid, "TEST", 300, []))
+
+    uids = [(await rpc_server.queue.get())[0].uid for _ in range(2)]
+    assert uids == ["1", "4"]
+    assert rpc_server.queue.empty()
+
+    await rpc_server.rpc_commlayer.close()
+
+
+async def test_server_overloaded(do_rpc_call):
+    service_client = SleepServiceClient(None)
+
+    async def sleep(delay):
+        await asyncio.sleep(delay)
+        return await service_client.sleep(0.2)
+
+    async def calls():
+        # One executing, one queued and one rejected
+        return await asyncio.gather(
+            sleep(0), sleep(0.05), sleep(0.1), return_exceptions=True
+        )
+
+    results = await do_rpc_call(
+        service_client,
+        SleepExecutor(),
+        calls(),
+        client_processing=True,
+        server_kwargs={"max_queue_size": 1},
+    )
+    assert results[:2] == [0.2, 0.2]
+    assert isinstance(results[2], ServerOverloaded)
+
+
+class LegacyCommLayer(AbstractRPCCommLayer):
+    """
+    rpc_commlayer implemented before serialized_data was added
+    """
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, rpc_instance, channel=None):
+        self.published.append(rpc_instance)
+        return 1
+
+    async def do_subscribe(self):
+        pass
+
+    async def subscribe(self, on_rpc_event_callback):
+        pass
+
+    async def unsubscribe(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def test_legacy_commlayer_publish():
+    rpc_commlayer = LegacyCommLayer()
+    rpc_server = RPCServer(rpc_commlayer)
+    rpc_server.register(DefaultExecutor("TEST", Service()))
+
+    await rpc_server._process_rpc_stack(
+        RPCStack("1", "TEST", 300, [RPCCall("multiply", [2, 3], {})])
+    )
+    assert rpc_commlayer.published == [RPCResult("1", "TEST", 6)]
+
+
+class PeakExecutor:
+    """
+    Executor that records the peak number of concurrent calls
+    """
+
+    namespace = "PEAK"
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def rpc_call(self, stack):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return True
+
+
+@pytest.mark.parametrize(
+    "server_kwargs,register_kwargs,peak",
+    [
+        ({}, {}, 5),
+        ({"max_in_flight": 1}, {}, 1),
+        ({"max_in_flight": 5}, {"max_in_flight": 2}, 2),
+        ({}, {"max_in_flight": 2}, 2),
+    ],
+)
+async def test_batch_limits(server_kwargs, register_kwargs, peak):
+    rpc_commlayer = LegacyCommLayer()
+    rpc_server = RPCServer(rpc_commlayer, **server_kwargs)
+    executor = PeakExecutor()
+    rpc_server.register(executor, **register_kwargs)
+
+    stacks = [
+        RPCStack(str(i), "PEAK", 300, [RPCCall("peak", [], {})]) for i in range(5)
+    ]
+    await rpc_server._on_rpc_event(RPCBatch("batch", None, 300, stacks))
+    await rpc_server.queue.put(b"END")
+    await rpc_server._process_queue()
+
+    # Every RPCStack of the batch counts against the limits
+    assert executor.peak == peak
+    assert [result.data for result in rpc_commlayer.published[0].data] == [True] * 5
+
+
+async def test_batch_rejects_non_plain():
+    rpc_commlayer = LegacyCommLayer()
+    rpc_server = RPCServer(rpc_commlayer)
+    rpc_server.register(PeakExecutor())
+
+    stacks = [
+        RPCStack("1", "PEAK", 300, [RPCCall("peak", [], {})]),
+        RPCSubStack("2", "PEAK", 300, [RPCCall("peak", [], {})]),
+        RPCStack("3", "PEAK", 300, [RPCCall("peak", [], {})], handle="1"),
+    ]
+    await rpc_server._process_rpc_stack(RPCBatch("batch", None, 300, stacks))
+
+    result, *rejected = rpc_commlayer.published[0].data
+    assert result == RPCResult("1", "PEAK", True)
+    assert all(isinstance(exception, RPCException) for exception in rejected)
+    assert all(exception.classname == "ValueError" for exception in rejected)
+
+
+async def test_batch_drop_expired():
+    rpc_commlayer = LegacyCommLayer()
+    rpc_server = RPCServer(rpc_commlayer)
+    rpc_server.register(PeakExecutor())
+
+    expired = RPCStack("1", "PEAK", 300, [], deadline=time.time() - 1)
+    await rpc_server._process_rpc_stack(RPCBatch("batch", None, 300, [expired]))
+
+    exception = rpc_commlayer.published[0].data[0]
+    assert isinstance(exception, RPCException)
+    assert exception.classname == "TimeoutError"
+
+
+async def test_drop_expired_held_back():
+    rpc_server = RPCServer(await rpc_commlayer(b"sub", b"pub"), max_in_flight=2)
+    executor = SleepExecutor()
+    rpc_server.register(executor, max_in_flight=1)
+
+    for uid, seconds, deadline in [
+        ("A", 0.1, None),
+        ("B", 0, time.time() + 0.05),
+        ("C", 0, None),
+    ]:
+        await rpc_server._on_rpc_event(
+            RPCStack(
+                uid, "SLEEP", 300, [RPCCall("sleep", [seconds], {})], deadline=deadline
+            )
+        )
+    processing = asyncio.ensure_future(rpc_server._process_queue())
+
+    # B expired while held back, C is executed after dropping it
+    for _ in range(50):
+        if executor.calls == 2:
+            break
+        await asyncio.sleep(0.01)
+    assert executor.calls == 2
+    assert rpc_server.queue.qsize() == 0
+
+    await rpc_server.queue.put(b"END")
+    await processing
+    await rpc_server.rpc_commlayer.close()
+
+
+@pytest.mark.parametrize(
+    "server_kwargs",
+    [{"max_queue_size": 2}, {"namespace_quotas": {"SLEEP": 2}}],
+)
+async def test_load_shedding_namespace_limit(server_kwargs):
+    rpc_commlayer = LegacyCommLayer()
+    rpc_server = RPCServer(rpc_commlayer, max_in_flight=2, **server_kwargs)
+    executor = SleepExecutor()
+    rpc_server.register(executor, max_in_flight=1)
+    processing = asyncio.ensure_future(rpc_server._process_queue())
+
+    for uid in "ABCDE":
+        await rpc_server._on_rpc_event(
+            RPCStack(uid, "SLEEP", 300, [RPCCall("sleep", [0.1], {})])
+        )
+        await asyncio.sleep(0.001)
+
+    # A is executing, B and C are held back in the queue, D and E are shed
+    assert rpc_server.queue.qsize() == 2
+    assert rpc_server.queue.namespace_counts["SLEEP"] == 2
+
+    await rpc_server.queue.put(b"END")
+    await processing
+
+    assert executor.calls == 3
+    shed = [
+        result.uid
+        for result in rpc_commlayer.published
+        if isinstance(result, RPCException)
+    ]
+    assert shed == ["D", "E"]
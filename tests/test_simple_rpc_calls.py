@@ -156,3 +156,39 @@ async def test_custom_data_model(do_rpc_call):
         custom_dataclasses=[CustomDataModel],
     )
     assert result == value.multiply()
+
+
+async def batch(service_client, return_exceptions=False):
+    rpc_func_stacks = [
+        RPCStack(uuid4().hex, "TEST", 300, [RPCCall("multiply", [10], {"y": 10})]),
+        RPCStack(uuid4().hex, "TEST", 300, [RPCCall("get_item", ["foo"], {})]),
+        RPCStack(uuid4().hex, "TEST", 300, [RPCCall("get_item", ["bar"], {})]),
+        RPCStack(uuid4().hex, "UNKNOWN", 300, [RPCCall("multiply", [1], {})]),
+    ]
+    return await service_client.client.rpc_batch(
+        rpc_func_stacks, return_exceptions=return_exceptions
+    )
+
+
+@pytest.mark.parametrize("client_processing", [False, True])
+async def test_batch(do_rpc_call, client_processing):
+    test_service_client = ServiceClient(None)
+    results = await do_rpc_call(
+        test_service_client,
+        DefaultExecutor("TEST", Service()),
+        batch(test_service_client, return_exceptions=True),
+        client_processing=client_processing,
+    )
+    assert results[:2] == [100, "bar"]
+    assert isinstance(results[2], KeyError)
+    assert isinstance(results[3], WrappedException)
+
+
+async def test_batch_raises(do_rpc_call):
+    test_service_client = ServiceClient(None)
+    with pytest.raises(KeyError):
+        await do_rpc_call(
+            test_service_client,
+            DefaultExecutor("TEST", Service()),
+            batch(test_service_client),
+        )